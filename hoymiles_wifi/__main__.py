@@ -8,15 +8,27 @@ import json
 import sys
 from dataclasses import asdict, dataclass, is_dataclass
 from pprint import pprint
+from typing import Any
 
-from google.protobuf.json_format import MessageToDict, MessageToJson
+from google.protobuf.json_format import MessageToDict
 from google.protobuf.message import Message
 
+from hoymiles_wifi import logger
+from hoymiles_wifi.address_pool import LocalAddressPool
+from hoymiles_wifi.circuit_breaker import CircuitBreaker
 from hoymiles_wifi.const import (
+    CLI_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DISCOVERY_CONCURRENCY,
     DTU_FIRMWARE_URL_00_01_11,
+    EXPORTER_ADDRESS,
+    EXPORTER_PORT,
     MAX_POWER_LIMIT,
 )
+from hoymiles_wifi.discovery import async_discover
 from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.exporter import MetricsExporter
+from hoymiles_wifi.fleet import FleetHost, read_hosts_file
 from hoymiles_wifi.hoymiles import (
     BMSWorkingMode,
     DateBean,
@@ -46,6 +58,8 @@ from hoymiles_wifi.protobuf import (
     RealData_pb2,
     RealDataNew_pb2,
 )
+from hoymiles_wifi.records import write_record
+from hoymiles_wifi.serializer import message_to_json, write_json
 from hoymiles_wifi.utils import (
     parse_time_periods_input,
     parse_time_settings_input,
@@ -53,6 +67,15 @@ from hoymiles_wifi.utils import (
     promt_user_for_rate_time_range,
 )
 
+# Commands that always prompt for input
+INTERACTIVE_COMMANDS = (
+    "set-wifi",
+    "firmware-update",
+    "restart-dtu",
+    "turn-on-inverter",
+    "turn-off-inverter",
+)
+
 RED = "\033[91m"
 END = "\033[0m"
 
@@ -693,6 +716,355 @@ async def async_is_encrypted(dtu: DTU):
     return is_encrypted_info
 
 
+async def async_run_exporter(
+    dtus: list[DTU], listen_address: str, listen_port: int
+) -> None:
+    """Poll the DTUs and serve their data as Prometheus metrics."""
+
+    exporter = MetricsExporter()
+    for dtu in dtus:
+        exporter.add_dtu(dtu)
+    await exporter.async_run(listen_address, listen_port)
+
+
+def create_dtu(fleet_host: FleetHost, args: argparse.Namespace) -> DTU:
+    """Create the DTU of a host with the command line settings."""
+
+    # The exporter polls forever, do not wait for offline DTUs every poll
+    dtu = fleet_host.create_dtu(
+        args.address_pool,
+        circuit_breaker=CircuitBreaker() if args.command == "exporter" else None,
+    )
+    if args.timeout:
+        dtu.timeout = args.timeout
+
+    return dtu
+
+
+def is_interactive(args: argparse.Namespace) -> bool:
+    """Check whether the command prompts for input."""
+
+    if args.command in ("set-power-limit", "set-energy-storage-working-mode"):
+        return not args.disable_interactive
+
+    return args.command in INTERACTIVE_COMMANDS
+
+
+async def async_execute_command(dtu: DTU, args: argparse.Namespace) -> Any:
+    """Execute the command of the command line arguments on a DTU."""
+
+    # Execute the specified command using a switch case
+    switch = {
+        "get-real-data-new": async_get_real_data_new,
+        "get-real-data": async_get_real_data,
+        "get-config": async_get_config,
+        "network-info": async_network_info,
+        "app-information-data": async_app_information_data,
+        "app-get-hist-power": async_app_get_hist_power,
+        "set-power-limit": async_set_power_limit,
+        "set-wifi": async_set_wifi,
+        "firmware-update": async_firmware_update,
+        "restart-dtu": async_restart_dtu,
+        "turn-on-inverter": async_turn_on_inverter,
+        "turn-off-inverter": async_turn_off_inverter,
+        "get-information-data": async_get_information_data,
+        "get-version-info": async_get_version_info,
+        "heartbeat": async_heatbeat,
+        "identify-dtu": async_identify_dtu,
+        "identify-inverters": async_identify_inverters,
+        "identify-meters": async_identify_meters,
+        "get-alarm-list": async_get_alarm_list,
+        "enable-performance-data-mode": async_enable_performance_data_mode,
+        "get-gateway-info": async_get_gateway_info,
+        "get-gateway-network-info": async_get_gateway_network_info,
+        "get-energy-storage-registry": async_get_energy_storage_registry,
+        "get-energy-storage-data": async_get_energy_storage_data,
+        "set-energy-storage-working-mode": async_set_energy_storage_working_mode,
+        "is-encrypted": async_is_encrypted,
+    }
+
+    command_func = switch.get(args.command, print_invalid_command)
+    if args.command == "set-power-limit":
+        kwargs = {}
+        kwargs["power_limit"] = args.power_limit
+        kwargs["interactive_mode"] = not args.disable_interactive
+        return await command_func(dtu, **kwargs)
+
+    if args.command == "set-energy-storage-working-mode":
+        kwargs = {}
+        kwargs["interactive_mode"] = not args.disable_interactive
+        kwargs["bms_working_mode"] = BMSWorkingMode(args.bms_working_mode)
+        kwargs["inverter_serial_number"] = args.inverter_serial_number
+        kwargs["rev_soc"] = args.rev_soc
+        kwargs["time_settings_str"] = args.time_settings
+        kwargs["max_power"] = args.max_power
+        kwargs["peak_soc"] = args.peak_soc
+        kwargs["peak_meter_power"] = args.peak_meter_power
+        kwargs["time_periods_str"] = args.time_periods
+
+        return await command_func(dtu, **kwargs)
+
+    return await command_func(dtu)
+
+
+def response_to_json_line(response: Any, args: argparse.Namespace) -> str | None:
+    """Format a response as compact JSON, None for unsupported responses."""
+
+    if isinstance(response, Message):
+        return message_to_json(
+            response,
+            indent=None,
+            scaled=args.scale_values,
+            hex_serial_numbers=args.hex_serial_numbers,
+        )
+
+    if isinstance(response, list):
+        response = [
+            MessageToDict(item) if isinstance(item, Message) else item
+            for item in response
+        ]
+    elif is_dataclass(response):
+        response = asdict(response)
+    elif not isinstance(response, (dict, str)):
+        return None
+
+    return json.dumps(response, separators=(",", ":"))
+
+
+async def async_run_hosts(hosts: list[FleetHost], args: argparse.Namespace) -> bool:
+    """Run the command on all hosts and print each result as it completes.
+
+    At most args.concurrency DTUs are queried at the same time. Returns
+    whether every host responded.
+    """
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def async_run_host(fleet_host: FleetHost) -> tuple[str, Any]:
+        async with semaphore:
+            dtu = create_dtu(fleet_host, args)
+            try:
+                response = await async_execute_command(dtu, args)
+            except Exception as e:
+                # A failing host must not stop the other hosts
+                logger.warning(
+                    f"{args.command} failed for {fleet_host.host}: {e!r}",
+                    exc_info=True,
+                )
+                response = None
+            finally:
+                await dtu.async_close()
+
+        return fleet_host.host, response
+
+    is_complete = True
+
+    for task in asyncio.as_completed(
+        [async_run_host(fleet_host) for fleet_host in hosts]
+    ):
+        host, response = await task
+        result = response_to_json_line(response, args) if response else None
+
+        if args.as_json and result is not None:
+            line = f'{{"host":{json.dumps(host)},"response":{result}}}'
+        elif args.as_json:
+            line = json.dumps(
+                {"host": host, "error": f"No response for {args.command}"},
+                separators=(",", ":"),
+            )
+        elif response:
+            line = f"{host}: {args.command.capitalize()} Response: \n{response}"
+        else:
+            line = (
+                f"{host}: No response or unable to retrieve response for {args.command}"
+            )
+
+        if not response:
+            is_complete = False
+
+        print(line, flush=True)  # noqa: T201
+
+    return is_complete
+
+
+async def async_run_discovery(args: argparse.Namespace) -> bool:
+    """Scan the networks for DTUs and print each one as it is found.
+
+    Returns whether a DTU was found.
+    """
+
+    is_found = False
+
+    async for discovered in async_discover(
+        args.networks.split(","),
+        concurrency=args.concurrency or DISCOVERY_CONCURRENCY,
+        local_addr=args.local_addr,
+        timeout=args.timeout or DEFAULT_TIMEOUT,
+    ):
+        is_found = True
+
+        if args.as_json:
+            line = json.dumps(asdict(discovered), separators=(",", ":"))
+        else:
+            line = (
+                f"{discovered.host}: {discovered.serial_number} "
+                f"({discovered.model}), firmware {discovered.sw_version}, "
+                f"hardware {discovered.hw_version}, "
+                f"encrypted: {discovered.is_encrypted}"
+            )
+            if discovered.enc_rand:
+                line += f", enc_rand: {discovered.enc_rand}"
+
+        print(line, flush=True)  # noqa: T201
+
+    return is_found
+
+
+def get_address_pool(
+    args: argparse.Namespace, parser: argparse.ArgumentParser
+) -> LocalAddressPool | None:
+    """Create the address pool of a --local_addr list, None for one address.
+
+    A pool replaces args.local_addr.
+    """
+
+    if not args.local_addr or (
+        "," not in args.local_addr and "/" not in args.local_addr
+    ):
+        return None
+
+    try:
+        address_pool = LocalAddressPool(args.local_addr.split(","))
+    except ValueError as e:
+        parser.error(str(e))
+    args.local_addr = None
+
+    return address_pool
+
+
+def get_hosts(
+    args: argparse.Namespace, parser: argparse.ArgumentParser
+) -> list[FleetHost]:
+    """Get the hosts of --host and --hosts-file."""
+
+    hosts = [
+        FleetHost(host, args.enc_rand, args.local_addr)
+        for host in (args.host or "").split(",")
+        if host
+    ]
+    if args.hosts_file:
+        try:
+            hosts.extend(
+                read_hosts_file(args.hosts_file, args.enc_rand, args.local_addr)
+            )
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    if not hosts:
+        parser.error("--host or --hosts-file is required")
+
+    return hosts
+
+
+async def async_dispatch_discovery(
+    args: argparse.Namespace,
+    parser: argparse.ArgumentParser,
+    address_pool: LocalAddressPool | None,
+) -> None:
+    """Run discover, exiting with status 2 if no DTU was found."""
+
+    if not args.networks:
+        parser.error("discover requires --networks")
+    if address_pool is not None:
+        parser.error("discover binds to a single --local_addr")
+
+    try:
+        is_found = await async_run_discovery(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not is_found:
+        sys.exit(2)
+
+
+async def async_dispatch_hosts(
+    hosts: list[FleetHost],
+    args: argparse.Namespace,
+    parser: argparse.ArgumentParser,
+) -> None:
+    """Run the command on several hosts, exiting with status 2 on failures."""
+
+    if args.as_binary:
+        parser.error("--as-binary supports a single host")
+    if is_interactive(args):
+        parser.error(f"{args.command} is interactive and supports a single host")
+
+    if not await async_run_hosts(hosts, args):
+        sys.exit(2)
+
+
+def write_binary_response(response: Any, args: argparse.Namespace) -> None:
+    """Write the messages of a response as records to stdout."""
+
+    messages = response if isinstance(response, list) else [response]
+    if not all(isinstance(message, Message) for message in messages):
+        print(  # noqa: T201
+            f"ERROR: {args.command} has no protobuf response", file=sys.stderr
+        )
+        sys.exit(1)
+
+    try:
+        for message in messages:
+            write_record(sys.stdout.buffer, message)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+    sys.stdout.buffer.flush()
+
+
+def print_json_response(response: Any, args: argparse.Namespace) -> None:
+    """Print a response as JSON."""
+
+    if isinstance(response, Message):
+        write_json(
+            response,
+            sys.stdout,
+            scaled=args.scale_values,
+            hex_serial_numbers=args.hex_serial_numbers,
+        )
+        print()  # noqa: T201
+    elif isinstance(response, dict):
+        print(json.dumps(response, indent=4))  # noqa: T201
+    elif isinstance(response, list):
+        json_list = [
+            MessageToDict(item) if isinstance(item, Message) else item
+            for item in response
+        ]
+        print(json.dumps(json_list, indent=4))  # noqa: T201
+    elif is_dataclass(response):
+        print(json.dumps(asdict(response), indent=4))  # noqa: T201
+    else:
+        print("ERROR: Response is not a valid dataclass instance.")  # noqa: T201
+        print(f"Response type: {type(response)}")  # noqa: T201
+
+
+def print_no_response(args: argparse.Namespace) -> None:
+    """Print that the command got no response."""
+
+    if args.as_json:
+        print(  # noqa: T201
+            json.dumps(
+                {"error": f"No response for {args.command.replace('_', ' ')}"},
+                indent=4,
+            )
+        )
+    else:
+        print(  # noqa: T201
+            f"No response or unable to retrieve response for "
+            f"{args.command.replace('_', ' ')}",
+        )
+
+
 def print_invalid_command(command: str) -> None:
     """Print an invalid command message."""
 
@@ -705,13 +1077,40 @@ async def main() -> None:
 
     parser = argparse.ArgumentParser(description="Hoymiles DTU Monitoring")
     parser.add_argument(
-        "--host", type=str, required=True, help="IP address or hostname of the DTU"
+        "--host",
+        type=str,
+        default=None,
+        help="IP address or hostname of the DTU, or a comma separated list",
+    )
+    parser.add_argument(
+        "--hosts-file",
+        type=str,
+        default=None,
+        help="File with one DTU per line: HOST [enc_rand=HEX] [local_addr=IP]",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=(
+            f"Maximum number of DTUs queried (default {CLI_CONCURRENCY}) or "
+            f"hosts scanned (default {DISCOVERY_CONCURRENCY}) at the same time"
+        ),
+    )
+    parser.add_argument(
+        "--networks",
+        type=str,
+        default=None,
+        help="Comma separated CIDR ranges to scan with discover",
     )
     parser.add_argument(
         "--local_addr",
         type=str,
         required=False,
-        help="IP address of the interface to bind to",
+        help=(
+            "IP address of the interface to bind to, or a comma separated pool "
+            "of addresses, where ADDRESS/PREFIX serves the DTUs in its subnet"
+        ),
     )
     parser.add_argument(
         "--as-json",
@@ -719,6 +1118,24 @@ async def main() -> None:
         default=False,
         help="Format the output as JSON",
     )
+    parser.add_argument(
+        "--as-binary",
+        action="store_true",
+        default=False,
+        help="Write the output as length-prefixed protobuf records",
+    )
+    parser.add_argument(
+        "--scale-values",
+        action="store_true",
+        default=False,
+        help="With --as-json, convert real data values to their units",
+    )
+    parser.add_argument(
+        "--hex-serial-numbers",
+        action="store_true",
+        default=False,
+        help="With --as-json, format serial numbers as hex strings",
+    )
     parser.add_argument(
         "--disable-interactive",
         action="store_true",
@@ -804,7 +1221,21 @@ async def main() -> None:
         "--timeout",
         type=int,
         default=None,
-        help="Custom timeout"
+        help="Maximum request timeout in seconds"
+    )
+
+    parser.add_argument(
+        "--listen-address",
+        type=str,
+        default=EXPORTER_ADDRESS,
+        help="Address the exporter listens on",
+    )
+
+    parser.add_argument(
+        "--listen-port",
+        type=int,
+        default=EXPORTER_PORT,
+        help="Port the exporter listens on",
     )
 
     parser.add_argument(
@@ -837,112 +1268,55 @@ async def main() -> None:
             "get-gateway-network-info",
             "set-energy-storage-working-mode",
             "is-encrypted",
+            "exporter",
+            "discover",
         ],
         help="Command to execute",
     )
 
     args = parser.parse_args()
 
-    if args.enc_rand:
-        dtu = DTU(
-            args.host,
-            args.local_addr,
-            is_encrypted=True,
-            enc_rand=bytes.fromhex(args.enc_rand),
-        )
-    else:
-        dtu = DTU(args.host, args.local_addr)
+    address_pool = get_address_pool(args, parser)
 
-    if args.timeout:
-        dtu.timeout = args.timeout
+    if args.command == "discover":
+        await async_dispatch_discovery(args, parser, address_pool)
+        return
 
-    # Execute the specified command using a switch case
-    switch = {
-        "get-real-data-new": async_get_real_data_new,
-        "get-real-data": async_get_real_data,
-        "get-config": async_get_config,
-        "network-info": async_network_info,
-        "app-information-data": async_app_information_data,
-        "app-get-hist-power": async_app_get_hist_power,
-        "set-power-limit": async_set_power_limit,
-        "set-wifi": async_set_wifi,
-        "firmware-update": async_firmware_update,
-        "restart-dtu": async_restart_dtu,
-        "turn-on-inverter": async_turn_on_inverter,
-        "turn-off-inverter": async_turn_off_inverter,
-        "get-information-data": async_get_information_data,
-        "get-version-info": async_get_version_info,
-        "heartbeat": async_heatbeat,
-        "identify-dtu": async_identify_dtu,
-        "identify-inverters": async_identify_inverters,
-        "identify-meters": async_identify_meters,
-        "get-alarm-list": async_get_alarm_list,
-        "enable-performance-data-mode": async_enable_performance_data_mode,
-        "get-gateway-info": async_get_gateway_info,
-        "get-gateway-network-info": async_get_gateway_network_info,
-        "get-energy-storage-registry": async_get_energy_storage_registry,
-        "get-energy-storage-data": async_get_energy_storage_data,
-        "set-energy-storage-working-mode": async_set_energy_storage_working_mode,
-        "is-encrypted": async_is_encrypted,
-    }
+    if args.concurrency is None:
+        args.concurrency = CLI_CONCURRENCY
+    args.address_pool = address_pool
 
-    command_func = switch.get(args.command, print_invalid_command)
-    if args.command == "set-power-limit":
-        kwargs = {}
-        kwargs["power_limit"] = args.power_limit
-        kwargs["interactive_mode"] = not args.disable_interactive
-        response = await command_func(dtu, **kwargs)
-    elif args.command == "set-energy-storage-working-mode":
-        kwargs = {}
-        kwargs["interactive_mode"] = not args.disable_interactive
-        kwargs["bms_working_mode"] = BMSWorkingMode(args.bms_working_mode)
-        kwargs["inverter_serial_number"] = args.inverter_serial_number
-        kwargs["rev_soc"] = args.rev_soc
-        kwargs["time_settings_str"] = args.time_settings
-        kwargs["max_power"] = args.max_power
-        kwargs["peak_soc"] = args.peak_soc
-        kwargs["peak_meter_power"] = args.peak_meter_power
-        kwargs["time_periods_str"] = args.time_periods
+    hosts = get_hosts(args, parser)
 
-        response = await command_func(dtu, **kwargs)
-    else:
-        response = await command_func(dtu)
+    if args.command == "exporter":
+        await async_run_exporter(
+            [create_dtu(fleet_host, args) for fleet_host in hosts],
+            args.listen_address,
+            args.listen_port,
+        )
+        return
 
-    if response:
-        if args.as_json:
-            if isinstance(response, Message):
-                print(MessageToJson(response))  # noqa: T201
-            elif isinstance(response, dict):
-                print(json.dumps(response, indent=4))  # noqa: T201
-            elif isinstance(response, list):
-                json_list = [
-                    MessageToDict(item) if isinstance(item, Message) else item
-                    for item in response
-                ]
-                print(json.dumps(json_list, indent=4))  # noqa: T201
-            elif is_dataclass(response):
-                print(json.dumps(asdict(response), indent=4))  # noqa: T201
-            else:
-                print("ERROR: Response is not a valid dataclass instance.")  # noqa: T201
-                print(f"Response type: {type(response)}")  # noqa: T201
+    if len(hosts) > 1:
+        await async_dispatch_hosts(hosts, args, parser)
+        return
 
-        else:
-            print(f"{args.command.capitalize()} Response: \n{response}")  # noqa: T201
-    else:
-        if args.as_json:
-            print(  # noqa: T201
-                json.dumps(
-                    {"error": f"No response for {args.command.replace('_', ' ')}"},
-                    indent=4,
-                )
-            )
-        else:
-            print(  # noqa: T201
-                f"No response or unable to retrieve response for "
-                f"{args.command.replace('_', ' ')}",
-            )
+    dtu = create_dtu(hosts[0], args)
+    try:
+        response = await async_execute_command(dtu, args)
+    finally:
+        await dtu.async_close()
+
+    if not response:
+        print_no_response(args)
         sys.exit(2)
 
+    if args.as_binary:
+        write_binary_response(response, args)
+    elif args.as_json:
+        print_json_response(response, args)
+    else:
+        print(f"{args.command.capitalize()} Response: \n{response}")  # noqa: T201
+
 
 def run_main() -> None:
     """Run the main function for the hoymiles_wifi package."""
@@ -0,0 +1,125 @@
+"""Distribution of DTU connections over local addresses."""
+
+from __future__ import annotations
+
+import ipaddress
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class InterfaceStats:
+    """Connection statistics of a local address."""
+
+    address: str
+    active: int = 0
+    peak_active: int = 0
+    requests: int = 0
+    failures: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    start_time: float = field(default_factory=time.monotonic)
+
+    def open(self) -> None:
+        """Count a connection being opened."""
+
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def close(self, bytes_sent: int, bytes_received: int, is_ok: bool) -> None:
+        """Count a finished exchange."""
+
+        self.active -= 1
+        self.requests += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        if not is_ok:
+            self.failures += 1
+
+    def get_throughput(self) -> float:
+        """Get the bytes sent and received per second since the start."""
+
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+
+        return (self.bytes_sent + self.bytes_received) / elapsed
+
+
+class LocalAddressPool:
+    """Assign local addresses to bind DTU connections to.
+
+    Addresses given with a prefix, e.g. "10.0.1.5/24", serve the DTUs in
+    their subnet (the most specific subnet wins). All other DTUs are
+    assigned round robin to the addresses given without prefix, or to all
+    addresses if every address has a prefix. A DTU keeps its address once
+    assigned. Source ports are left to the operating system, so connections
+    spread over its ephemeral port range.
+    """
+
+    def __init__(self, addresses: list[str]):
+        """Initialize LocalAddressPool class.
+
+        Raises ValueError for an empty pool and invalid addresses.
+        """
+
+        if not addresses:
+            raise ValueError("Local address pool is empty")
+
+        self.addresses: list[str] = []
+        self.subnets: list[
+            tuple[ipaddress.IPv4Network | ipaddress.IPv6Network, str]
+        ] = []
+        default_addresses: list[str] = []
+
+        for entry in addresses:
+            interface = ipaddress.ip_interface(entry.strip())
+            address = str(interface.ip)
+            self.addresses.append(address)
+
+            if "/" in entry:
+                self.subnets.append((interface.network, address))
+            else:
+                default_addresses.append(address)
+
+        self.subnets.sort(key=lambda subnet: subnet[0].prefixlen, reverse=True)
+        self.default_addresses: list[str] = default_addresses or self.addresses
+        self.assignments: dict[str, str] = {}
+        self.stats: dict[str, InterfaceStats] = {
+            address: InterfaceStats(address) for address in self.addresses
+        }
+        self._next: int = 0
+
+    def assign(self, host: str) -> str:
+        """Get the local address of a DTU."""
+
+        address = self.assignments.get(host)
+        if address is not None:
+            return address
+
+        address = self._get_subnet_address(host)
+        if address is None:
+            address = self.default_addresses[self._next % len(self.default_addresses)]
+            self._next += 1
+
+        self.assignments[host] = address
+        return address
+
+    def get_stats(self, address: str) -> InterfaceStats | None:
+        """Get the statistics of a local address, None if not in the pool."""
+
+        return self.stats.get(address)
+
+    def _get_subnet_address(self, host: str) -> str | None:
+        """Get the address serving the subnet of host, None for hostnames."""
+
+        try:
+            host_address = ipaddress.ip_address(host)
+        except ValueError:
+            return None
+
+        for network, address in self.subnets:
+            if host_address in network:
+                return address
+
+        return None
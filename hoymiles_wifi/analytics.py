@@ -0,0 +1,163 @@
+"""Vectorized analytics of historical power data."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from hoymiles_wifi.const import HIST_POWER_SCALE
+from hoymiles_wifi.protobuf import AppGetHistPower_pb2
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "hoymiles_wifi.analytics requires numpy, install hoymiles-wifi[analytics]"
+    ) from e
+
+
+@dataclass
+class PowerSeries:
+    """Power samples in watts at unix timestamps (start of each step)."""
+
+    timestamps: np.ndarray
+    power: np.ndarray
+    step: int
+
+    def __len__(self) -> int:
+        """Return the number of samples."""
+
+        return len(self.timestamps)
+
+
+def from_hist_power(
+    hist_power: AppGetHistPower_pb2.AppGetHistPowerReqDTO,
+    scale: float = HIST_POWER_SCALE,
+) -> PowerSeries:
+    """Create a series from the merged response of async_app_get_hist_power."""
+
+    step = int(hist_power.step_time)
+    power = np.asarray(hist_power.power_array, dtype=np.float64) * scale
+    timestamps = hist_power.absolute_start + step * np.arange(
+        len(power), dtype=np.int64
+    )
+
+    return PowerSeries(timestamps, power, step)
+
+
+def concatenate(series: list[PowerSeries]) -> PowerSeries:
+    """Join series of several requests, e.g. several days, in time order."""
+
+    if not series:
+        return PowerSeries(np.empty(0, np.int64), np.empty(0, np.float64), 0)
+
+    timestamps = np.concatenate([item.timestamps for item in series])
+    power = np.concatenate([item.power for item in series])
+    order = np.argsort(timestamps, kind="stable")
+
+    return PowerSeries(
+        timestamps[order], power[order], min(item.step for item in series)
+    )
+
+
+def get_energy(
+    series: PowerSeries, window: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Integrate the energy in watt hours per window of seconds.
+
+    Each sample is taken as the average power of its step. Windows are
+    aligned to multiples of window since the epoch; without a window the
+    total is returned as a single window starting at the first sample.
+    """
+
+    energy = series.power * (series.step / 3600)
+
+    if len(series) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.float64)
+
+    if window is None:
+        return series.timestamps[:1], np.array([np.nansum(energy)])
+
+    first = series.timestamps[0] // window
+    bins = series.timestamps // window - first
+    totals = np.bincount(bins, weights=np.nan_to_num(energy))
+    starts = (first + np.arange(len(totals), dtype=np.int64)) * window
+
+    present = np.bincount(bins, minlength=len(totals)) > 0
+    return starts[present], totals[present]
+
+
+def get_peak(series: PowerSeries) -> tuple[int, float] | None:
+    """Get the timestamp and value of the peak power."""
+
+    if len(series) == 0 or np.isnan(series.power).all():
+        return None
+
+    index = int(np.nanargmax(series.power))
+    return int(series.timestamps[index]), float(series.power[index])
+
+
+def get_ramp_rates(series: PowerSeries) -> np.ndarray:
+    """Get the power change in watts per second between consecutive samples."""
+
+    if len(series) < 2:
+        return np.empty(0, np.float64)
+
+    return np.diff(series.power) / np.diff(series.timestamps)
+
+
+def find_gaps(
+    series: PowerSeries, max_interval: float | None = None
+) -> list[tuple[int, int]]:
+    """Find periods without samples.
+
+    Returns (last sample before, first sample after) for every pair of
+    consecutive samples further apart than max_interval, which defaults to
+    1.5 steps.
+    """
+
+    if len(series) < 2:
+        return []
+
+    if max_interval is None:
+        max_interval = 1.5 * series.step
+
+    indices = np.flatnonzero(np.diff(series.timestamps) > max_interval)
+
+    return [
+        (int(series.timestamps[index]), int(series.timestamps[index + 1]))
+        for index in indices
+    ]
+
+
+def resample(series: PowerSeries, step: int) -> PowerSeries:
+    """Resample to a new step in seconds.
+
+    Larger steps average the samples of each step (NaN where a step has no
+    samples), smaller steps interpolate linearly (NaN before the first
+    sample).
+    """
+
+    if len(series) == 0:
+        return PowerSeries(series.timestamps, series.power, step)
+
+    first = series.timestamps[0] // step * step
+
+    if step < series.step:
+        timestamps = np.arange(first, series.timestamps[-1] + 1, step, dtype=np.int64)
+        power = np.interp(
+            timestamps, series.timestamps, series.power, left=np.nan, right=np.nan
+        )
+        return PowerSeries(timestamps, power, step)
+
+    bins = (series.timestamps - first) // step
+    valid = ~np.isnan(series.power)
+    counts = np.bincount(bins[valid], minlength=bins[-1] + 1)
+    totals = np.bincount(
+        bins[valid], weights=series.power[valid], minlength=bins[-1] + 1
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        power = np.where(counts > 0, totals / counts, np.nan)
+
+    timestamps = first + step * np.arange(len(power), dtype=np.int64)
+    return PowerSeries(timestamps, power, step)
@@ -0,0 +1,170 @@
+"""Benchmark of the DTU transports against a local fake DTU."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import struct
+import time
+from collections.abc import Callable
+from typing import Any
+
+from hoymiles_wifi.const import CMD_HB_RES_DTO, CMD_HEADER
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2
+from hoymiles_wifi.transport import crc16_modbus
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def create_heartbeat_response(seq: int) -> bytes:
+    """Create the heartbeat response frame of a request sequence."""
+
+    payload = APPHeartbeatPB_pb2.HBReqDTO(
+        dtu_serial_number="4143A0000000", offset=0, time=int(time.time())
+    ).SerializeToString()
+
+    return (
+        CMD_HEADER
+        + CMD_HB_RES_DTO
+        + struct.pack(">HHH", seq, crc16_modbus(payload), len(payload) + 10)
+        + payload
+    )
+
+
+def _run_server(connection: Any) -> None:
+    """Answer every request with a heartbeat response until the pipe closes."""
+
+    async def async_handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(10)
+                seq, _, length = struct.unpack(">HHH", header[4:10])
+                await reader.readexactly(length - 10)
+                writer.write(create_heartbeat_response(seq))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def async_run() -> None:
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0, backlog=4096)
+        connection.send(server.sockets[0].getsockname()[1])
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, connection.recv)
+        server.close()
+
+    asyncio.run(async_run())
+
+
+async def async_run_requests(
+    port: int, requests: int, concurrency: int, frame_transport: bool
+) -> tuple[float, int]:
+    """Send heartbeats from concurrency DTUs, return elapsed time and failures.
+
+    Every round uses fresh DTUs, so requests are not paced.
+    """
+
+    request = APPHeartbeatPB_pb2.HBResDTO(offset=0, time=int(time.time()))
+    elapsed = 0.0
+    failures = 0
+
+    for start in range(0, requests, concurrency):
+        dtus = [
+            DTU("127.0.0.1", frame_transport=frame_transport)
+            for _ in range(min(concurrency, requests - start))
+        ]
+
+        start_time = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                dtu.async_send_request(
+                    CMD_HB_RES_DTO,
+                    request,
+                    APPHeartbeatPB_pb2.HBReqDTO,
+                    dtu_port=port,
+                )
+                for dtu in dtus
+            )
+        )
+        elapsed += time.perf_counter() - start_time
+        failures += sum(response is None for response in responses)
+
+    return elapsed, failures
+
+
+def get_event_loops() -> list[tuple[str, Callable[[], asyncio.AbstractEventLoop]]]:
+    """Get the event loop implementations to compare."""
+
+    loops: list[tuple[str, Callable[[], asyncio.AbstractEventLoop]]] = [
+        ("asyncio", asyncio.new_event_loop)
+    ]
+    if uvloop is not None:
+        loops.append(("uvloop", uvloop.new_event_loop))
+
+    return loops
+
+
+def main() -> None:
+    """Compare the streams and FrameProtocol transports."""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark hoymiles-wifi transports against a local fake DTU"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=5000, help="Requests per run (default 5000)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=100,
+        help="DTUs polled concurrently (default 100)",
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    connection, server_connection = context.Pipe()
+    server = context.Process(target=_run_server, args=(server_connection,), daemon=True)
+    server.start()
+    port = connection.recv()
+
+    if uvloop is None:
+        print("uvloop is not installed, only the asyncio event loop is measured")  # noqa: T201
+
+    try:
+        for loop_name, new_event_loop in get_event_loops():
+            for transport_name, frame_transport in (
+                ("streams", False),
+                ("protocol", True),
+            ):
+                loop = new_event_loop()
+                try:
+                    elapsed, failures = loop.run_until_complete(
+                        async_run_requests(
+                            port, args.requests, args.concurrency, frame_transport
+                        )
+                    )
+                finally:
+                    loop.close()
+
+                print(  # noqa: T201
+                    f"{loop_name:8} {transport_name:9} {args.requests} requests "
+                    f"in {elapsed:.3f}s, {args.requests / elapsed:.0f} req/s, "
+                    f"{failures} failed"
+                )
+    finally:
+        connection.send(None)
+        server.join(5)
+        if server.is_alive():
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Append-only capture log of raw DTU frames."""
+
+from __future__ import annotations
+
+import mmap
+import struct
+import time
+from collections.abc import Iterator
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from google.protobuf import descriptor_pool, message_factory
+from google.protobuf.message import DecodeError
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import CAPTURE_SEGMENT_SIZE
+from hoymiles_wifi.transport import unpack_frame
+
+# Wire frame sent to the DTU
+FRAME_REQUEST = 0
+# Serialized request before encryption
+FRAME_REQUEST_PLAIN = 1
+# Wire frame received from the DTU
+FRAME_RESPONSE = 2
+# Response payload after validation and decryption
+FRAME_RESPONSE_PLAIN = 3
+
+FLAG_EXTENDED = 0x01
+FLAG_ENCRYPTED = 0x02
+
+SEGMENT_SUFFIX = ".hmc"
+INDEX_SUFFIX = ".idx"
+
+# Record header: magic, timestamp, tag, seq, phase, flags, host length,
+# message type length, payload length
+RECORD_HEADER = struct.Struct("<2sdHHBBBBI")
+RECORD_MAGIC = b"HC"
+# Index entry: timestamp, tag, seq, phase, flags, record offset
+INDEX_ENTRY = struct.Struct("<dHHBB2xQ")
+
+
+class CaptureRecord(NamedTuple):
+    """Captured frame."""
+
+    timestamp: float
+    host: str
+    tag: int
+    seq: int
+    phase: int
+    flags: int
+    type_name: str
+    payload: bytes
+
+
+class FrameCapture:
+    """Record frames to append-only segment files.
+
+    Every segment <n>.hmc has a companion <n>.idx with one fixed size entry
+    per record (timestamp, tag, sequence, phase, flags, offset) that
+    CaptureReader memory maps for lookups. A new segment is started once
+    segment_size is exceeded, and when a timestamp is earlier than the
+    previous one (e.g. after the wall clock was stepped back), so the index
+    of every segment is ordered by time for binary search.
+    """
+
+    def __init__(self, directory: str | Path, segment_size: int = CAPTURE_SEGMENT_SIZE):
+        """Initialize FrameCapture class."""
+
+        self.directory: Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size: int = segment_size
+        self.segment_number: int = max(
+            (int(path.stem) for path in get_segment_paths(self.directory)),
+            default=-1,
+        )
+        self._segment = None
+        self._index = None
+        self._offset: int = 0
+        self._last_timestamp: float = 0.0
+        self._open_segment()
+
+    def record(
+        self,
+        host: str,
+        tag: int,
+        seq: int,
+        phase: int,
+        payload: bytes,
+        *,
+        flags: int = 0,
+        type_name: str = "",
+        timestamp: float | None = None,
+    ) -> None:
+        """Append a frame."""
+
+        if self._segment is None:
+            raise ValueError("Capture is closed")
+
+        timestamp = timestamp if timestamp is not None else time.time()
+
+        if self._offset >= self.segment_size or timestamp < self._last_timestamp:
+            self._open_segment()
+        self._last_timestamp = timestamp
+        host_bytes = host.encode()[:255]
+        type_bytes = type_name.encode()[:255]
+
+        header = RECORD_HEADER.pack(
+            RECORD_MAGIC,
+            timestamp,
+            tag,
+            seq,
+            phase,
+            flags,
+            len(host_bytes),
+            len(type_bytes),
+            len(payload),
+        )
+        self._segment.write(header)
+        self._segment.write(host_bytes)
+        self._segment.write(type_bytes)
+        self._segment.write(payload)
+        self._index.write(
+            INDEX_ENTRY.pack(timestamp, tag, seq, phase, flags, self._offset)
+        )
+
+        self._offset += len(header) + len(host_bytes) + len(type_bytes) + len(payload)
+
+    def flush(self) -> None:
+        """Flush buffered records to disk."""
+
+        if self._segment is not None:
+            self._segment.flush()
+            self._index.flush()
+
+    def close(self) -> None:
+        """Close the current segment."""
+
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+            self._index = None
+
+    def __enter__(self) -> FrameCapture:
+        """Return the capture."""
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Close the capture."""
+
+        self.close()
+
+    def _open_segment(self) -> None:
+        """Start a new segment."""
+
+        self.close()
+        self.segment_number += 1
+        stem = self.directory / f"{self.segment_number:08d}"
+        self._segment = open(stem.with_suffix(SEGMENT_SUFFIX), "ab")
+        self._index = open(stem.with_suffix(INDEX_SUFFIX), "ab")
+        self._offset = 0
+        self._last_timestamp = 0.0
+
+
+class CaptureReader:
+    """Read frames recorded by FrameCapture."""
+
+    def __init__(self, directory: str | Path):
+        """Initialize CaptureReader class."""
+
+        self.directory: Path = Path(directory)
+
+    def get_segments(self) -> list[Path]:
+        """Get the segment files in recording order."""
+
+        return sorted(get_segment_paths(self.directory))
+
+    def iter_records(
+        self,
+        start: float | None = None,
+        end: float | None = None,
+        tags: set[int] | None = None,
+        phases: set[int] | None = None,
+        host: str | None = None,
+    ) -> Iterator[CaptureRecord]:
+        """Iterate over the records matching the filters.
+
+        The time range [start, end) is located by binary search in the index
+        of each segment, whose timestamps FrameCapture keeps in order. Tags and phases are filtered on the index before a
+        record is read from the segment.
+        """
+
+        for segment_path in self.get_segments():
+            index_path = segment_path.with_suffix(INDEX_SUFFIX)
+            if not index_path.exists() or index_path.stat().st_size < INDEX_ENTRY.size:
+                continue
+
+            with ExitStack() as stack:
+                index_file = stack.enter_context(open(index_path, "rb"))
+                index = stack.enter_context(
+                    mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+                segment_file = stack.enter_context(open(segment_path, "rb"))
+                segment = stack.enter_context(
+                    mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+
+                count = len(index) // INDEX_ENTRY.size
+                first = 0 if start is None else self._bisect(index, count, start)
+
+                for position in range(first, count):
+                    timestamp, tag, _, phase, _, offset = INDEX_ENTRY.unpack_from(
+                        index, position * INDEX_ENTRY.size
+                    )
+
+                    if end is not None and timestamp >= end:
+                        break
+                    if tags is not None and tag not in tags:
+                        continue
+                    if phases is not None and phase not in phases:
+                        continue
+                    record = self._read_record(segment, offset)
+                    if record is None:
+                        # Record not completely flushed yet
+                        break
+
+                    if host is None or record.host == host:
+                        yield record
+
+    def _bisect(self, index: mmap.mmap, count: int, timestamp: float) -> int:
+        """Find the first index entry at or after timestamp."""
+
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if (
+                struct.unpack_from("<d", index, middle * INDEX_ENTRY.size)[0]
+                < timestamp
+            ):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _read_record(self, segment: mmap.mmap, offset: int) -> CaptureRecord | None:
+        """Read a record from a segment, None if it is truncated."""
+
+        if offset + RECORD_HEADER.size > len(segment):
+            return None
+
+        (
+            magic,
+            timestamp,
+            tag,
+            seq,
+            phase,
+            flags,
+            host_length,
+            type_length,
+            payload_length,
+        ) = RECORD_HEADER.unpack_from(segment, offset)
+
+        if magic != RECORD_MAGIC:
+            raise ValueError(f"Corrupt capture record at offset {offset}")
+
+        position = offset + RECORD_HEADER.size
+        if position + host_length + type_length + payload_length > len(segment):
+            return None
+
+        host = segment[position : position + host_length].decode()
+        position += host_length
+        type_name = segment[position : position + type_length].decode()
+        position += type_length
+
+        return CaptureRecord(
+            timestamp,
+            host,
+            tag,
+            seq,
+            phase,
+            flags,
+            type_name,
+            segment[position : position + payload_length],
+        )
+
+
+def get_segment_paths(directory: Path) -> Iterator[Path]:
+    """Iterate over the segment files of a directory.
+
+    Files whose name is not a segment number, e.g. copies, are skipped.
+    """
+
+    return (
+        path for path in directory.glob(f"*{SEGMENT_SUFFIX}") if path.stem.isdigit()
+    )
+
+
+def get_message_type(type_name: str) -> Any:
+    """Get the protobuf message class of a captured type name."""
+
+    # Make sure all message types are registered
+    import hoymiles_wifi.dtu  # noqa: F401, PLC0415
+
+    return message_factory.GetMessageClass(
+        descriptor_pool.Default().FindMessageTypeByName(type_name)
+    )
+
+
+def replay(
+    reader: CaptureReader, dtu: Any, **filters: Any
+) -> Iterator[tuple[CaptureRecord, Any]]:
+    """Validate, decrypt and parse captured response frames.
+
+    Only the encryption settings of dtu are used, which must match the
+    captured DTU; its state is not changed and nothing is recorded again.
+    Yields each response record with the parsed message (None if parsing
+    failed).
+    """
+
+    filters["phases"] = {FRAME_RESPONSE}
+
+    for record in reader.iter_records(**filters):
+        try:
+            _, _, payload = unpack_frame(
+                record.payload,
+                dtu.is_encrypted,
+                dtu.enc_rand,
+                bool(record.flags & FLAG_EXTENDED),
+            )
+            message = get_message_type(record.type_name).FromString(payload)
+        except (ValueError, DecodeError, KeyError) as e:
+            logger.debug(f"Failed to replay frame {record.seq}: {e}")
+            message = None
+
+        yield record, message
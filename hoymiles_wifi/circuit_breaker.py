@@ -0,0 +1,115 @@
+"""Circuit breaker for unreachable DTUs."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from enum import Enum
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import (
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    CIRCUIT_BREAKER_MAX_BACKOFF,
+    CIRCUIT_BREAKER_MIN_BACKOFF,
+)
+
+
+class CircuitState(Enum):
+    """Circuit state."""
+
+    Closed = 0
+    Open = 1
+    HalfOpen = 2
+
+
+class CircuitBreaker:
+    """Circuit breaker class.
+
+    The circuit opens after failure_threshold consecutive failures. While it
+    is open requests fail fast. Once the backoff has elapsed a single probe is
+    allowed (half open): success closes the circuit, failure opens it again
+    with twice the backoff (up to max_backoff).
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        min_backoff: float = CIRCUIT_BREAKER_MIN_BACKOFF,
+        max_backoff: float = CIRCUIT_BREAKER_MAX_BACKOFF,
+        on_state_change: Callable[[CircuitState, CircuitState], None] | None = None,
+    ):
+        """Initialize CircuitBreaker class."""
+
+        self.failure_threshold: int = failure_threshold
+        self.min_backoff: float = min_backoff
+        self.max_backoff: float = max_backoff
+        self.on_state_change = on_state_change
+        self.state: CircuitState = CircuitState.Closed
+        self.failures: int = 0
+        self.backoff: float = min_backoff
+        self.next_probe_time: float = 0.0
+
+    def get_state(self) -> CircuitState:
+        """Get circuit state."""
+
+        return self.state
+
+    def set_state(self, new_state: CircuitState) -> None:
+        """Set circuit state and notify the callback."""
+
+        old_state = self.state
+        if old_state == new_state:
+            return
+
+        self.state = new_state
+        logger.debug(f"Circuit is {new_state}")
+
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(old_state, new_state)
+            except Exception as e:
+                logger.error(f"Circuit state change callback failed: {e}")
+
+    def allow_request(self) -> bool:
+        """Check if a regular request may be sent."""
+
+        return self.state == CircuitState.Closed
+
+    def is_probe_due(self) -> bool:
+        """Check if the open circuit should be probed."""
+
+        return (
+            self.state == CircuitState.Open and time.monotonic() >= self.next_probe_time
+        )
+
+    def start_probe(self) -> None:
+        """Mark the circuit as half open while a probe is in flight."""
+
+        self.set_state(CircuitState.HalfOpen)
+
+    def record_success(self) -> None:
+        """Record a successful exchange."""
+
+        self.failures = 0
+        self.backoff = self.min_backoff
+        self.set_state(CircuitState.Closed)
+
+    def record_failure(self) -> None:
+        """Record a failed exchange."""
+
+        self.failures += 1
+
+        if self.state == CircuitState.HalfOpen:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open()
+        elif (
+            self.state == CircuitState.Closed
+            and self.failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        """Open the circuit and schedule the next probe."""
+
+        self.next_probe_time = time.monotonic() + self.backoff
+        self.set_state(CircuitState.Open)
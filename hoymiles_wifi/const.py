@@ -3,6 +3,84 @@
 DTU_PORT = 10081
 
 DEFAULT_TIMEOUT = 10
+MIN_TIMEOUT = 1
+
+# Minimum time between two requests to the same DTU
+REQUEST_INTERVAL = 2
+
+# Smoothing factors for the adaptive timeout (RFC 6298)
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_VARIANCE_FACTOR = 4
+
+# Timeout before the first sample and timeouts backed off before a DTU is
+# considered offline and probed with the estimate again
+RTT_INITIAL_TIMEOUT = 3
+RTT_MAX_BACKOFFS = 2
+
+# Consecutive failures before requests to a DTU fail fast
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+CIRCUIT_BREAKER_MIN_BACKOFF = 30
+CIRCUIT_BREAKER_MAX_BACKOFF = 900
+
+# Adaptive polling, polling faster than ~32s may disable the Hoymiles cloud
+POLL_MIN_INTERVAL = 35
+POLL_MAX_INTERVAL = 300
+POLL_IDLE_INTERVAL = 300
+POLL_IDLE_DATA_INTERVAL = 900
+POLL_TRANSIENT_THRESHOLD = 0.2
+
+# Shared memory snapshot table of the sharded fleet runner
+SNAPSHOT_SLOT_SIZE = 16384
+SNAPSHOT_HOST_SIZE = 64
+SNAPSHOT_READ_RETRIES = 1000
+
+# Exporter listen address and seconds a client may take to send its request
+EXPORTER_ADDRESS = "127.0.0.1"
+EXPORTER_PORT = 9099
+EXPORTER_READ_TIMEOUT = 10
+# Missed data polls after which the series of a DTU are no longer exported
+EXPORTER_STALE_POLLS = 3
+
+# DTUs queried at the same time by the CLI
+CLI_CONCURRENCY = 32
+
+# Seconds a resolved DTU hostname is cached and between retries after a failure
+RESOLVER_TTL = 300
+RESOLVER_RETRY_INTERVAL = 30
+
+# Requests in flight on a pipelined DTU connection, the limit is learned
+PIPELINE_INITIAL_IN_FLIGHT = 2
+PIPELINE_MAX_IN_FLIGHT = 8
+
+# Successful responses at the learned ceiling before it is raised by one
+PIPELINE_CEILING_RECOVERY = 64
+
+# Hosts checked at the same time and connect timeout in seconds of discovery
+DISCOVERY_CONCURRENCY = 256
+DISCOVERY_CONNECT_TIMEOUT = 1
+
+CAPTURE_SEGMENT_SIZE = 64 * 1024 * 1024
+DECODE_CHUNK_SIZE = 4096
+
+# JSON fragments the serializer buffers before writing them to its stream
+SERIALIZER_BUFFER_PARTS = 4096
+
+# Rollup windows: 1 minute, 15 minutes and 1 day
+ROLLUP_RESOLUTIONS = (60, 900, 86400)
+
+# Samples per series (a day at 30 s) and series per DTU of the time series store
+TIMESERIES_CAPACITY = 2880
+TIMESERIES_MAX_SERIES_PER_DTU = 1024
+
+# Factor of AppGetHistPowerReqDTO.power_array values to watts
+HIST_POWER_SCALE = 0.1
+
+# Frames kept per DTU for hex dumps while tracing
+TRACE_BUFFER_SIZE = 16
+
+# Seconds between writes of buffered history samples
+HISTORY_FLUSH_INTERVAL = 600
 
 
 # App -> DTU start with 0xa3, responses start 0xa2
@@ -1,11 +1,12 @@
 """Crypto utils for interacting with encrypted Hoymiles DTUs."""
 
 import struct
+from functools import lru_cache
 from hashlib import sha256
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from hoymiles_wifi import logger
+from hoymiles_wifi.tracing import is_enabled, trace_event
 
 
 def sha256_bytes(data: bytes) -> bytes:
@@ -13,6 +14,7 @@ def sha256_bytes(data: bytes) -> bytes:
     return sha256(data).digest()
 
 
+@lru_cache(maxsize=64)
 def derive_aes_128_key(encRand: bytes) -> bytes:
     """Derive a 128-bit AES key by triple SHA256 hashing the encRand."""
     assert len(encRand) == 16
@@ -43,26 +45,21 @@ def crypt_data(
     nonce = derive_nonce(enc_rand, u16_tag, u16_seq)
     aad = struct.pack("<HH", u16_tag, u16_seq)
 
-    logger.debug(f"[*] CMD  : {hex(u16_tag)}")
-    logger.debug(f"[*] Seq  : {hex(u16_seq)}")
-    logger.debug(f"[*] Enc rand: {enc_rand.hex()} ({len(enc_rand)})")
-    logger.debug(f"[*] Nonce: {nonce.hex()} ({len(nonce)})")
-    logger.debug(f"[*] AAD  : {aad.hex()} ({len(aad)})")
-    logger.debug(f"[*] Key  : {key.hex()} ({len(key)})")
-
     aesgcm = AESGCM(key)
     try:
         if encrypt:
             output_data = aesgcm.encrypt(nonce, input_data, associated_data=aad)
-            logger.debug(
-                f"[*] Ciphertext: {output_data.hex()} ({len(output_data)} bytes)"
-            )
         else:
             output_data = aesgcm.decrypt(nonce, input_data, associated_data=aad)
 
-            logger.debug("[*] Decryption succeeded using AES-GCM!")
-            logger.debug(
-                f"[*] Plaintext: {output_data.hex()} ({len(output_data)} bytes)"
+        if is_enabled():
+            trace_event(
+                "crypt",
+                tag=u16_tag,
+                seq=u16_seq,
+                encrypt=encrypt,
+                input_size=len(input_data),
+                output_size=len(output_data),
             )
 
         return output_data
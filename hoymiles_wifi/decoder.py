@@ -0,0 +1,249 @@
+"""Parallel offline decoding of captured DTU frames."""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+from hoymiles_wifi.capture import (
+    FLAG_ENCRYPTED,
+    FLAG_EXTENDED,
+    FRAME_RESPONSE,
+    CaptureReader,
+    CaptureRecord,
+    get_message_type,
+)
+from hoymiles_wifi.const import DECODE_CHUNK_SIZE
+from hoymiles_wifi.registry import RESPONSE_TAGS
+from hoymiles_wifi.serializer import message_to_json
+from hoymiles_wifi.transport import unpack_frame
+
+COLUMNS = ("timestamp", "host", "tag", "seq", "type_name", "message", "error")
+
+# Encryption keys of the worker process, set by _init_worker
+_enc_rands: dict[str, bytes] = {}
+_default_enc_rand: bytes = b""
+
+
+@dataclass
+class DecodeStats:
+    """Statistics of a decoding run."""
+
+    frames: int = 0
+    failed: int = 0
+
+    @property
+    def decoded(self) -> int:
+        """Number of frames decoded successfully."""
+
+        return self.frames - self.failed
+
+
+def _init_worker(enc_rands: dict[str, bytes], default_enc_rand: bytes) -> None:
+    """Set the encryption keys of a worker process."""
+
+    global _enc_rands, _default_enc_rand  # noqa: PLW0603
+
+    _enc_rands = enc_rands
+    _default_enc_rand = default_enc_rand
+
+
+def decode_records(
+    records: list[CaptureRecord],
+) -> dict[str, list[Any]]:
+    """Validate, decrypt and parse response records into columns.
+
+    Runs in the worker processes. The message type is the captured type name,
+    or the response type of the tag for records without one. Frames that fail
+    to decode, including records of a tag shared by several commands without
+    a type name, keep a None message and the reason in the error column.
+    """
+
+    columns: dict[str, list[Any]] = {name: [] for name in COLUMNS}
+
+    for record in records:
+        message = None
+        error = None
+        type_name = record.type_name
+
+        try:
+            if type_name:
+                message_type = get_message_type(type_name)
+            else:
+                commands = RESPONSE_TAGS.get(record.tag, ())
+                if not commands:
+                    raise ValueError(f"Unknown tag {hex(record.tag)}")
+                if len(commands) > 1:
+                    # Commands sharing a tag can't be told apart by the frame
+                    raise ValueError(
+                        f"Ambiguous tag {hex(record.tag)} without a type name"
+                    )
+                message_type = commands[0].response_type
+            type_name = message_type.DESCRIPTOR.full_name
+
+            _, _, payload = unpack_frame(
+                record.payload,
+                bool(record.flags & FLAG_ENCRYPTED),
+                _enc_rands.get(record.host, _default_enc_rand),
+                bool(record.flags & FLAG_EXTENDED),
+            )
+            message = message_to_json(
+                message_type.FromString(payload),
+                indent=None,
+                preserving_proto_field_name=True,
+            )
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        columns["timestamp"].append(record.timestamp)
+        columns["host"].append(record.host)
+        columns["tag"].append(record.tag)
+        columns["seq"].append(record.seq)
+        columns["type_name"].append(type_name)
+        columns["message"].append(message)
+        columns["error"].append(error)
+
+    return columns
+
+
+def iter_chunks(
+    records: Iterable[CaptureRecord], chunk_size: int
+) -> Iterator[list[CaptureRecord]]:
+    """Split a record stream into lists of chunk_size records."""
+
+    iterator = iter(records)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def iter_decoded_chunks(
+    reader: CaptureReader,
+    enc_rand: bytes = b"",
+    enc_rands: dict[str, bytes] | None = None,
+    processes: int | None = None,
+    chunk_size: int = DECODE_CHUNK_SIZE,
+    **filters: Any,
+) -> Iterator[dict[str, list[Any]]]:
+    """Decode the response frames of a capture on a process pool.
+
+    Chunks of chunk_size records are read from the memory mapped segments
+    and decoded by the workers, at most two chunks per worker are in flight.
+    Columns are yielded per chunk in capture order. enc_rands maps hosts to
+    their encryption random, enc_rand is used for all other hosts.
+    """
+
+    processes = processes or os.cpu_count() or 1
+    filters["phases"] = {FRAME_RESPONSE}
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(enc_rands or {}, enc_rand),
+    ) as executor:
+        pending: deque[Future] = deque()
+
+        for chunk in iter_chunks(reader.iter_records(**filters), chunk_size):
+            pending.append(executor.submit(decode_records, chunk))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def decode_capture(
+    directory: str | Path,
+    output: str | Path,
+    **kwargs: Any,
+) -> DecodeStats:
+    """Decode a capture into a Parquet file, one row group per chunk.
+
+    Arguments are passed to iter_decoded_chunks. Requires pyarrow.
+    """
+
+    try:
+        import pyarrow as pa  # noqa: PLC0415
+        import pyarrow.parquet as pq  # noqa: PLC0415
+    except ImportError as e:
+        raise ImportError(
+            "Writing Parquet files requires pyarrow, install hoymiles-wifi[parquet]"
+        ) from e
+
+    schema = pa.schema(
+        [
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("host", pa.dictionary(pa.int32(), pa.string())),
+            ("tag", pa.uint16()),
+            ("seq", pa.uint16()),
+            ("type_name", pa.dictionary(pa.int32(), pa.string())),
+            ("message", pa.string()),
+            ("error", pa.string()),
+        ]
+    )
+    stats = DecodeStats()
+
+    with pq.ParquetWriter(output, schema) as writer:
+        for columns in iter_decoded_chunks(CaptureReader(directory), **kwargs):
+            columns["timestamp"] = [
+                int(timestamp * 1_000_000) for timestamp in columns["timestamp"]
+            ]
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+
+            stats.frames += len(columns["error"])
+            stats.failed += sum(error is not None for error in columns["error"])
+
+    return stats
+
+
+def main() -> None:
+    """Decode a capture directory from the command line."""
+
+    parser = argparse.ArgumentParser(description="Decode captured DTU frames")
+    parser.add_argument("directory", type=str, help="Capture directory")
+    parser.add_argument("output", type=str, help="Parquet file to write")
+    parser.add_argument(
+        "--enc-rand",
+        type=str,
+        default="",
+        help="Encryption random of the captured DTUs",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DECODE_CHUNK_SIZE,
+        help="Number of frames decoded per task",
+    )
+    parser.add_argument(
+        "--start", type=float, default=None, help="First timestamp to decode"
+    )
+    parser.add_argument(
+        "--end", type=float, default=None, help="Timestamp to stop decoding at"
+    )
+    args = parser.parse_args()
+
+    stats = decode_capture(
+        args.directory,
+        args.output,
+        enc_rand=bytes.fromhex(args.enc_rand),
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        start=args.start,
+        end=args.end,
+    )
+    print(f"Decoded {stats.decoded} of {stats.frames} frames")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Change detection between consecutive real data snapshots."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from dataclasses import dataclass, field
+
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import RealDataPoint, iter_real_data_points
+
+SeriesKey = tuple[str, str, int, str]
+
+
+@dataclass
+class ChangeSet:
+    """Fields of a snapshot that changed since the previous one."""
+
+    dtu_serial_number: str
+    timestamp: int
+    changes: list[RealDataPoint] = field(default_factory=list)
+    removed: list[SeriesKey] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        """Check if anything changed."""
+
+        return bool(self.changes or self.removed)
+
+    def to_dict(self) -> dict:
+        """Convert the change set to a nested dictionary."""
+
+        devices: dict[str, dict] = {}
+        for point in self.changes:
+            device = devices.setdefault(point.serial_number, {"kind": point.kind})
+            if point.port:
+                device.setdefault("ports", {}).setdefault(point.port, {})[
+                    point.field
+                ] = point.value
+            else:
+                device[point.field] = point.value
+
+        return {
+            "dtu_serial_number": self.dtu_serial_number,
+            "timestamp": self.timestamp,
+            "devices": devices,
+            "removed": [list(key) for key in self.removed],
+        }
+
+
+class DeltaEngine:
+    """Compare snapshots per DTU, device, port and field.
+
+    A value is reported when it differs from the last reported value of its
+    series by more than the tolerance of the field. Comparing against the
+    last reported value (instead of the previous snapshot) keeps slow drifts
+    from going unnoticed. Tolerances are looked up by (kind, field) first and
+    then by field name, e.g. {"voltage": 0.5, ("port", "power"): 1}.
+    """
+
+    def __init__(
+        self,
+        tolerances: dict[str | tuple[str, str], float] | None = None,
+        default_tolerance: float = 0.0,
+        scaled: bool = True,
+    ):
+        """Initialize DeltaEngine class."""
+
+        self.tolerances: dict[str | tuple[str, str], float] = tolerances or {}
+        self.default_tolerance: float = default_tolerance
+        self.scaled: bool = scaled
+        # dtu serial number -> series -> last reported value
+        self.state: dict[str, dict[SeriesKey, float]] = {}
+        self._tolerance_cache: dict[tuple[str, str], float] = {}
+
+    def get_tolerance(self, kind: str, field_name: str) -> float:
+        """Get the tolerance of a field."""
+
+        key = (kind, field_name)
+        tolerance = self._tolerance_cache.get(key)
+
+        if tolerance is None:
+            tolerance = self.tolerances.get(
+                key, self.tolerances.get(field_name, self.default_tolerance)
+            )
+            self._tolerance_cache[key] = tolerance
+
+        return tolerance
+
+    def diff(self, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> ChangeSet:
+        """Get the changes of a snapshot and remember its values."""
+
+        dtu_serial_number = real_data.device_serial_number
+        previous = self.state.setdefault(dtu_serial_number, {})
+        change_set = ChangeSet(dtu_serial_number, real_data.timestamp)
+        seen: set[SeriesKey] = set()
+
+        for point in iter_real_data_points(real_data, scaled=self.scaled):
+            key = (point.kind, point.serial_number, point.port, point.field)
+            seen.add(key)
+
+            old_value = previous.get(key)
+            if old_value is not None and abs(
+                point.value - old_value
+            ) <= self.get_tolerance(point.kind, point.field):
+                continue
+
+            previous[key] = point.value
+            change_set.changes.append(point)
+
+        if len(seen) != len(previous):
+            change_set.removed = [key for key in previous if key not in seen]
+            for key in change_set.removed:
+                del previous[key]
+
+        return change_set
+
+    def reset(self, dtu_serial_number: str | None = None) -> None:
+        """Forget the reported values of one or all DTUs."""
+
+        if dtu_serial_number is None:
+            self.state.clear()
+        else:
+            self.state.pop(dtu_serial_number, None)
+
+
+def iter_changes(
+    snapshots: Iterable[RealDataNew_pb2.RealDataNewReqDTO],
+    engine: DeltaEngine | None = None,
+) -> Iterator[ChangeSet]:
+    """Yield the non-empty change sets of a stream of snapshots."""
+
+    engine = engine if engine is not None else DeltaEngine()
+
+    for real_data in snapshots:
+        change_set = engine.diff(real_data)
+        if change_set:
+            yield change_set
+
+
+async def async_iter_changes(
+    snapshots: AsyncIterable[RealDataNew_pb2.RealDataNewReqDTO],
+    engine: DeltaEngine | None = None,
+) -> AsyncIterator[ChangeSet]:
+    """Yield the non-empty change sets of an asynchronous stream of snapshots."""
+
+    engine = engine if engine is not None else DeltaEngine()
+
+    async for real_data in snapshots:
+        change_set = engine.diff(real_data)
+        if change_set:
+            yield change_set
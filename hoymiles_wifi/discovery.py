@@ -0,0 +1,168 @@
+"""Discovery of DTUs in local networks."""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import (
+    DEFAULT_TIMEOUT,
+    DISCOVERY_CONCURRENCY,
+    DISCOVERY_CONNECT_TIMEOUT,
+    DTU_PORT,
+)
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.hoymiles import (
+    generate_dtu_version_string,
+    get_dtu_model_name,
+    is_encrypted_dtu,
+)
+
+
+@dataclass
+class DiscoveredDTU:
+    """DTU found by a network scan.
+
+    Fields the DTU did not answer are None.
+    """
+
+    host: str
+    serial_number: str | None = None
+    model: str | None = None
+    sw_version: str | None = None
+    hw_version: str | None = None
+    is_encrypted: bool | None = None
+    enc_rand: str | None = None
+
+
+def iter_network_hosts(networks: list[str]) -> Iterator[str]:
+    """Iterate over the host addresses of CIDR ranges, single addresses included.
+
+    Raises ValueError for invalid ranges.
+    """
+
+    parsed = [
+        ipaddress.ip_network(network.strip(), strict=False) for network in networks
+    ]
+
+    return (str(address) for network in parsed for address in network.hosts())
+
+
+async def async_is_port_open(
+    host: str,
+    port: int = DTU_PORT,
+    timeout: float = DISCOVERY_CONNECT_TIMEOUT,
+    local_addr: str | None = None,
+) -> bool:
+    """Check whether a TCP connection to host and port can be opened."""
+
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host=host,
+                port=port,
+                local_addr=(local_addr, 0) if local_addr is not None else None,
+            ),
+            timeout,
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError as e:
+        logger.debug(f"Error closing writer: {e}")
+
+    return True
+
+
+async def async_probe_dtu(
+    host: str,
+    local_addr: str | None = None,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> DiscoveredDTU:
+    """Identify the DTU at host with a heartbeat and its information data.
+
+    Both requests are sent unencrypted, so encrypted DTUs are identified
+    without knowing their enc_rand.
+    """
+
+    dtu = DTU(host, local_addr, timeout=timeout)
+    discovered = DiscoveredDTU(host)
+
+    heartbeat = await dtu.async_heartbeat()
+    if heartbeat is not None and heartbeat.dtu_serial_number:
+        discovered.serial_number = heartbeat.dtu_serial_number
+
+    information_data = await dtu.async_app_information_data()
+    if information_data is not None:
+        dtu_info = information_data.dtu_info
+        discovered.serial_number = (
+            information_data.dtu_serial_number or discovered.serial_number
+        )
+        discovered.sw_version = "V" + generate_dtu_version_string(
+            dtu_info.dtu_sw_version
+        )
+        discovered.hw_version = "H" + generate_dtu_version_string(
+            dtu_info.dtu_hw_version
+        )
+        discovered.is_encrypted = bool(is_encrypted_dtu(dtu_info.dfs))
+        if discovered.is_encrypted:
+            discovered.enc_rand = dtu_info.enc_rand.hex()
+
+    if discovered.serial_number:
+        try:
+            discovered.model = get_dtu_model_name(discovered.serial_number)
+        except ValueError as e:
+            logger.debug(f"Unknown DTU model {discovered.serial_number}: {e}")
+            discovered.model = "Unknown"
+
+    return discovered
+
+
+async def async_discover(
+    networks: list[str],
+    concurrency: int = DISCOVERY_CONCURRENCY,
+    connect_timeout: float = DISCOVERY_CONNECT_TIMEOUT,
+    local_addr: str | None = None,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> AsyncIterator[DiscoveredDTU]:
+    """Scan CIDR ranges for DTUs and yield each one as soon as it is probed.
+
+    concurrency workers check the hosts for an open DTU port, a host with
+    an open port is then identified with async_probe_dtu.
+    """
+
+    hosts = iter_network_hosts(networks)
+    results: asyncio.Queue[DiscoveredDTU | None] = asyncio.Queue()
+
+    async def async_worker() -> None:
+        try:
+            for host in hosts:
+                if await async_is_port_open(
+                    host, timeout=connect_timeout, local_addr=local_addr
+                ):
+                    logger.debug(f"Port {DTU_PORT} open on {host}")
+                    await results.put(await async_probe_dtu(host, local_addr, timeout))
+        finally:
+            await results.put(None)
+
+    workers = [asyncio.create_task(async_worker()) for _ in range(max(1, concurrency))]
+    running = len(workers)
+
+    try:
+        while running:
+            discovered = await results.get()
+            if discovered is None:
+                running -= 1
+                continue
+
+            yield discovered
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -5,13 +5,23 @@ from __future__ import annotations
 import asyncio
 import struct
 import time
+from collections.abc import Awaitable, Callable
 from datetime import datetime
 from enum import Enum, IntEnum
-from typing import Any
-
-from crcmod import mkCrcFun
+from typing import Any, NamedTuple, TypeVar
 
 from hoymiles_wifi import logger
+from hoymiles_wifi.address_pool import InterfaceStats
+from hoymiles_wifi.capture import (
+    FLAG_ENCRYPTED,
+    FLAG_EXTENDED,
+    FRAME_REQUEST,
+    FRAME_REQUEST_PLAIN,
+    FRAME_RESPONSE,
+    FRAME_RESPONSE_PLAIN,
+    FrameCapture,
+)
+from hoymiles_wifi.circuit_breaker import CircuitBreaker, CircuitState
 from hoymiles_wifi.const import (
     CMD_ACTION_ALARM_LIST,
     CMD_ACTION_DTU_REBOOT,
@@ -21,28 +31,15 @@ from hoymiles_wifi.const import (
     CMD_ACTION_MI_SHUTDOWN,
     CMD_ACTION_MI_START,
     CMD_ACTION_PERFORMANCE_DATA_MODE,
-    CMD_APP_GET_HIST_POWER_RES,
-    CMD_APP_INFO_DATA_RES_DTO,
-    CMD_CLOUD_COMMAND_RES_DTO,
-    CMD_COMMAND_RES_DTO,
-    CMD_ES_DATA_DTO,
-    CMD_ES_REG_RES_DTO,
-    CMD_ES_USER_SET_RES_DTO,
-    CMD_GET_CONFIG,
-    CMD_GW_INFO_RES_DTO,
-    CMD_GW_NET_INFO_RES,
-    CMD_HB_RES_DTO,
     CMD_HEADER,
-    CMD_NETWORK_INFO_RES,
-    CMD_REAL_DATA_RES_DTO,
-    CMD_REAL_RES_DTO,
-    CMD_SET_CONFIG,
     DEFAULT_TIMEOUT,
     DEV_DTU,
     DTU_FIRMWARE_URL_00_01_11,
     DTU_PORT,
-    NOT_ENCRYPTED_COMMANDS,
     OFFSET,
+    PIPELINE_MAX_IN_FLIGHT,
+    REQUEST_INTERVAL,
+    RESOLVER_TTL,
 )
 from hoymiles_wifi.crypt_util import crypt_data
 from hoymiles_wifi.hoymiles import (
@@ -55,6 +52,7 @@ from hoymiles_wifi.hoymiles import (
     encode_week_range,
     float_to_scaled_int,
 )
+from hoymiles_wifi.pipeline import PipelineLimit
 from hoymiles_wifi.protobuf import (
     AppGetHistPower_pb2,
     APPHeartbeatPB_pb2,
@@ -72,8 +70,40 @@ from hoymiles_wifi.protobuf import (
     RealDataNew_pb2,
     SetConfig_pb2,
 )
+from hoymiles_wifi.registry import (
+    APP_GET_HIST_POWER,
+    APP_INFORMATION_DATA,
+    CLOUD_COMMAND,
+    COMMAND,
+    ENERGY_STORAGE_DATA,
+    ENERGY_STORAGE_REGISTRY,
+    ENERGY_STORAGE_WORKING_MODE,
+    GATEWAY_INFO,
+    GATEWAY_NETWORK_INFO,
+    GET_CONFIG,
+    HEARTBEAT,
+    INFORMATION_DATA,
+    NETWORK_INFO,
+    REAL_DATA,
+    REAL_DATA_NEW,
+    SET_CONFIG,
+    CommandInfo,
+)
+from hoymiles_wifi.request_queue import RequestPriority, RequestQueue
+from hoymiles_wifi.resolver import HostResolver, get_address_family, is_ip_address
+from hoymiles_wifi.rtt import RttEstimator
+from hoymiles_wifi.tracing import Tracer, is_enabled
+from hoymiles_wifi.transport import (
+    FrameProtocol,
+    async_open_frame_connection,
+    crc16_modbus,
+    is_encrypted_frame,
+    unpack_frame,
+)
 from hoymiles_wifi.utils import initialize_set_config
 
+T = TypeVar("T")
+
 
 class NetmodeSelect(IntEnum):
     """Network mode selection."""
@@ -91,6 +121,15 @@ class NetworkState(Enum):
     Offline = 2
 
 
+class RawResponse(NamedTuple):
+    """Validated and decrypted response payload that was not parsed."""
+
+    tag: int
+    seq: int
+    header: bytes
+    payload: bytes | memoryview
+
+
 class DTU:
     """DTU class."""
 
@@ -101,18 +140,60 @@ class DTU:
         is_encrypted: bool = False,
         enc_rand: bytes = b"",
         timeout: int = DEFAULT_TIMEOUT,
+        *,
+        adaptive_timeout: bool = True,
+        circuit_breaker: CircuitBreaker | None = None,
+        capture: FrameCapture | None = None,
+        interface_stats: InterfaceStats | None = None,
+        dns_ttl: float = RESOLVER_TTL,
+        frame_transport: bool = False,
+        pipelining: bool = False,
+        max_in_flight: int = PIPELINE_MAX_IN_FLIGHT,
     ):
-        """Initialize DTU class."""
+        """Initialize DTU class.
+
+        Round-trip times are tracked per command in rtt_estimators. With
+        adaptive_timeout enabled, timeout is the ceiling of a per-command
+        timeout derived from them, otherwise timeout is used as is.
+        Requests fail fast while the circuit of circuit_breaker is open, without a
+        circuit_breaker every request is sent. Frames are recorded to capture if given.
+        Exchanges are counted in interface_stats if given. A hostname is
+        resolved once and cached for dns_ttl seconds, 0 resolves it on every
+        request. With frame_transport set, exchanges use the lightweight
+        FrameProtocol instead of asyncio streams.
+
+        With pipelining set, requests share one FrameProtocol connection and
+        are sent without waiting for earlier responses or REQUEST_INTERVAL.
+        Responses are matched by sequence number and the requests in flight
+        are capped by a limit learned up to max_in_flight. Only enable it
+        for DTUs that tolerate it and call close when done.
+        """
 
         self.host: str = host
         self.local_addr: str = local_addr
         self.state: NetworkState = NetworkState.Unknown
         self.sequence: int = 0
-        self.mutex: asyncio.Lock = asyncio.Lock()
+        self.mutex: RequestQueue = RequestQueue()
         self.last_request_time: int = 0
         self.is_encrypted: bool = is_encrypted
         self.enc_rand: bytes = enc_rand
         self.timeout: int = timeout
+        self.adaptive_timeout: bool = adaptive_timeout
+        self.rtt_estimators: dict[bytes, RttEstimator] = {}
+        self.circuit_breaker: CircuitBreaker | None = circuit_breaker
+        self.capture: FrameCapture | None = capture
+        self.tracer: Tracer = Tracer(host)
+        self.interface_stats: InterfaceStats | None = interface_stats
+        self.resolver: HostResolver | None = (
+            HostResolver(host, dns_ttl, family=get_address_family(local_addr))
+            if dns_ttl > 0 and not is_ip_address(host)
+            else None
+        )
+        self.frame_transport: bool = frame_transport
+        self.pipeline: PipelineLimit | None = (
+            PipelineLimit(max_in_flight) if pipelining else None
+        )
+        self.connection: FrameProtocol | None = None
 
     def get_state(self) -> NetworkState:
         """Get DTU state."""
@@ -122,11 +203,71 @@ class DTU:
     def set_state(self, new_state: NetworkState):
         """Set DTU state."""
 
+        if self.circuit_breaker is not None:
+            if new_state == NetworkState.Online:
+                self.circuit_breaker.record_success()
+            elif new_state == NetworkState.Offline:
+                self.circuit_breaker.record_failure()
+
         if self.state != new_state:
             self.state = new_state
             logger.debug(f"DTU is {new_state}")
 
-    async def async_get_real_data(self) -> RealData_pb2.RealDataReqDTO | None:
+    def get_rtt_estimator(self, command: bytes) -> RttEstimator:
+        """Get the round-trip time estimator for a command."""
+
+        estimator = self.rtt_estimators.get(command)
+        if estimator is None:
+            estimator = RttEstimator(max_timeout=self.timeout)
+            self.rtt_estimators[command] = estimator
+
+        # Follow changes of the configured timeout
+        estimator.max_timeout = self.timeout
+        return estimator
+
+    def get_timeout(self, command: bytes) -> float:
+        """Get the timeout for the next exchange of a command."""
+
+        if not self.adaptive_timeout:
+            return self.timeout
+
+        return self.get_rtt_estimator(command).get_timeout()
+
+    def capture_frame(
+        self,
+        phase: int,
+        tag: int,
+        seq: int,
+        payload: bytes,
+        *,
+        message_type: Any,
+        is_extended_format: bool,
+    ) -> None:
+        """Record a frame if capturing is enabled."""
+
+        if self.capture is None:
+            return
+
+        flags = FLAG_EXTENDED if is_extended_format else 0
+        if is_encrypted_frame(tag, self.is_encrypted, is_extended_format):
+            flags |= FLAG_ENCRYPTED
+
+        try:
+            self.capture.record(
+                self.host,
+                tag,
+                seq,
+                phase,
+                bytes(payload),
+                flags=flags,
+                type_name=message_type.DESCRIPTOR.full_name,
+            )
+        except (OSError, ValueError) as e:
+            logger.debug(f"Failed to capture frame: {e}")
+
+    async def async_get_real_data(
+        self, *, raw: bool = False
+    ) -> RealData_pb2.RealDataReqDTO | RawResponse | None:
         """Get real data."""
 
         request = RealData_pb2.RealDataResDTO()
@@ -137,13 +278,21 @@ class DTU:
         request.offset = OFFSET
         request.error_code = 0
 
-        command = CMD_REAL_DATA_RES_DTO
-        return await self.async_send_request(
-            command, request, RealData_pb2.RealDataReqDTO
+        return await self._async_send_command(
+            REAL_DATA,
+            request,
+            priority=RequestPriority.TELEMETRY,
+            raw=raw,
         )
 
-    async def async_get_real_data_new(self) -> RealDataNew_pb2.RealDataNewReqDTO | None:
-        """Get real data new."""
+    async def async_get_real_data_new(
+        self, *, raw: bool = False
+    ) -> RealDataNew_pb2.RealDataNewReqDTO | RawResponse | None:
+        """Get real data new.
+
+        In raw mode the payloads of all pages are concatenated, which parses
+        to the same message as merging the pages.
+        """
 
         combined_response = RealDataNew_pb2.RealDataNewReqDTO()
 
@@ -154,11 +303,15 @@ class DTU:
         request.offset = OFFSET
         request.time = int(time.time())
         request.cp = 0
-        command = CMD_REAL_RES_DTO
+
+        if raw:
+            return await self._async_get_pages_raw(REAL_DATA_NEW, request)
 
         # Await the initial response
-        response = await self.async_send_request(
-            command, request, RealDataNew_pb2.RealDataNewReqDTO
+        response = await self._async_send_command(
+            REAL_DATA_NEW,
+            request,
+            priority=RequestPriority.TELEMETRY,
         )
 
         # Combine the initial response into the combined_response
@@ -166,44 +319,47 @@ class DTU:
             combined_response.MergeFrom(response)
 
             # Fetch additional data based on the value of response.ap
-            for cp in range(1, response.ap):
-                request.cp = cp
-
-                additional_response = await self.async_send_request(
-                    command, request, RealDataNew_pb2.RealDataNewReqDTO
-                )
+            for additional_response in await self._async_get_pages(
+                REAL_DATA_NEW, request, response.ap
+            ):
                 if additional_response is not None:
                     combined_response.MergeFrom(additional_response)
 
         return combined_response if combined_response.ByteSize() > 0 else None
 
-    async def async_get_config(self) -> GetConfig_pb2.GetConfigReqDTO | None:
+    async def async_get_config(
+        self, *, raw: bool = False
+    ) -> GetConfig_pb2.GetConfigReqDTO | RawResponse | None:
         """Get config."""
 
         request = GetConfig_pb2.GetConfigResDTO()
         request.offset = OFFSET
         request.time = int(time.time()) - 60
-        command = CMD_GET_CONFIG
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            GET_CONFIG,
             request,
-            GetConfig_pb2.GetConfigReqDTO,
+            raw=raw,
         )
 
-    async def async_network_info(self) -> NetworkInfo_pb2.NetworkInfoReqDTO | None:
+    async def async_network_info(
+        self, *, raw: bool = False
+    ) -> NetworkInfo_pb2.NetworkInfoReqDTO | RawResponse | None:
         """Get network info."""
 
         request = NetworkInfo_pb2.NetworkInfoResDTO()
         request.offset = OFFSET
         request.time = int(time.time())
-        command = CMD_NETWORK_INFO_RES
-        return await self.async_send_request(
-            command, request, NetworkInfo_pb2.NetworkInfoReqDTO
+        return await self._async_send_command(
+            NETWORK_INFO,
+            request,
+            raw=raw,
         )
 
     async def async_app_information_data(
         self,
-    ) -> APPInfomationData_pb2.APPInfoDataReqDTO:
+        *,
+        raw: bool = False,
+    ) -> APPInfomationData_pb2.APPInfoDataReqDTO | RawResponse | None:
         """Get app information data."""
         request = APPInfomationData_pb2.APPInfoDataResDTO()
         request.time_ymd_hms = (
@@ -211,15 +367,22 @@ class DTU:
         )
         request.offset = OFFSET
         request.time = int(time.time())
-        command = CMD_APP_INFO_DATA_RES_DTO
-        return await self.async_send_request(
-            command, request, APPInfomationData_pb2.APPInfoDataReqDTO
+        return await self._async_send_command(
+            APP_INFORMATION_DATA,
+            request,
+            raw=raw,
         )
 
     async def async_app_get_hist_power(
         self,
-    ) -> AppGetHistPower_pb2.AppGetHistPowerReqDTO | None:
-        """Get historical power."""
+        *,
+        raw: bool = False,
+    ) -> AppGetHistPower_pb2.AppGetHistPowerReqDTO | RawResponse | None:
+        """Get historical power.
+
+        In raw mode the payloads of all pages are concatenated, which parses
+        to the same message as merging the pages.
+        """
 
         combined_response = AppGetHistPower_pb2.AppGetHistPowerReqDTO()
 
@@ -228,12 +391,16 @@ class DTU:
         request.offset = OFFSET
         request.requested_time = int(time.time())
         request.requested_day = 0
-        command = CMD_APP_GET_HIST_POWER_RES
 
-        response = await self.async_send_request(
-            command,
+        if raw:
+            return await self._async_get_pages_raw(
+                APP_GET_HIST_POWER, request, restore_fields=("absolute_start",)
+            )
+
+        response = await self._async_send_command(
+            APP_GET_HIST_POWER,
             request,
-            AppGetHistPower_pb2.AppGetHistPowerReqDTO,
+            priority=RequestPriority.TELEMETRY,
         )
 
         if response is not None:
@@ -243,14 +410,9 @@ class DTU:
             combined_response.MergeFrom(response)
 
             # Fetch additional data based on the value of response.ap
-            for cp in range(1, response.ap):
-                request.cp = cp
-
-                additional_response = await self.async_send_request(
-                    command,
-                    request,
-                    AppGetHistPower_pb2.AppGetHistPowerReqDTO,
-                )
+            for additional_response in await self._async_get_pages(
+                APP_GET_HIST_POWER, request, response.ap
+            ):
                 if additional_response is not None:
                     combined_response.MergeFrom(additional_response)
 
@@ -259,10 +421,93 @@ class DTU:
 
         return combined_response if combined_response.ByteSize() > 0 else None
 
+    async def _async_get_pages(
+        self,
+        info: CommandInfo,
+        request: Any,
+        pages: int,
+        *,
+        raw: bool = False,
+    ) -> list[Any]:
+        """Request the pages after the first of a paged response in order.
+
+        With pipelining the pages are requested concurrently. Pages that
+        failed are None.
+        """
+
+        requests = []
+        for cp in range(1, pages):
+            page_request = type(request)()
+            page_request.CopyFrom(request)
+            page_request.cp = cp
+            requests.append(page_request)
+
+        if self.pipeline is None:
+            return [
+                await self._async_send_command(
+                    info, page_request, priority=RequestPriority.TELEMETRY, raw=raw
+                )
+                for page_request in requests
+            ]
+
+        return await asyncio.gather(
+            *(
+                self._async_send_command(
+                    info, page_request, priority=RequestPriority.TELEMETRY, raw=raw
+                )
+                for page_request in requests
+            )
+        )
+
+    async def _async_get_pages_raw(
+        self,
+        info: CommandInfo,
+        request: Any,
+        restore_fields: tuple[str, ...] = (),
+    ) -> RawResponse | None:
+        """Request all pages of a paged response without parsing them.
+
+        Only the first page is parsed to read the number of pages. Fields in
+        restore_fields keep the value of the first page.
+        """
+
+        response = await self._async_send_command(
+            info, request, priority=RequestPriority.TELEMETRY, raw=True
+        )
+
+        if response is None:
+            return None
+
+        first_page = info.response_type.FromString(response.payload)
+        if first_page.ap <= 1:
+            return response
+
+        payloads = [response.payload]
+
+        payloads.extend(
+            additional_response.payload
+            for additional_response in await self._async_get_pages(
+                info, request, first_page.ap, raw=True
+            )
+            if additional_response is not None
+        )
+
+        if restore_fields:
+            # Later fields win when parsing, so append the initial values
+            payloads.append(
+                info.response_type(
+                    **{field: getattr(first_page, field) for field in restore_fields}
+                ).SerializeToString()
+            )
+
+        return response._replace(payload=b"".join(payloads))
+
     async def async_set_power_limit(
         self,
         power_limit: int,
-    ) -> CommandPB_pb2.CommandReqDTO | None:
+        *,
+        raw: bool = False,
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Set power limit."""
         if power_limit < 0 or power_limit > 100:
             logger.error("Error. Invalid power limit!")
@@ -277,15 +522,16 @@ class DTU:
         request.tid = int(time.time())
         request.data = f"A:{power_limit},B:0,C:0\r".encode()
 
-        command = CMD_COMMAND_RES_DTO
-
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_set_wifi(
-        self, ssid: str, password: str
-    ) -> SetConfig_pb2.SetConfigReqDTO | None:
+        self, ssid: str, password: str, *, raw: bool = False
+    ) -> SetConfig_pb2.SetConfigReqDTO | RawResponse | None:
         """Set wifi."""
 
         get_config_req = await self.async_get_config()
@@ -303,15 +549,19 @@ class DTU:
         request.wifi_ssid = ssid.encode("utf-8")
         request.wifi_password = password.encode("utf-8")
 
-        command = CMD_SET_CONFIG
-        return await self.async_send_request(
-            command, request, SetConfig_pb2.SetConfigReqDTO
+        return await self._async_send_command(
+            SET_CONFIG,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_update_dtu_firmware(
         self,
         firmware_url: str = DTU_FIRMWARE_URL_00_01_11,
-    ) -> CommandPB_pb2.CommandReqDTO | None:
+        *,
+        raw: bool = False,
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Update DTU firmware."""
 
         request = CommandPB_pb2.CommandResDTO()
@@ -320,12 +570,16 @@ class DTU:
         request.tid = int(time.time())
         request.data = (firmware_url + "\r").encode("utf-8")
 
-        command = CMD_CLOUD_COMMAND_RES_DTO
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            CLOUD_COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
-    async def async_restart_dtu(self) -> CommandPB_pb2.CommandReqDTO | None:
+    async def async_restart_dtu(
+        self, *, raw: bool = False
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Restart DTU."""
 
         request = CommandPB_pb2.CommandResDTO()
@@ -333,14 +587,16 @@ class DTU:
         request.package_nub = 1
         request.tid = int(time.time())
 
-        command = CMD_CLOUD_COMMAND_RES_DTO
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            CLOUD_COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_turn_on_inverter(
-        self, inverter_serial: str
-    ) -> CommandPB_pb2.CommandReqDTO | None:
+        self, inverter_serial: str, *, raw: bool = False
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Turn on Inverter."""
 
         inverter_serial_int = convert_inverter_serial_number(inverter_serial)
@@ -352,15 +608,16 @@ class DTU:
         request.tid = int(time.time())
         request.mi_to_sn.extend([inverter_serial_int])
 
-        command = CMD_CLOUD_COMMAND_RES_DTO
-
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            CLOUD_COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_turn_off_inverter(
-        self, inverter_serial: str
-    ) -> CommandPB_pb2.CommandReqDTO | None:
+        self, inverter_serial: str, *, raw: bool = False
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Turn off Inverter."""
 
         inverter_serial_int = convert_inverter_serial_number(inverter_serial)
@@ -372,15 +629,16 @@ class DTU:
         request.tid = int(time.time())
         request.mi_to_sn.extend([inverter_serial_int])
 
-        command = CMD_CLOUD_COMMAND_RES_DTO
-
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            CLOUD_COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_reboot_inverter(
-        self, inverter_serial: str
-    ) -> CommandPB_pb2.CommandResDTO | None:
+        self, inverter_serial: str, *, raw: bool = False
+    ) -> CommandPB_pb2.CommandResDTO | RawResponse | None:
         """Reboot Inverter."""
 
         inverter_serial_int = convert_inverter_serial_number(inverter_serial)
@@ -392,15 +650,18 @@ class DTU:
         request.tid = int(time.time())
         request.mi_to_sn.extend([inverter_serial_int])
 
-        command = CMD_CLOUD_COMMAND_RES_DTO
-
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            CLOUD_COMMAND,
+            request,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
         )
 
     async def async_get_information_data(
         self,
-    ) -> InfomationData_pb2.InfoDataResDTO | None:
+        *,
+        raw: bool = False,
+    ) -> InfomationData_pb2.InfoDataResDTO | RawResponse | None:
         """Get information data."""
 
         request = InfomationData_pb2.InfoDataResDTO()
@@ -409,14 +670,59 @@ class DTU:
         )
         request.offset = OFFSET
         request.time = int(time.time())
-        command = CMD_APP_INFO_DATA_RES_DTO
-        return await self.async_send_request(
-            command, request, InfomationData_pb2.InfoDataReqDTO
+        return await self._async_send_command(
+            INFORMATION_DATA,
+            request,
+            raw=raw,
         )
 
-    async def async_heartbeat(self) -> APPHeartbeatPB_pb2.HBReqDTO | None:
+    async def async_heartbeat(
+        self, *, raw: bool = False
+    ) -> APPHeartbeatPB_pb2.HBReqDTO | RawResponse | None:
         """Request heartbeat."""
 
+        return await self._async_send_command(
+            HEARTBEAT,
+            self._create_heartbeat_request(),
+            raw=raw,
+        )
+
+    async def async_probe(self) -> bool:
+        """Probe an open circuit with a heartbeat.
+
+        Returns True if requests may be sent to the DTU.
+        """
+
+        breaker = self.circuit_breaker
+
+        if breaker is None or breaker.allow_request():
+            return True
+
+        if not breaker.is_probe_due():
+            return False
+
+        breaker.start_probe()
+        try:
+            response = await self._async_send_request(
+                HEARTBEAT.command,
+                self._create_heartbeat_request(),
+                HEARTBEAT.response_type,
+            )
+        except asyncio.CancelledError:
+            # Reopen the circuit, a half open circuit is never probed again
+            if breaker.get_state() == CircuitState.HalfOpen:
+                breaker.record_failure()
+            raise
+
+        if response is None and breaker.get_state() == CircuitState.HalfOpen:
+            # The DTU answered with garbage, keep the circuit open
+            breaker.record_failure()
+
+        return breaker.allow_request()
+
+    def _create_heartbeat_request(self) -> APPHeartbeatPB_pb2.HBResDTO:
+        """Create heartbeat request."""
+
         request = APPHeartbeatPB_pb2.HBResDTO()
         request.time_ymd_hms = (
             datetime.now().strftime("%Y-%m-%d %H:%M:%S").encode("utf-8")
@@ -424,12 +730,11 @@ class DTU:
         request.offset = OFFSET
         request.time = int(time.time())
 
-        command = CMD_HB_RES_DTO
-        return await self.async_send_request(
-            command, request, APPHeartbeatPB_pb2.HBReqDTO
-        )
+        return request
 
-    async def async_get_alarm_list(self) -> CommandPB_pb2.CommandResDTO | None:
+    async def async_get_alarm_list(
+        self, *, raw: bool = False
+    ) -> CommandPB_pb2.CommandResDTO | RawResponse | None:
         """Turn off DTU."""
 
         request = CommandPB_pb2.CommandResDTO()
@@ -438,14 +743,17 @@ class DTU:
         request.dev_kind = 0
         request.tid = int(time.time())
 
-        command = CMD_COMMAND_RES_DTO
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            COMMAND,
+            request,
+            raw=raw,
         )
 
     async def async_enable_performance_data_mode(
         self,
-    ) -> CommandPB_pb2.CommandReqDTO | None:
+        *,
+        raw: bool = False,
+    ) -> CommandPB_pb2.CommandReqDTO | RawResponse | None:
         """Enable performance data mode."""
 
         request = CommandPB_pb2.CommandResDTO()
@@ -453,51 +761,48 @@ class DTU:
         request.action = CMD_ACTION_PERFORMANCE_DATA_MODE
         request.package_nub = 1
 
-        command = CMD_COMMAND_RES_DTO
-        return await self.async_send_request(
-            command, request, CommandPB_pb2.CommandReqDTO
+        return await self._async_send_command(
+            COMMAND,
+            request,
+            raw=raw,
         )
 
-    async def async_get_gateway_info(self) -> GWInfo_pb2.GWInfoReqDTO | None:
+    async def async_get_gateway_info(
+        self, *, raw: bool = False
+    ) -> GWInfo_pb2.GWInfoReqDTO | RawResponse | None:
         """Get gateway info."""
 
         request = GWInfo_pb2.GWInfoResDTO()
         request.time = int(time.time())
         request.offset = OFFSET
 
-        command = CMD_GW_INFO_RES_DTO
-
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            GATEWAY_INFO,
             request,
-            GWInfo_pb2.GWInfoReqDTO,
-            is_extended_format=True,
             number=255,
+            raw=raw,
         )
 
     async def async_get_gateway_network_info(
-        self, dtu_serial_number: int
-    ) -> GWNetInfo_pb2.GWNetInfoReq | None:
+        self, dtu_serial_number: int, *, raw: bool = False
+    ) -> GWNetInfo_pb2.GWNetInfoReq | RawResponse | None:
         """Get gateway network info."""
 
         request = GWNetInfo_pb2.GWNetInfoRes()
         request.time = int(time.time())
         request.offset = OFFSET
 
-        command = CMD_GW_NET_INFO_RES
-
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            GATEWAY_NETWORK_INFO,
             request,
-            GWNetInfo_pb2.GWNetInfoReq,
-            is_extended_format=True,
             dtu_serial_number=dtu_serial_number,
             number=255,
+            raw=raw,
         )
 
     async def async_get_energy_storage_registry(
-        self, dtu_serial_number: int
-    ) -> ESRegPB_pb2.ESRegReqDTO | None:
+        self, dtu_serial_number: int, *, raw: bool = False
+    ) -> ESRegPB_pb2.ESRegReqDTO | RawResponse | None:
         """Get energy storage registry."""
 
         request = ESRegPB_pb2.ESRegResDTO()
@@ -508,20 +813,17 @@ class DTU:
         request.offset = OFFSET
         request.cp = 0
 
-        command = CMD_ES_REG_RES_DTO
-
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            ENERGY_STORAGE_REGISTRY,
             request,
-            ESRegPB_pb2.ESRegReqDTO,
-            is_extended_format=True,
             dtu_serial_number=dtu_serial_number,
             number=1,
+            raw=raw,
         )
 
     async def async_get_energy_storage_data(
-        self, dtu_serial_number: int, inverter_serial_number: int
-    ) -> ESData_pb2.ESDataReqDTO | None:
+        self, dtu_serial_number: int, inverter_serial_number: int, *, raw: bool = False
+    ) -> ESData_pb2.ESDataReqDTO | RawResponse | None:
         """Get energy storage registry."""
 
         request = ESData_pb2.ESDataResDTO()
@@ -533,15 +835,13 @@ class DTU:
         request.cp = 0
         request.serial_number = inverter_serial_number
 
-        command = CMD_ES_DATA_DTO
-
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            ENERGY_STORAGE_DATA,
             request,
-            ESData_pb2.ESDataReqDTO,
-            is_extended_format=True,
             dtu_serial_number=dtu_serial_number,
             number=1,
+            priority=RequestPriority.TELEMETRY,
+            raw=raw,
         )
 
     async def async_set_energy_storage_working_mode(
@@ -555,7 +855,9 @@ class DTU:
         peak_soc: int = None,
         peak_meter_power: int = None,
         time_periods: list[TimePeriodBean] = None,
-    ) -> ESUserSet_pb2.ESUserSetPutReqDTO | None:
+        *,
+        raw: bool = False,
+    ) -> ESUserSet_pb2.ESUserSetPutReqDTO | RawResponse | None:
         """Set energy storage working mode."""
 
         request = ESUserSet_pb2.ESUserSetPutResDTO()
@@ -668,17 +970,38 @@ class DTU:
 
                 request.tou.extend([time_of_use])
 
-        command = CMD_ES_USER_SET_RES_DTO
-
         logger.debug("Set energy storage working mode: " + str(request))
 
-        return await self.async_send_request(
-            command,
+        return await self._async_send_command(
+            ENERGY_STORAGE_WORKING_MODE,
             request,
-            ESUserSet_pb2.ESUserSetPutReqDTO,
-            is_extended_format=True,
             dtu_serial_number=dtu_serial_number,
             number=1,
+            priority=RequestPriority.CONTROL,
+            raw=raw,
+        )
+
+    async def _async_send_command(
+        self,
+        info: CommandInfo,
+        request: Any,
+        *,
+        dtu_serial_number: int = 0,
+        number: int = 0,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        raw: bool = False,
+    ):
+        """Send the request of a registered command to DTU."""
+
+        return await self.async_send_request(
+            info.command,
+            request,
+            info.response_type,
+            is_extended_format=info.is_extended_format,
+            dtu_serial_number=dtu_serial_number,
+            number=number,
+            priority=priority,
+            raw=raw,
         )
 
     async def async_send_request(
@@ -690,54 +1013,355 @@ class DTU:
         is_extended_format: bool = False,
         dtu_serial_number: int = 0,
         number: int = 0,
+        *,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        raw: bool = False,
+    ):
+        """Send request to DTU.
+
+        With raw set, the validated and decrypted payload is returned as a
+        RawResponse instead of being parsed into response_type.
+        """
+
+        if not await self.async_probe():
+            logger.debug("Circuit is open. Skipping request")
+            return None
+
+        return await self._async_send_request(
+            command,
+            request,
+            response_type,
+            dtu_port,
+            is_extended_format,
+            dtu_serial_number,
+            number,
+            priority=priority,
+            raw=raw,
+        )
+
+    async def _async_send_request(
+        self,
+        command: bytes,
+        request: Any,
+        response_type: Any,
+        dtu_port: int = DTU_PORT,
+        is_extended_format: bool = False,
+        dtu_serial_number: int = 0,
+        number: int = 0,
+        *,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        raw: bool = False,
     ):
-        """Send request to DTU."""
+        """Send request to DTU regardless of the circuit state."""
 
         message = self.generate_message(
             command, request, is_extended_format, dtu_serial_number, number
         )
 
+        if self.pipeline is not None:
+            result = await self._async_exchange_pipelined(
+                message,
+                command=command,
+                dtu_port=dtu_port,
+                priority=priority,
+                is_extended_format=is_extended_format,
+            )
+            if result is None:
+                return None
+
+            buffer, rtt, queue_wait = result
+            pacing_delay = 0
+        else:
+            queued_time = time.monotonic()
+
+            async with self.mutex.priority(priority):
+                queue_wait = time.monotonic() - queued_time
+                elapsed_time = time.time() - self.last_request_time
+                pacing_delay = max(0, REQUEST_INTERVAL - elapsed_time)
+                timeout = self.get_timeout(command)
+
+                if pacing_delay > 0:
+                    logger.debug(
+                        f"Last request was sent less than {REQUEST_INTERVAL}s ago. Waiting for {pacing_delay}s"
+                    )
+
+                try:
+                    # A single deadline covers pacing, connect and read
+                    buffer, rtt = await asyncio.wait_for(
+                        self._async_exchange(
+                            message, dtu_port, pacing_delay, is_extended_format
+                        ),
+                        timeout=pacing_delay + timeout,
+                    )
+                except asyncio.TimeoutError:
+                    logger.debug(f"Request timed out after {timeout:.2f}s")
+                    self.tracer.dump(f"Request timed out after {timeout:.2f}s")
+                    self.get_rtt_estimator(command).backoff()
+                    self.set_state(NetworkState.Offline)
+                    return None
+                except OSError as e:
+                    logger.debug(f"{e}")
+                    self.tracer.dump(str(e))
+                    self.set_state(NetworkState.Offline)
+                    return None
+
+                self.get_rtt_estimator(command).add_sample(rtt)
+
+        self.last_request_time = time.time()
+
+        if len(buffer) >= 6:
+            self.capture_frame(
+                FRAME_RESPONSE,
+                *struct.unpack(">HH", buffer[2:6]),
+                buffer,
+                message_type=response_type,
+                is_extended_format=is_extended_format,
+            )
+
+        seq = struct.unpack(">H", message[4:6])[0]
+        self.tracer.frame("response", seq, buffer)
+
+        if not is_enabled():
+            return self.parse_response(
+                buffer, response_type, is_extended_format, raw=raw
+            )
+
+        parse_start = time.monotonic()
+        response = self.parse_response(
+            buffer, response_type, is_extended_format, raw=raw
+        )
+
+        self.tracer.event(
+            "exchange",
+            command=command.hex(),
+            seq=seq,
+            request_size=len(message),
+            response_size=len(buffer),
+            queue_wait=queue_wait,
+            pacing_delay=pacing_delay,
+            rtt=rtt,
+            parse_time=time.monotonic() - parse_start,
+            ok=response is not None,
+        )
+
+        return response
+
+    async def _async_exchange(
+        self,
+        message: bytes,
+        dtu_port: int,
+        pacing_delay: float,
+        is_extended_format: bool = False,
+    ) -> tuple[bytes, float]:
+        """Wait for the pacing delay, send message and read the response."""
+
+        if pacing_delay > 0:
+            await asyncio.sleep(pacing_delay)
+
         ip_to_bind = (self.local_addr, 0) if self.local_addr is not None else None
+        protocol: FrameProtocol | None = None
+        writer = None
+        buffer = b""
+        stats = self.interface_stats
 
-        async with self.mutex:
-            current_time = time.time()
-            elapsed_time = current_time - self.last_request_time
+        if stats is not None:
+            stats.open()
 
-            if elapsed_time < 2:
-                logger.debug(
-                    f"Last request was sent less than 2s ago. Waiting for {2 - elapsed_time}s"
+        start_time = time.monotonic()
+        try:
+            if self.frame_transport:
+                protocol = await self._async_connect(
+                    lambda host: async_open_frame_connection(
+                        host, dtu_port, ip_to_bind, self.is_encrypted
+                    )
                 )
-                await asyncio.sleep(2 - elapsed_time)
-
-            try:
-                reader, writer = await asyncio.wait_for(
-                    asyncio.open_connection(
-                        host=self.host,
+                buffer = await protocol.async_request(message, is_extended_format)
+            else:
+                reader, writer = await self._async_connect(
+                    lambda host: asyncio.open_connection(
+                        host=host,
                         port=dtu_port,
                         local_addr=ip_to_bind,
-                    ),
-                    timeout=self.timeout,
+                    )
                 )
 
                 writer.write(message)
                 await writer.drain()
 
-                buffer = await asyncio.wait_for(reader.read(1024), timeout=self.timeout)
-            except (OSError, asyncio.TimeoutError) as e:
-                logger.debug(f"{e}")
-                self.set_state(NetworkState.Offline)
-                return None
-            finally:
-                try:
-                    if writer:
-                        writer.close()
-                        await writer.wait_closed()
-                except Exception as e:
-                    logger.debug(f"Error closing writer: {e}")
+                buffer = await reader.read(1024)
+        finally:
+            if stats is not None:
+                stats.close(
+                    len(message) if writer or protocol else 0,
+                    len(buffer),
+                    bool(buffer),
+                )
 
-        self.last_request_time = time.time()
+            if protocol is not None:
+                protocol.close()
 
-        return self.parse_response(buffer, response_type, is_extended_format)
+            try:
+                if writer:
+                    writer.close()
+                    await writer.wait_closed()
+            except Exception as e:
+                logger.debug(f"Error closing writer: {e}")
+
+        return buffer, time.monotonic() - start_time
+
+    async def _async_exchange_pipelined(
+        self,
+        message: bytes,
+        *,
+        command: bytes,
+        dtu_port: int,
+        priority: RequestPriority,
+        is_extended_format: bool,
+        retry: bool = True,
+    ) -> tuple[bytes, float, float] | None:
+        """Send message on the pipelined connection and wait for the response.
+
+        The queue is only held until the message is sent, so further requests
+        are sent while waiting, up to the learned in-flight limit. A request
+        lost with the connection while others were in flight is sent again
+        once on a new connection. Returns the response, round-trip time and
+        queue wait, None on failure.
+        """
+
+        pipeline = self.pipeline
+        queued_time = time.monotonic()
+        timeout = self.get_timeout(command)
+
+        async with self.mutex.priority(priority):
+            queue_wait = time.monotonic() - queued_time
+            await pipeline.async_acquire()
+            in_flight = pipeline.in_flight
+            start_time = time.monotonic()
+            future = await self._async_send_pipelined(
+                message, dtu_port, timeout, is_extended_format
+            )
+
+        if future is None:
+            return None
+
+        try:
+            buffer = await self._async_wait_pipelined(
+                future, len(message), timeout - (time.monotonic() - start_time)
+            )
+        except asyncio.TimeoutError:
+            logger.debug(f"Request timed out after {timeout:.2f}s")
+            self.tracer.dump(f"Request timed out after {timeout:.2f}s")
+            self.get_rtt_estimator(command).backoff()
+            pipeline.record_failure(in_flight)
+            self.set_state(NetworkState.Offline)
+            return None
+        except OSError as e:
+            logger.debug(f"{e} ({in_flight} requests in flight)")
+            pipeline.record_failure(in_flight)
+            if retry and in_flight > 1:
+                return await self._async_exchange_pipelined(
+                    message,
+                    command=command,
+                    dtu_port=dtu_port,
+                    priority=priority,
+                    is_extended_format=is_extended_format,
+                    retry=False,
+                )
+
+            self.tracer.dump(str(e))
+            self.set_state(NetworkState.Offline)
+            return None
+
+        rtt = time.monotonic() - start_time
+        pipeline.record_success()
+        self.get_rtt_estimator(command).add_sample(rtt)
+
+        return buffer, rtt, queue_wait
+
+    async def _async_send_pipelined(
+        self,
+        message: bytes,
+        dtu_port: int,
+        timeout: float,
+        is_extended_format: bool,
+    ) -> asyncio.Future | None:
+        """Send message on the pipelined connection, connecting if needed.
+
+        Returns the future of the response, None if the message could not be
+        sent. The in-flight slot is released unless a future is returned.
+        """
+
+        try:
+            connection = await asyncio.wait_for(
+                self._async_get_connection(dtu_port), timeout
+            )
+            return connection.send_request(message, is_extended_format)
+        except (asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"Failed to send pipelined request: {e!r}")
+            self.tracer.dump(f"Failed to send pipelined request: {e!r}")
+            self.pipeline.release()
+            self.set_state(NetworkState.Offline)
+            return None
+        except asyncio.CancelledError:
+            self.pipeline.release()
+            raise
+
+    async def _async_wait_pipelined(
+        self, future: asyncio.Future, sent: int, timeout: float
+    ) -> bytes:
+        """Wait for the response of a pipelined request and free its slot.
+
+        Raises asyncio.TimeoutError or the OSError of a lost connection.
+        """
+
+        stats = self.interface_stats
+        if stats is not None:
+            stats.open()
+
+        buffer = b""
+        try:
+            buffer = await asyncio.wait_for(future, timeout)
+        finally:
+            self.pipeline.release()
+            if stats is not None:
+                stats.close(sent, len(buffer), bool(buffer))
+
+        return buffer
+
+    async def _async_get_connection(self, dtu_port: int) -> FrameProtocol:
+        """Get the pipelined connection, reconnecting if it was closed."""
+
+        if self.connection is None or self.connection.is_closing():
+            ip_to_bind = (self.local_addr, 0) if self.local_addr is not None else None
+            self.connection = await self._async_connect(
+                lambda host: async_open_frame_connection(
+                    host, dtu_port, ip_to_bind, self.is_encrypted, is_pipelined=True
+                )
+            )
+
+        return self.connection
+
+    async def _async_connect(self, connect: Callable[[str], Awaitable[T]]) -> T:
+        """Connect to the DTU, trying every address of a resolved hostname."""
+
+        if self.resolver is None:
+            return await connect(self.host)
+
+        return await self.resolver.async_connect(connect)
+
+    def close(self) -> None:
+        """Close the pipelined connection, a later request opens a new one."""
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def async_close(self) -> None:
+        """Close the pipelined connection and stop resolving the hostname."""
+
+        self.close()
+        if self.resolver is not None:
+            await self.resolver.async_close()
 
     def generate_message(
         self,
@@ -752,12 +1376,11 @@ class DTU:
         self.sequence = (self.sequence + 1) & 0xFFFF
 
         u16_tag = struct.unpack(">H", command)[0]
+        is_encrypted = is_encrypted_frame(
+            u16_tag, self.is_encrypted, is_extended_format
+        )
 
-        if (
-            self.is_encrypted
-            and not is_extended_format
-            and command not in NOT_ENCRYPTED_COMMANDS
-        ):
+        if is_encrypted:
             request_as_bytes = crypt_data(
                 encrypt=True,
                 enc_rand=self.enc_rand,
@@ -765,15 +1388,11 @@ class DTU:
                 u16_seq=self.sequence,
                 input_data=request.SerializeToString(),
             )
-            crc16 = mkCrcFun(0x18005, rev=True, initCrc=0xFFFF, xorOut=0x0000)(
-                request_as_bytes[:-16]
-            )
+            crc16 = crc16_modbus(request_as_bytes[:-16])
 
         else:
             request_as_bytes = request.SerializeToString()
-            crc16 = mkCrcFun(0x18005, rev=True, initCrc=0xFFFF, xorOut=0x0000)(
-                request_as_bytes
-            )
+            crc16 = crc16_modbus(request_as_bytes)
 
         header = CMD_HEADER + command
         metadata = struct.pack(">HH", self.sequence, crc16)
@@ -782,83 +1401,87 @@ class DTU:
             metadata += struct.pack(
                 ">HHQHH", 24 + len(request_as_bytes), 14, serial_number, 0, number
             )
-        elif self.is_encrypted and command not in NOT_ENCRYPTED_COMMANDS:
+        elif is_encrypted:
             metadata += struct.pack(">H", len(request_as_bytes) - 16 + 10)
         else:
             metadata += struct.pack(">H", len(request_as_bytes) + 10)
 
         message = header + metadata + request_as_bytes
 
-        logger.debug(f"[*] Request header: {header.hex()}")
-        logger.debug(f"[*] Request metadata: {metadata.hex()}")
-        logger.debug(f"[*] Request: {request_as_bytes.hex()}")
-        logger.debug(f"[*] Request message: {message.hex()}")
+        if self.capture is not None:
+            self.capture_frame(
+                FRAME_REQUEST_PLAIN,
+                u16_tag,
+                self.sequence,
+                request.SerializeToString(),
+                message_type=request,
+                is_extended_format=is_extended_format,
+            )
+            self.capture_frame(
+                FRAME_REQUEST,
+                u16_tag,
+                self.sequence,
+                message,
+                message_type=request,
+                is_extended_format=is_extended_format,
+            )
+
+        self.tracer.frame("request", self.sequence, message)
+        if is_enabled():
+            self.tracer.event(
+                "request",
+                command=command.hex(),
+                seq=self.sequence,
+                size=len(message),
+                extended=is_extended_format,
+            )
 
         return message
 
-    def parse_response(self, buffer, response_type: Any, is_extended_format: bool):
-        """Parse response from DTU."""
+    def parse_response(
+        self,
+        buffer,
+        response_type: Any,
+        is_extended_format: bool,
+        *,
+        raw: bool = False,
+    ):
+        """Parse response from DTU, or return it as RawResponse if raw is set."""
 
         try:
-            if len(buffer) < 10:
-                raise ValueError("Buffer is too short for unpacking")
-
-            tag_num = buffer[2:4]
-            u16_tag, u16_seq = struct.unpack(">HH", buffer[2:6])
-
-            crc16_target, read_length = struct.unpack(">HH", buffer[6:10])
-
-            logger.debug(f"Read length: {read_length}")
-
-            expected_length = (
-                read_length + 16
-                if self.is_encrypted
-                and tag_num not in NOT_ENCRYPTED_COMMANDS
-                and not is_extended_format
-                else read_length
+            u16_tag, u16_seq, response_as_bytes = unpack_frame(
+                memoryview(buffer) if raw else buffer,
+                self.is_encrypted,
+                self.enc_rand,
+                is_extended_format,
             )
 
-            if len(buffer) != expected_length:
-                raise ValueError(
-                    f"Buffer is incomplete (expected {expected_length}, got {len(buffer)})"
-                )
+            self.tracer.frame("response plain", u16_seq, response_as_bytes)
 
-            if is_extended_format:
-                crc16_response = mkCrcFun(
-                    0x18005, rev=True, initCrc=0xFFFF, xorOut=0x0000
-                )(buffer[24:read_length])
-            else:
-                crc16_response = mkCrcFun(
-                    0x18005, rev=True, initCrc=0xFFFF, xorOut=0x0000
-                )(buffer[10:read_length])
+            self.capture_frame(
+                FRAME_RESPONSE_PLAIN,
+                u16_tag,
+                u16_seq,
+                response_as_bytes,
+                message_type=response_type,
+                is_extended_format=is_extended_format,
+            )
 
-            if crc16_response != crc16_target:
-                logger.error(
-                    f"CRC16 mismatch: {hex(crc16_response)} != {hex(crc16_target)}"
-                )
-                raise ValueError("CRC16 mismatch")
-
-            if is_extended_format:
-                logger.debug("Detected extended format!")
-                response_as_bytes = buffer[24:read_length]
-            elif self.is_encrypted and tag_num not in NOT_ENCRYPTED_COMMANDS:
-                logger.debug("Detected encrypted format!")
-                ciphertext = buffer[10:expected_length]
-                response_as_bytes = crypt_data(
-                    False, self.enc_rand, u16_tag, u16_seq, ciphertext
+            if raw:
+                parsed = RawResponse(
+                    u16_tag,
+                    u16_seq,
+                    bytes(buffer[: 24 if is_extended_format else 10]),
+                    response_as_bytes,
                 )
             else:
-                logger.debug("Detected unencrypted format!")
-                response_as_bytes = buffer[10:read_length]
-
-            logger.debug(f"Response: {response_as_bytes.hex()}")
-
-            parsed = response_type.FromString(response_as_bytes)
+                parsed = response_type.FromString(response_as_bytes)
 
-            if not parsed:
-                raise ValueError("Parsing resulted in an empty or falsy value")
+                if not parsed:
+                    raise ValueError("Parsing resulted in an empty or falsy value")
         except Exception as e:
             logger.debug(f"Failed to parse response: {e}")
+            self.tracer.dump(str(e))
             self.set_state(NetworkState.Unknown)
             return None
 
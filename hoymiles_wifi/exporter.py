@@ -0,0 +1,330 @@
+"""Prometheus / OpenMetrics exporter for DTU real data."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import (
+    EXPORTER_ADDRESS,
+    EXPORTER_PORT,
+    EXPORTER_READ_TIMEOUT,
+    EXPORTER_STALE_POLLS,
+)
+from hoymiles_wifi.dtu import DTU, NetworkState
+from hoymiles_wifi.poll_scheduler import PollScheduler
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import (
+    KIND_DTU,
+    KIND_INVERTER,
+    KIND_METER,
+    KIND_PORT,
+    get_field_unit,
+    iter_real_data_points,
+)
+
+METRIC_PREFIX = "hoymiles"
+UNITLESS = ("count", "state", "version")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Chunks written before the response is drained
+DRAIN_INTERVAL = 64
+
+
+def get_metric_name(kind: str, field_name: str) -> str:
+    """Get the metric name of a real data field."""
+
+    unit = get_field_unit(kind, field_name)
+    name = f"{METRIC_PREFIX}_{kind}_{field_name.lower()}"
+
+    if kind == KIND_DTU and field_name.startswith(f"{KIND_DTU}_"):
+        name = f"{METRIC_PREFIX}_{field_name.lower()}"
+
+    if unit and unit not in UNITLESS and not name.endswith(unit):
+        name = f"{name}_{unit}"
+
+    return name
+
+
+def format_labels(**labels: Any) -> str:
+    """Format labels in the exposition format."""
+
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class MetricsExporter:
+    """Serve the latest real data of polled DTUs as Prometheus metrics.
+
+    Snapshots are rendered into sample lines once per poll. A scrape only
+    concatenates the cached lines and never sends a request to a DTU. Series
+    of DTUs that missed several data polls are dropped, while their up state
+    and last update time are still exported.
+    """
+
+    def __init__(
+        self, stale_polls: int = EXPORTER_STALE_POLLS, **scheduler_kwargs: Any
+    ):
+        """Initialize MetricsExporter class.
+
+        stale_polls is the number of missed data polls after which the series
+        of a DTU are dropped, other arguments are passed to PollScheduler.
+        """
+
+        self.scheduler: PollScheduler = PollScheduler(
+            on_data=self.update, **scheduler_kwargs
+        )
+        self.stale_polls: int = stale_polls
+        self.dtus: dict[str, DTU] = {}
+        # host -> (timestamp, metric name -> sample lines)
+        self.samples: dict[str, tuple[float, dict[str, list[str]]]] = {}
+        # host -> time of the last snapshot, kept when its samples are dropped
+        self.last_update: dict[str, float] = {}
+
+    def add_dtu(self, dtu: DTU) -> None:
+        """Add a DTU to poll."""
+
+        self.dtus[dtu.host] = dtu
+        self.scheduler.add_dtu(dtu)
+
+    def update(self, dtu: DTU, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> None:
+        """Render the sample lines of a new snapshot."""
+
+        families: dict[str, list[str]] = {}
+
+        for point in iter_real_data_points(real_data):
+            labels = {"host": dtu.host, "dtu": real_data.device_serial_number}
+            if point.kind == KIND_METER:
+                labels["meter"] = point.serial_number
+            elif point.kind in (KIND_INVERTER, KIND_PORT):
+                labels["inverter"] = point.serial_number
+            if point.kind == KIND_PORT:
+                labels["port"] = point.port
+
+            name = get_metric_name(point.kind, point.field)
+            families.setdefault(name, []).append(
+                f"{name}{format_labels(**labels)} {point.value:g}\n"
+            )
+
+        now = time.time()
+        self.samples[dtu.host] = (now, families)
+        self.last_update[dtu.host] = now
+
+    def get_stale_age(self, host: str) -> float:
+        """Get the age after which the data of a DTU is stale."""
+
+        stats = self.scheduler.get_stats(host)
+        if stats is None:
+            interval = self.scheduler.max_interval
+        elif not stats.last_power:
+            # Idle DTUs only send real data every idle_data_interval
+            interval = max(self.scheduler.idle_data_interval, stats.last_interval)
+        else:
+            interval = stats.last_interval
+
+        return self.stale_polls * interval
+
+    def drop_stale(self, now: float | None = None) -> None:
+        """Drop the samples of DTUs whose data is stale."""
+
+        now = now if now is not None else time.time()
+        stale = [
+            host
+            for host, (timestamp, _) in self.samples.items()
+            if now - timestamp > self.get_stale_age(host)
+        ]
+
+        for host in stale:
+            logger.info(f"Dropping stale metrics of {host}")
+            del self.samples[host]
+
+    def render(self) -> Iterator[str]:
+        """Render all metrics, one chunk per metric family."""
+
+        self.drop_stale()
+        names = sorted(
+            {name for _, families in self.samples.values() for name in families}
+        )
+
+        for name in names:
+            lines = [f"# TYPE {name} gauge\n"]
+            for _, families in self.samples.values():
+                lines.extend(families.get(name, ()))
+            yield "".join(lines)
+
+        yield from self.render_library_metrics()
+        yield from self.render_interface_metrics()
+
+    def render_library_metrics(self) -> Iterator[str]:
+        """Render request, queue, circuit and polling metrics.
+
+        The last update time of a DTU is kept after its samples were dropped.
+        """
+
+        up = [f"# TYPE {METRIC_PREFIX}_up gauge\n"]
+        last_update = [f"# TYPE {METRIC_PREFIX}_last_update_timestamp_seconds gauge\n"]
+        circuit_open = [f"# TYPE {METRIC_PREFIX}_circuit_open gauge\n"]
+        poll_interval = [f"# TYPE {METRIC_PREFIX}_poll_interval_seconds gauge\n"]
+        latency = [f"# TYPE {METRIC_PREFIX}_request_duration_seconds summary\n"]
+        timeouts = [f"# TYPE {METRIC_PREFIX}_request_timeouts_total counter\n"]
+        timeout = [f"# TYPE {METRIC_PREFIX}_request_timeout_seconds gauge\n"]
+        queue_wait = [f"# TYPE {METRIC_PREFIX}_queue_wait_seconds summary\n"]
+
+        for host, dtu in self.dtus.items():
+            labels = format_labels(host=host)
+            up.append(
+                f"{METRIC_PREFIX}_up{labels} {int(dtu.get_state() == NetworkState.Online)}\n"
+            )
+
+            if host in self.last_update:
+                last_update.append(
+                    f"{METRIC_PREFIX}_last_update_timestamp_seconds{labels} {self.last_update[host]:.3f}\n"
+                )
+
+            if dtu.circuit_breaker is not None:
+                circuit_open.append(
+                    f"{METRIC_PREFIX}_circuit_open{labels} {int(not dtu.circuit_breaker.allow_request())}\n"
+                )
+
+            stats = self.scheduler.get_stats(host)
+            if stats is not None:
+                poll_interval.append(
+                    f"{METRIC_PREFIX}_poll_interval_seconds{labels} {stats.last_interval:g}\n"
+                )
+
+            for command, estimator in dtu.rtt_estimators.items():
+                labels = format_labels(host=host, command=command.hex())
+                latency.append(
+                    f"{METRIC_PREFIX}_request_duration_seconds_sum{labels} {estimator.rtt_sum:g}\n"
+                    f"{METRIC_PREFIX}_request_duration_seconds_count{labels} {estimator.samples}\n"
+                )
+                timeouts.append(
+                    f"{METRIC_PREFIX}_request_timeouts_total{labels} {estimator.timeouts}\n"
+                )
+                timeout.append(
+                    f"{METRIC_PREFIX}_request_timeout_seconds{labels} {dtu.get_timeout(command):g}\n"
+                )
+
+            for priority, queue_stats in dtu.mutex.stats.items():
+                labels = format_labels(host=host, priority=priority.name.lower())
+                queue_wait.append(
+                    f"{METRIC_PREFIX}_queue_wait_seconds_sum{labels} {queue_stats.total_wait:g}\n"
+                    f"{METRIC_PREFIX}_queue_wait_seconds_count{labels} {queue_stats.requests}\n"
+                )
+
+        for family in (
+            up,
+            last_update,
+            circuit_open,
+            poll_interval,
+            latency,
+            timeouts,
+            timeout,
+            queue_wait,
+        ):
+            yield "".join(family)
+
+    def render_interface_metrics(self) -> Iterator[str]:
+        """Render connection metrics per local address."""
+
+        interfaces = {
+            dtu.interface_stats.address: dtu.interface_stats
+            for dtu in self.dtus.values()
+            if dtu.interface_stats is not None
+        }
+        if not interfaces:
+            return
+
+        active = [f"# TYPE {METRIC_PREFIX}_interface_active_connections gauge\n"]
+        requests = [f"# TYPE {METRIC_PREFIX}_interface_requests_total counter\n"]
+        failures = [f"# TYPE {METRIC_PREFIX}_interface_failures_total counter\n"]
+        sent = [f"# TYPE {METRIC_PREFIX}_interface_sent_bytes_total counter\n"]
+        received = [f"# TYPE {METRIC_PREFIX}_interface_received_bytes_total counter\n"]
+
+        for address, stats in sorted(interfaces.items()):
+            labels = format_labels(local_addr=address)
+            active.append(
+                f"{METRIC_PREFIX}_interface_active_connections{labels} {stats.active}\n"
+            )
+            requests.append(
+                f"{METRIC_PREFIX}_interface_requests_total{labels} {stats.requests}\n"
+            )
+            failures.append(
+                f"{METRIC_PREFIX}_interface_failures_total{labels} {stats.failures}\n"
+            )
+            sent.append(
+                f"{METRIC_PREFIX}_interface_sent_bytes_total{labels} {stats.bytes_sent}\n"
+            )
+            received.append(
+                f"{METRIC_PREFIX}_interface_received_bytes_total{labels} {stats.bytes_received}\n"
+            )
+
+        for family in (active, requests, failures, sent, received):
+            yield "".join(family)
+
+    async def async_handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Handle a HTTP request."""
+
+        try:
+            request_line = await asyncio.wait_for(
+                self._async_read_request(reader), EXPORTER_READ_TIMEOUT
+            )
+            parts = request_line.split()
+            path = parts[1].split(b"?")[0] if len(parts) > 1 else b""
+
+            if not parts or parts[0] != b"GET":
+                writer.write(
+                    b"HTTP/1.1 405 Method Not Allowed\r\nConnection: close\r\n\r\n"
+                )
+            elif path != b"/metrics":
+                writer.write(
+                    b"HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+                    b"Connection: close\r\n\r\nMetrics are served on /metrics\n"
+                )
+            else:
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                    "Connection: close\r\n\r\n".encode()
+                )
+                for count, chunk in enumerate(self.render(), start=1):
+                    writer.write(chunk.encode())
+                    if count % DRAIN_INTERVAL == 0:
+                        await writer.drain()
+
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            logger.debug(f"Error serving metrics: {e!r}")
+        finally:
+            writer.close()
+
+    async def _async_read_request(self, reader: asyncio.StreamReader) -> bytes:
+        """Read the request line and skip the headers."""
+
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        return request_line
+
+    async def async_run(
+        self, listen_address: str = EXPORTER_ADDRESS, listen_port: int = EXPORTER_PORT
+    ) -> None:
+        """Serve metrics and poll the DTUs until cancelled."""
+
+        server = await asyncio.start_server(
+            self.async_handle_client, listen_address, listen_port
+        )
+        logger.info(f"Serving metrics on http://{listen_address}:{listen_port}/metrics")
+
+        async with server:
+            await self.scheduler.async_run()
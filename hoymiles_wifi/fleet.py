@@ -0,0 +1,432 @@
+"""Polling of DTU fleets spread over several processes."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.address_pool import LocalAddressPool
+from hoymiles_wifi.const import (
+    SNAPSHOT_HOST_SIZE,
+    SNAPSHOT_READ_RETRIES,
+    SNAPSHOT_SLOT_SIZE,
+)
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.poll_scheduler import PollScheduler
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+
+# Table header: magic, slot count, slot size
+TABLE_HEADER = struct.Struct("<4sII")
+TABLE_MAGIC = b"HMST"
+# Slot header: version, timestamp, payload length, host
+SLOT_HEADER = struct.Struct(f"<Idi{SNAPSHOT_HOST_SIZE}s")
+
+
+@dataclass
+class FleetHost:
+    """Connection settings of a DTU in a fleet."""
+
+    host: str
+    enc_rand: str | None = None
+    local_addr: str | None = None
+
+    def create_dtu(
+        self, address_pool: LocalAddressPool | None = None, **kwargs: Any
+    ) -> DTU:
+        """Create a DTU for this host.
+
+        Without its own local_addr the host is bound to an address of
+        address_pool if given, whose statistics then count its exchanges.
+        """
+
+        local_addr = self.local_addr
+        if local_addr is None and address_pool is not None:
+            local_addr = address_pool.assign(self.host)
+            kwargs.setdefault("interface_stats", address_pool.get_stats(local_addr))
+
+        if self.enc_rand:
+            return DTU(
+                self.host,
+                local_addr,
+                is_encrypted=True,
+                enc_rand=bytes.fromhex(self.enc_rand),
+                **kwargs,
+            )
+
+        return DTU(self.host, local_addr, **kwargs)
+
+
+def read_hosts_file(
+    path: str,
+    enc_rand: str | None = None,
+    local_addr: str | None = None,
+) -> list[FleetHost]:
+    """Read hosts from a file with one host per line.
+
+    Lines look like "<host> [enc_rand=<hex>] [local_addr=<ip>]", empty lines
+    and lines starting with # are skipped. enc_rand and local_addr are the
+    defaults for hosts that do not set them. Raises ValueError for unknown
+    options.
+    """
+
+    hosts: list[FleetHost] = []
+
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+
+            host, *options = fields
+
+            fleet_host = FleetHost(host, enc_rand, local_addr)
+            for option in options:
+                name, _, value = option.partition("=")
+                if name not in ("enc_rand", "local_addr") or not value:
+                    raise ValueError(f"{path}:{number}: invalid option {option}")
+                setattr(fleet_host, name, value)
+
+            hosts.append(fleet_host)
+
+    return hosts
+
+
+def assign_shard(host: str, shards: int) -> int:
+    """Assign a host to a shard using rendezvous hashing.
+
+    The assignment only depends on the host and the number of shards, so a
+    host always ends up in the same process and changing the number of
+    shards only moves the hosts of the added or removed shard.
+    """
+
+    return max(
+        range(shards),
+        key=lambda shard: hashlib.sha1(f"{shard}:{host}".encode()).digest(),
+    )
+
+
+def check_snapshot_hosts(hosts: list[str]) -> None:
+    """Check that every host gets its own snapshot slot under its full name.
+
+    Raises ValueError for duplicate hosts and hosts longer than
+    SNAPSHOT_HOST_SIZE bytes.
+    """
+
+    seen: set[str] = set()
+    for host in hosts:
+        if len(host.encode()) > SNAPSHOT_HOST_SIZE:
+            raise ValueError(f"Host {host} is longer than {SNAPSHOT_HOST_SIZE} bytes")
+        if host in seen:
+            raise ValueError(f"Duplicate host {host}")
+        seen.add(host)
+
+
+class SnapshotTable:
+    """Latest real data snapshot per DTU in shared memory.
+
+    Each host owns a fixed slot holding the serialized RealDataNewReqDTO.
+    Writers bump the slot version before and after writing (sequence lock),
+    readers retry until they copied a slot with a stable, even version.
+    Any process can attach by name and read without IPC round trips.
+    """
+
+    def __init__(
+        self,
+        name: str | None = None,
+        hosts: list[str] | None = None,
+        slot_size: int = SNAPSHOT_SLOT_SIZE,
+        untrack: bool = True,
+    ):
+        """Create a table for hosts, or attach to the table name if hosts is None.
+
+        Raises ValueError for duplicate hosts and hosts longer than
+        SNAPSHOT_HOST_SIZE bytes, which would share or truncate a slot key.
+        Attaching processes stop tracking the block unless untrack is False,
+        so it is not removed when they exit. The creating process and the
+        processes started by it share one resource tracker and must pass
+        untrack=False.
+        """
+
+        if hosts is None:
+            if sys.version_info >= (3, 13):
+                self.shm = SharedMemory(name=name, track=not untrack)
+            else:
+                self.shm = SharedMemory(name=name)
+                if untrack:
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+            magic, slot_count, self.slot_size = TABLE_HEADER.unpack_from(
+                self.shm.buf, 0
+            )
+            if magic != TABLE_MAGIC:
+                self.shm.close()
+                raise ValueError(f"{name} is not a snapshot table")
+            self.owner = False
+            self.slots: dict[str, int] = {}
+            for index in range(slot_count):
+                _, _, _, host = SLOT_HEADER.unpack_from(
+                    self.shm.buf, self._slot_offset(index)
+                )
+                self.slots[host.rstrip(b"\0").decode()] = index
+        else:
+            check_snapshot_hosts(hosts)
+            self.slot_size = slot_size
+            self.shm = SharedMemory(
+                name=name,
+                create=True,
+                size=TABLE_HEADER.size + len(hosts) * slot_size,
+            )
+            self.owner = True
+            TABLE_HEADER.pack_into(self.shm.buf, 0, TABLE_MAGIC, len(hosts), slot_size)
+            self.slots = {host: index for index, host in enumerate(hosts)}
+            for host, index in self.slots.items():
+                SLOT_HEADER.pack_into(
+                    self.shm.buf, self._slot_offset(index), 0, 0.0, 0, host.encode()
+                )
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block."""
+
+        return self.shm.name
+
+    @property
+    def max_payload_size(self) -> int:
+        """Largest snapshot that fits into a slot."""
+
+        return self.slot_size - SLOT_HEADER.size
+
+    def write(self, host: str, payload: bytes, timestamp: float | None = None) -> bool:
+        """Publish a serialized snapshot of host."""
+
+        index = self.slots.get(host)
+        if index is None:
+            return False
+
+        if len(payload) > self.max_payload_size:
+            logger.warning(
+                f"Snapshot of {host} too large ({len(payload)} > {self.max_payload_size} bytes)"
+            )
+            return False
+
+        offset = self._slot_offset(index)
+        buffer = self.shm.buf
+        version = struct.unpack_from("<I", buffer, offset)[0]
+
+        struct.pack_into("<I", buffer, offset, (version + 1) & 0xFFFFFFFF)
+        struct.pack_into(
+            "<di",
+            buffer,
+            offset + 4,
+            timestamp if timestamp is not None else time.time(),
+            len(payload),
+        )
+        start = offset + SLOT_HEADER.size
+        buffer[start : start + len(payload)] = payload
+        struct.pack_into("<I", buffer, offset, (version + 2) & 0xFFFFFFFF)
+
+        return True
+
+    def read_bytes(self, host: str) -> tuple[float, bytes] | None:
+        """Read the timestamp and serialized snapshot of host."""
+
+        index = self.slots.get(host)
+        if index is None:
+            return None
+
+        offset = self._slot_offset(index)
+        buffer = self.shm.buf
+
+        for _ in range(SNAPSHOT_READ_RETRIES):
+            version, timestamp, length, _ = SLOT_HEADER.unpack_from(buffer, offset)
+            if version & 1:
+                continue
+
+            start = offset + SLOT_HEADER.size
+            payload = bytes(buffer[start : start + length])
+
+            if struct.unpack_from("<I", buffer, offset)[0] == version:
+                break
+        else:
+            # The writer died while publishing
+            logger.debug(f"Snapshot of {host} is not stable")
+            return None
+
+        if version == 0:
+            return None
+
+        return timestamp, payload
+
+    def read(self, host: str) -> tuple[float, RealDataNew_pb2.RealDataNewReqDTO] | None:
+        """Read the timestamp and snapshot of host."""
+
+        result = self.read_bytes(host)
+        if result is None:
+            return None
+
+        timestamp, payload = result
+        return timestamp, RealDataNew_pb2.RealDataNewReqDTO.FromString(payload)
+
+    def close(self) -> None:
+        """Detach from the table, the creator also releases it."""
+
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _slot_offset(self, index: int) -> int:
+        """Offset of the slot in the shared memory block."""
+
+        return TABLE_HEADER.size + index * self.slot_size
+
+
+def _run_shard(
+    table_name: str,
+    hosts: list[FleetHost],
+    stop_event: Any,
+    scheduler_kwargs: dict[str, Any],
+) -> None:
+    """Poll the hosts of a shard and publish their snapshots."""
+
+    table = SnapshotTable(table_name, untrack=False)
+
+    def on_data(dtu: DTU, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> None:
+        table.write(dtu.host, real_data.SerializeToString())
+
+    async def async_run() -> None:
+        scheduler = PollScheduler(on_data=on_data, **scheduler_kwargs)
+        for fleet_host in hosts:
+            scheduler.add_dtu(fleet_host.create_dtu())
+
+        task = asyncio.create_task(scheduler.async_run())
+        while not stop_event.is_set() and not task.done():
+            await asyncio.sleep(1)
+
+        scheduler.stop()
+        task.cancel()
+
+    try:
+        asyncio.run(async_run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+class ShardedFleetRunner:
+    """Poll a fleet of DTUs from a pool of processes.
+
+    Hosts are assigned to processes with assign_shard, so the pacing state
+    of a DTU always lives in a single process. The latest snapshot of every
+    DTU is published to a SnapshotTable, which other processes can attach
+    to with SnapshotTable(runner.table.name).
+
+    Hosts without local_addr are bound to addresses of address_pool if
+    given. The addresses are assigned before sharding, so they are balanced
+    over the whole fleet; the statistics of the pool are not updated by the
+    worker processes.
+    """
+
+    def __init__(
+        self,
+        hosts: list[FleetHost],
+        processes: int | None = None,
+        slot_size: int = SNAPSHOT_SLOT_SIZE,
+        address_pool: LocalAddressPool | None = None,
+        **scheduler_kwargs: Any,
+    ):
+        """Initialize ShardedFleetRunner class, extra arguments go to PollScheduler.
+
+        Raises ValueError for hosts that cannot share a SnapshotTable.
+        """
+
+        check_snapshot_hosts([fleet_host.host for fleet_host in hosts])
+
+        if address_pool is not None:
+            hosts = [
+                fleet_host
+                if fleet_host.local_addr is not None
+                else FleetHost(
+                    fleet_host.host,
+                    fleet_host.enc_rand,
+                    address_pool.assign(fleet_host.host),
+                )
+                for fleet_host in hosts
+            ]
+
+        self.hosts: list[FleetHost] = hosts
+        self.processes: int = max(1, min(processes or os.cpu_count() or 1, len(hosts)))
+        self.slot_size: int = slot_size
+        self.scheduler_kwargs: dict[str, Any] = scheduler_kwargs
+        self.table: SnapshotTable | None = None
+        self.workers: list[multiprocessing.Process] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+
+    def get_shards(self) -> list[list[FleetHost]]:
+        """Get the hosts of each shard."""
+
+        shards: list[list[FleetHost]] = [[] for _ in range(self.processes)]
+        for fleet_host in self.hosts:
+            shards[assign_shard(fleet_host.host, self.processes)].append(fleet_host)
+
+        return shards
+
+    def start(self) -> None:
+        """Create the snapshot table and start the worker processes."""
+
+        self.table = SnapshotTable(
+            hosts=[fleet_host.host for fleet_host in self.hosts],
+            slot_size=self.slot_size,
+        )
+        self._stop_event.clear()
+
+        for index, shard in enumerate(self.get_shards()):
+            if not shard:
+                continue
+
+            worker = self._context.Process(
+                target=_run_shard,
+                args=(self.table.name, shard, self._stop_event, self.scheduler_kwargs),
+                name=f"hoymiles-wifi-shard-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop the worker processes and release the snapshot table."""
+
+        self._stop_event.set()
+
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+        self.workers = []
+
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def __enter__(self) -> ShardedFleetRunner:
+        """Start the runner."""
+
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Stop the runner."""
+
+        self.stop()
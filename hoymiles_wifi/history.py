@@ -0,0 +1,509 @@
+"""Compact columnar on-disk history of real data snapshots."""
+
+from __future__ import annotations
+
+import atexit
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import HISTORY_FLUSH_INTERVAL
+from hoymiles_wifi.delta import SeriesKey
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import get_field_scale, iter_real_data_points
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEGMENT_SUFFIX = ".hms"
+# Segment header: magic, version
+SEGMENT_HEADER = struct.Struct("<4sHH")
+SEGMENT_MAGIC = b"HMHS"
+SEGMENT_VERSION = 1
+# Trailer: footer offset, magic
+SEGMENT_TRAILER = struct.Struct("<Q4s")
+# Index entry: kind, serial number and field length, port, sample count, first
+# and last timestamp, offset and length of the timestamp and value columns
+INDEX_ENTRY = struct.Struct("<BBBHIqqQIQI")
+
+
+class SeriesIndex(NamedTuple):
+    """Location of the columns of a series in a segment."""
+
+    count: int
+    first_timestamp: int
+    last_timestamp: int
+    timestamps_offset: int
+    timestamps_length: int
+    values_offset: int
+    values_length: int
+
+
+def encode_column(values: array) -> bytes:
+    """Encode integers as zigzag varints of the differences to their predecessor."""
+
+    output = bytearray()
+    previous = 0
+
+    for value in values:
+        delta = value - previous
+        previous = value
+        zigzag = delta << 1 if delta >= 0 else (-delta << 1) - 1
+
+        while zigzag >= 0x80:
+            output.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        output.append(zigzag)
+
+    return bytes(output)
+
+
+def decode_column(buffer: Any, offset: int, length: int) -> array:
+    """Decode a column written by encode_column.
+
+    Uses NumPy if it is installed.
+    """
+
+    if np is not None:
+        return _decode_column_numpy(buffer, offset, length)
+
+    values = array("q")
+    previous = 0
+    zigzag = 0
+    shift = 0
+
+    for byte in buffer[offset : offset + length]:
+        zigzag |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+
+        previous += zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)
+        values.append(previous)
+        zigzag = 0
+        shift = 0
+
+    return values
+
+
+def _decode_column_numpy(buffer: Any, offset: int, length: int) -> array:
+    """Decode a column written by encode_column with vectorized NumPy operations."""
+
+    values = array("q")
+    data = np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset)
+
+    # The last byte of every varint has the continuation bit cleared
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends):
+        return values
+
+    data = data[: ends[-1] + 1]
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    # Shift every 7 bit group to its position within its varint
+    positions = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    groups = (data & 0x7F).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    zigzag = np.bitwise_or.reduceat(groups, starts)
+
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(
+        zigzag & np.uint64(1)
+    ).astype(np.int64)
+    values.frombytes(np.cumsum(deltas).tobytes())
+
+    return values
+
+
+def get_day(timestamp: float) -> str:
+    """Get the UTC day of a timestamp as used in segment names."""
+
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def write_segment(path: Path, series: dict[SeriesKey, tuple[array, array]]) -> None:
+    """Write the columns of all series to a segment file.
+
+    The file is written to a temporary name and renamed, so readers never see
+    a partial segment.
+    """
+
+    columns = bytearray(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, 0))
+    footer = bytearray()
+
+    for (kind, serial_number, port, field_name), (timestamps, values) in sorted(
+        series.items()
+    ):
+        if not timestamps:
+            continue
+
+        encoded_timestamps = encode_column(timestamps)
+        encoded_values = encode_column(values)
+        key_bytes = [text.encode() for text in (kind, serial_number, field_name)]
+
+        footer += INDEX_ENTRY.pack(
+            *(len(text) for text in key_bytes),
+            port,
+            len(timestamps),
+            timestamps[0],
+            timestamps[-1],
+            len(columns),
+            len(encoded_timestamps),
+            len(columns) + len(encoded_timestamps),
+            len(encoded_values),
+        )
+        footer += b"".join(key_bytes)
+        columns += encoded_timestamps
+        columns += encoded_values
+
+    footer_offset = len(columns)
+    temporary_path = path.with_suffix(".tmp")
+
+    with open(temporary_path, "wb") as file:
+        file.write(columns)
+        file.write(footer)
+        file.write(SEGMENT_TRAILER.pack(footer_offset, SEGMENT_MAGIC))
+
+    os.replace(temporary_path, path)
+
+
+class HistoryWriter:
+    """Append snapshots to daily columnar segments.
+
+    Every series (device or PV port field) is stored as a column of
+    timestamps and a column of raw integer values, both delta and varint
+    encoded. Samples are buffered and written as a new part of the day's
+    segment every flush_interval seconds, at the end of a day, on close and
+    when the interpreter exits. Once a day is over its parts are compacted
+    into a single segment, parts of earlier days left by a previous run are
+    compacted when the writer is created. fields limits the stored field
+    names, all fields are stored by default.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        fields: set[str] | None = None,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+    ):
+        """Initialize HistoryWriter class."""
+
+        self.directory: Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fields: set[str] | None = fields
+        self.flush_interval: float = flush_interval
+        self.day: str | None = None
+        self.series: dict[SeriesKey, tuple[array, array]] = {}
+        self.last_flush: float = time.monotonic()
+        atexit.register(self.close)
+
+        today = get_day(time.time())
+        for day in self.get_part_days():
+            if day < today:
+                self.compact(day)
+
+    def add(
+        self,
+        real_data: RealDataNew_pb2.RealDataNewReqDTO,
+        timestamp: float | None = None,
+    ) -> None:
+        """Append a snapshot taken at timestamp (default now)."""
+
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        day = get_day(timestamp)
+
+        if day != self.day:
+            self.flush()
+            if self.day is not None:
+                self.compact(self.day)
+            self.day = day
+
+        for point in iter_real_data_points(real_data, scaled=False):
+            if self.fields is not None and point.field not in self.fields:
+                continue
+
+            key: SeriesKey = (
+                point.kind,
+                point.serial_number,
+                point.port,
+                point.field,
+            )
+            columns = self.series.get(key)
+            if columns is None:
+                columns = (array("q"), array("q"))
+                self.series[key] = columns
+
+            columns[0].append(timestamp)
+            columns[1].append(int(point.value))
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def on_data(self, dtu: Any, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> None:
+        """Append a snapshot, usable as on_data callback of PollScheduler."""
+
+        self.add(real_data)
+
+    def flush(self) -> None:
+        """Write the buffered samples as a new part of the day's segment."""
+
+        self.last_flush = time.monotonic()
+
+        if self.day is None or not self.series:
+            return
+
+        part = self.get_next_part(self.day)
+        write_segment(
+            self.directory / f"{self.day}-{part:04d}{SEGMENT_SUFFIX}", self.series
+        )
+        self.series = {}
+
+    def get_next_part(self, day: str) -> int:
+        """Get the number following the last part of a day's segment."""
+
+        parts = [
+            int(path.stem[len(day) + 1 :])
+            for path in self.directory.glob(f"{day}-*{SEGMENT_SUFFIX}")
+            if path.stem[len(day) + 1 :].isdigit()
+        ]
+
+        return max(parts, default=-1) + 1
+
+    def get_part_days(self) -> set[str]:
+        """Get the days that have segment parts."""
+
+        return {
+            path.stem[:10]
+            for path in self.directory.glob(f"*-*{SEGMENT_SUFFIX}")
+            if path.stem[11:].isdigit()
+        }
+
+    def compact(self, day: str) -> None:
+        """Merge the parts of a day into the day's single segment.
+
+        Samples are merged by timestamp, so samples of a part that was
+        already merged are only kept once.
+        """
+
+        paths = sorted(self.directory.glob(f"{day}*{SEGMENT_SUFFIX}"))
+        parts = [path for path in paths if path.stem != day]
+        if not parts:
+            return
+
+        merged: dict[SeriesKey, dict[int, int]] = {}
+        try:
+            for path in paths:
+                self._merge_segment(path, merged)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Failed to compact history of {day}: {e}")
+            return
+
+        series: dict[SeriesKey, tuple[array, array]] = {}
+        for key, samples in merged.items():
+            timestamps = array("q", sorted(samples))
+            series[key] = (timestamps, array("q", map(samples.get, timestamps)))
+        write_segment(self.directory / f"{day}{SEGMENT_SUFFIX}", series)
+
+        try:
+            for path in parts:
+                path.unlink()
+        except OSError as e:
+            logger.warning(f"Failed to remove compacted history parts of {day}: {e}")
+
+    def _merge_segment(
+        self, path: Path, merged: dict[SeriesKey, dict[int, int]]
+    ) -> None:
+        """Add the samples of a segment to merged, by series and timestamp."""
+
+        segment = Segment(path)
+        try:
+            for key in segment.index:
+                timestamps, values = segment.read(key)
+                merged.setdefault(key, {}).update(zip(timestamps, values))
+        finally:
+            segment.close()
+
+    def close(self) -> None:
+        """Write the buffered samples."""
+
+        atexit.unregister(self.close)
+        self.flush()
+
+    def __enter__(self) -> HistoryWriter:
+        """Return the writer."""
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Close the writer."""
+
+        self.close()
+
+
+class Segment:
+    """Memory mapped segment file."""
+
+    def __init__(self, path: Path):
+        """Map a segment and read its footer index."""
+
+        self.path: Path = path
+
+        with open(path, "rb") as file:
+            self.buffer: mmap.mmap = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        magic, version, _ = SEGMENT_HEADER.unpack_from(self.buffer, 0)
+        footer_offset, trailer_magic = SEGMENT_TRAILER.unpack_from(
+            self.buffer, len(self.buffer) - SEGMENT_TRAILER.size
+        )
+        if magic != SEGMENT_MAGIC or trailer_magic != SEGMENT_MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a history segment")
+        if version != SEGMENT_VERSION:
+            self.buffer.close()
+            raise ValueError(f"Unsupported history segment version {version}")
+
+        self.index: dict[SeriesKey, SeriesIndex] = {}
+        position = footer_offset
+        end = len(self.buffer) - SEGMENT_TRAILER.size
+
+        while position < end:
+            kind_length, serial_length, field_length, port, *location = (
+                INDEX_ENTRY.unpack_from(self.buffer, position)
+            )
+            position += INDEX_ENTRY.size
+            kind = self.buffer[position : position + kind_length].decode()
+            position += kind_length
+            serial_number = self.buffer[position : position + serial_length].decode()
+            position += serial_length
+            field_name = self.buffer[position : position + field_length].decode()
+            position += field_length
+
+            self.index[(kind, serial_number, port, field_name)] = SeriesIndex(*location)
+
+    def read(
+        self, key: SeriesKey, start: float | None = None, end: float | None = None
+    ) -> tuple[array, array] | None:
+        """Read the timestamps and raw values of a series in [start, end)."""
+
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        if start is not None and entry.last_timestamp < start:
+            return None
+        if end is not None and entry.first_timestamp >= end:
+            return None
+
+        timestamps = decode_column(
+            self.buffer, entry.timestamps_offset, entry.timestamps_length
+        )
+        values = decode_column(self.buffer, entry.values_offset, entry.values_length)
+
+        first = 0 if start is None else bisect_left(timestamps, start)
+        last = len(timestamps) if end is None else bisect_left(timestamps, end)
+
+        return timestamps[first:last], values[first:last]
+
+    def close(self) -> None:
+        """Unmap the segment."""
+
+        self.buffer.close()
+
+
+class HistoryReader:
+    """Range queries over the segments written by HistoryWriter."""
+
+    def __init__(self, directory: str | Path):
+        """Initialize HistoryReader class."""
+
+        self.directory: Path = Path(directory)
+        self.segments: dict[Path, Segment] = {}
+
+    def get_segment_paths(
+        self, start: float | None = None, end: float | None = None
+    ) -> list[Path]:
+        """Get the segments of the days overlapping [start, end) in time order."""
+
+        first_day = get_day(start) if start is not None else None
+        last_day = get_day(end) if end is not None else None
+
+        return [
+            path
+            for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+            if (first_day is None or path.stem[:10] >= first_day)
+            and (last_day is None or path.stem[:10] <= last_day)
+        ]
+
+    def get_segment(self, path: Path) -> Segment:
+        """Get a mapped segment."""
+
+        segment = self.segments.get(path)
+        if segment is None:
+            segment = Segment(path)
+            self.segments[path] = segment
+
+        return segment
+
+    def get_series(self) -> set[SeriesKey]:
+        """Get all stored series."""
+
+        return {
+            key
+            for path in self.get_segment_paths()
+            for key in self.get_segment(path).index
+        }
+
+    def query(
+        self,
+        key: SeriesKey,
+        start: float | None = None,
+        end: float | None = None,
+        scaled: bool = True,
+    ) -> tuple[list[int], list[float]]:
+        """Get the timestamps and values of a series in [start, end).
+
+        Values are converted to the unit of the field unless scaled is False.
+        """
+
+        timestamps: list[int] = []
+        values: list[float] = []
+
+        for path in self.get_segment_paths(start, end):
+            result = self.get_segment(path).read(key, start, end)
+            if result is not None:
+                timestamps.extend(result[0])
+                values.extend(result[1])
+
+        if scaled:
+            scale = get_field_scale(key[0], key[3])
+            values = [value * scale for value in values]
+
+        return timestamps, values
+
+    def close(self) -> None:
+        """Unmap all segments."""
+
+        for segment in self.segments.values():
+            segment.close()
+
+        self.segments = {}
+
+    def __enter__(self) -> HistoryReader:
+        """Return the reader."""
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Close the reader."""
+
+        self.close()
@@ -0,0 +1,98 @@
+"""Learned limit of requests in flight on a pipelined DTU connection."""
+
+from __future__ import annotations
+
+import asyncio
+
+from hoymiles_wifi.const import (
+    PIPELINE_CEILING_RECOVERY,
+    PIPELINE_INITIAL_IN_FLIGHT,
+    PIPELINE_MAX_IN_FLIGHT,
+)
+
+
+class PipelineLimit:
+    """Cap the requests in flight to a DTU and learn how many it handles.
+
+    The DTU protocol has no way to negotiate this, so the limit follows
+    TCP congestion avoidance (AIMD): every limit successful responses raise
+    it by one, a request that failed while others were in flight halves it
+    and caps it below the number of requests that were in flight. The cap
+    is raised by one again after ceiling_recovery successful responses in a
+    row at the cap, so a DTU that was only briefly overloaded gets its
+    limit back. Futures are created on the running event loop when needed,
+    so the limit is not bound to the loop it was created on.
+    """
+
+    def __init__(
+        self,
+        max_limit: int = PIPELINE_MAX_IN_FLIGHT,
+        initial_limit: int = PIPELINE_INITIAL_IN_FLIGHT,
+        ceiling_recovery: int = PIPELINE_CEILING_RECOVERY,
+    ):
+        """Initialize PipelineLimit class."""
+
+        self.max_limit: int = max(1, max_limit)
+        self.limit: int = max(1, min(initial_limit, self.max_limit))
+        self.ceiling: int = self.max_limit
+        self.ceiling_recovery: int = max(1, ceiling_recovery)
+        self.in_flight: int = 0
+        self.successes: int = 0
+        self.ceiling_successes: int = 0
+        self._waiters: list[asyncio.Future] = []
+
+    async def async_acquire(self) -> None:
+        """Wait until another request may be sent."""
+
+        while self.in_flight >= self.limit:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+
+        self.in_flight += 1
+
+    def release(self) -> None:
+        """Free the slot of a finished request."""
+
+        self.in_flight -= 1
+
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.pop(0)
+            if not future.done():
+                future.set_result(None)
+                return
+
+    def record_success(self) -> None:
+        """Raise the limit by one after limit successful responses.
+
+        The ceiling is raised by one after ceiling_recovery successful
+        responses while the limit is at the ceiling.
+        """
+
+        if self.limit >= self.ceiling and self.ceiling < self.max_limit:
+            self.ceiling_successes += 1
+            if self.ceiling_successes >= self.ceiling_recovery:
+                self.ceiling_successes = 0
+                self.ceiling += 1
+
+        self.successes += 1
+        if self.successes >= self.limit:
+            self.successes = 0
+            self.limit = min(self.limit + 1, self.ceiling)
+
+    def record_failure(self, in_flight: int) -> None:
+        """Lower the limit after a failed request.
+
+        in_flight is the number of requests in flight when it was sent,
+        failures of requests sent alone do not change the limit.
+        """
+
+        self.successes = 0
+        self.ceiling_successes = 0
+        if in_flight > 1:
+            self.ceiling = min(self.ceiling, in_flight - 1)
+            self.limit = max(1, min(self.limit // 2, self.ceiling))
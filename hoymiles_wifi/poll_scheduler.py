@@ -0,0 +1,289 @@
+"""Adaptive real data polling for one or more DTUs."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import (
+    POLL_IDLE_DATA_INTERVAL,
+    POLL_IDLE_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_MIN_INTERVAL,
+    POLL_TRANSIENT_THRESHOLD,
+    REQUEST_INTERVAL,
+)
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+
+OnData = Callable[[DTU, RealDataNew_pb2.RealDataNewReqDTO], None]
+
+
+@dataclass
+class PollStats:
+    """Polling statistics of a DTU."""
+
+    polls: int = 0
+    heartbeats: int = 0
+    failures: int = 0
+    last_interval: float = 0.0
+    min_interval: float = 0.0
+    max_interval: float = 0.0
+    mean_interval: float = 0.0
+    last_power: int | None = None
+    peak_power: int = 0
+    pages: int = 1
+    last_data_time: float = 0.0
+
+    def add_interval(self, interval: float) -> None:
+        """Record the interval chosen for the next poll."""
+
+        count = self.polls + self.heartbeats + self.failures
+        if count <= 1:
+            self.min_interval = interval
+            self.max_interval = interval
+            self.mean_interval = interval
+        else:
+            self.min_interval = min(self.min_interval, interval)
+            self.max_interval = max(self.max_interval, interval)
+            self.mean_interval += (interval - self.mean_interval) / count
+
+        self.last_interval = interval
+
+
+@dataclass
+class PollTarget:
+    """DTU polled by the scheduler."""
+
+    dtu: DTU
+    stats: PollStats = field(default_factory=PollStats)
+    task: asyncio.Task | None = None
+    next_poll_time: float = 0.0
+
+
+class PollScheduler:
+    """Poll real data with an interval that follows the PV activity.
+
+    While the DTU reports no power only heartbeats are sent every
+    idle_interval, with a real data poll every idle_data_interval to detect
+    the start of production. While producing, the interval moves between
+    max_interval (steady output) and min_interval (relative power change of
+    transient_threshold or more), weighted by the power level relative to
+    the observed peak. The interval never drops below the time the DTU
+    needs to serve all pages of a poll. A poll that raises counts as a
+    failure and is retried after max_interval.
+
+    on_tick is called with the current unix time whenever a poll is due or
+    finished, e.g. to close the rollup windows of DTUs that went offline.
+    """
+
+    def __init__(
+        self,
+        on_data: OnData | None = None,
+        *,
+        min_interval: float = POLL_MIN_INTERVAL,
+        max_interval: float = POLL_MAX_INTERVAL,
+        idle_interval: float = POLL_IDLE_INTERVAL,
+        idle_data_interval: float = POLL_IDLE_DATA_INTERVAL,
+        transient_threshold: float = POLL_TRANSIENT_THRESHOLD,
+        on_tick: Callable[[float], None] | None = None,
+    ):
+        """Initialize PollScheduler class."""
+
+        self.on_data = on_data
+        self.on_tick = on_tick
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.idle_interval: float = idle_interval
+        self.idle_data_interval: float = idle_data_interval
+        self.transient_threshold: float = transient_threshold
+        self.targets: dict[str, PollTarget] = {}
+        self.running: bool = False
+        self._wakeup: asyncio.Event | None = None
+
+    def add_dtu(self, dtu: DTU) -> None:
+        """Add a DTU to the scheduler."""
+
+        target = PollTarget(dtu=dtu)
+        self.targets[dtu.host] = target
+
+        if self.running:
+            self._start_target(target)
+            self._wake()
+
+    def remove_dtu(self, dtu: DTU) -> None:
+        """Remove a DTU from the scheduler."""
+
+        target = self.targets.pop(dtu.host, None)
+        if target is not None and target.task is not None:
+            target.task.cancel()
+
+    def get_stats(self, host: str) -> PollStats | None:
+        """Get polling statistics of a DTU."""
+
+        target = self.targets.get(host)
+        return target.stats if target is not None else None
+
+    def compute_interval(self, stats: PollStats, previous_power: int | None) -> float:
+        """Compute the interval until the next poll."""
+
+        power = stats.last_power
+
+        if not power:
+            return self.idle_interval
+
+        # Never poll faster than the DTU can serve all pages
+        floor = max(self.min_interval, stats.pages * REQUEST_INTERVAL)
+        ceiling = max(floor, self.max_interval)
+
+        if not previous_power:
+            return floor
+
+        change = abs(power - previous_power) / max(power, previous_power)
+        level = power / max(stats.peak_power, power)
+
+        activity = min(1.0, change / self.transient_threshold * (0.5 + level / 2))
+
+        return ceiling - (ceiling - floor) * activity
+
+    async def async_poll(self, target: PollTarget) -> float:
+        """Poll a DTU once and return the interval until the next poll."""
+
+        stats = target.stats
+        previous_power = stats.last_power
+        idle = previous_power == 0
+        now = time.monotonic()
+
+        if idle and now - stats.last_data_time < self.idle_data_interval:
+            response = await target.dtu.async_heartbeat()
+            if response is None:
+                stats.failures += 1
+            else:
+                stats.heartbeats += 1
+            interval = self.idle_interval
+        else:
+            real_data = await target.dtu.async_get_real_data_new()
+
+            if real_data is None:
+                stats.failures += 1
+                interval = self.max_interval
+            else:
+                stats.polls += 1
+                stats.last_data_time = now
+                stats.pages = max(1, real_data.ap)
+                stats.last_power = real_data.dtu_power
+                stats.peak_power = max(stats.peak_power, real_data.dtu_power)
+                interval = self.compute_interval(stats, previous_power)
+
+                if self.on_data is not None:
+                    try:
+                        self.on_data(target.dtu, real_data)
+                    except Exception as e:
+                        logger.error(f"Poll callback failed for {target.dtu.host}: {e}")
+
+        stats.add_interval(interval)
+        return interval
+
+    async def async_run(self) -> None:
+        """Poll all DTUs until stopped."""
+
+        self.running = True
+        self._wakeup = asyncio.Event()
+
+        for target in self.targets.values():
+            if target.task is None or target.task.done():
+                self._start_target(target)
+
+        try:
+            while self.running:
+                self._wakeup.clear()
+                self._tick()
+
+                # Sleep until the next poll is due or the targets change
+                next_poll_time = min(
+                    (target.next_poll_time for target in self.targets.values()),
+                    default=time.monotonic() + self.idle_interval,
+                )
+                timeout = (
+                    max(0.0, next_poll_time - time.monotonic())
+                    if next_poll_time != float("inf")
+                    else None
+                )
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop polling."""
+
+        self.running = False
+        self._wake()
+
+        for target in self.targets.values():
+            if target.task is not None:
+                target.task.cancel()
+                target.task = None
+
+    def _start_target(self, target: PollTarget) -> None:
+        """Start the polling task of a DTU."""
+
+        target.task = asyncio.create_task(self._async_run_target(target))
+        target.task.add_done_callback(lambda task: self._on_task_done(target, task))
+
+    def _on_task_done(self, target: PollTarget, task: asyncio.Task) -> None:
+        """Log the exception that ended a polling task and restart it."""
+
+        if task.cancelled():
+            return
+
+        exception = task.exception()
+        if exception is None:
+            return
+
+        logger.error(f"Polling task {task.get_name()} failed: {exception!r}")
+
+        if (
+            self.running
+            and target.task is task
+            and self.targets.get(target.dtu.host) is target
+        ):
+            self._start_target(target)
+
+    def _wake(self) -> None:
+        """Wake async_run to recompute the next due time."""
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _tick(self) -> None:
+        """Call on_tick with the current time."""
+
+        if self.on_tick is None:
+            return
+
+        try:
+            self.on_tick(time.time())
+        except Exception as e:
+            logger.error(f"Tick callback failed: {e}")
+
+    async def _async_run_target(self, target: PollTarget) -> None:
+        """Poll a single DTU until stopped."""
+
+        while self.running:
+            target.next_poll_time = float("inf")
+            try:
+                interval = await self.async_poll(target)
+            except Exception as e:
+                logger.error(f"Polling {target.dtu.host} failed: {e!r}")
+                target.stats.failures += 1
+                interval = self.max_interval
+                target.stats.add_interval(interval)
+            logger.debug(f"Next poll of {target.dtu.host} in {interval:.1f}s")
+            target.next_poll_time = time.monotonic() + interval
+            self._wake()
+            await asyncio.sleep(interval)
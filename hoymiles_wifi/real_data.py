@@ -0,0 +1,180 @@
+"""Flattening of real data snapshots into scaled series values."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import NamedTuple
+
+from hoymiles_wifi.hoymiles import generate_inverter_serial_number
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+
+KIND_DTU = "dtu"
+KIND_INVERTER = "inverter"
+KIND_PORT = "port"
+KIND_METER = "meter"
+
+
+class RealDataField(NamedTuple):
+    """Field of a real data message with the factor to its unit."""
+
+    name: str
+    scale: float
+    unit: str
+
+
+class RealDataPoint(NamedTuple):
+    """Scaled value of a single field of a device or PV port."""
+
+    kind: str
+    serial_number: str
+    port: int
+    field: str
+    value: float
+
+
+DTU_FIELDS = (
+    RealDataField("dtu_power", 0.1, "watts"),
+    RealDataField("dtu_daily_energy", 1, "watthours"),
+    RealDataField("firmware_version", 1, "version"),
+)
+
+SGS_FIELDS = (
+    RealDataField("firmware_version", 1, "version"),
+    RealDataField("voltage", 0.1, "volts"),
+    RealDataField("frequency", 0.01, "hertz"),
+    RealDataField("active_power", 0.1, "watts"),
+    RealDataField("reactive_power", 0.1, "var"),
+    RealDataField("current", 0.01, "amperes"),
+    RealDataField("power_factor", 0.001, "ratio"),
+    RealDataField("temperature", 0.1, "celsius"),
+    RealDataField("power_limit", 0.1, "percent"),
+    RealDataField("warning_number", 1, "count"),
+    RealDataField("link_status", 1, "state"),
+)
+
+TGS_FIELDS = (
+    RealDataField("firmware_version", 1, "version"),
+    RealDataField("voltage_phase_A", 0.1, "volts"),
+    RealDataField("voltage_phase_B", 0.1, "volts"),
+    RealDataField("voltage_phase_C", 0.1, "volts"),
+    RealDataField("voltage_line_AB", 0.1, "volts"),
+    RealDataField("voltage_line_BC", 0.1, "volts"),
+    RealDataField("voltage_line_CA", 0.1, "volts"),
+    RealDataField("frequency", 0.01, "hertz"),
+    RealDataField("active_power", 0.1, "watts"),
+    RealDataField("reactive_power", 0.1, "var"),
+    RealDataField("current_phase_A", 0.01, "amperes"),
+    RealDataField("current_phase_B", 0.01, "amperes"),
+    RealDataField("current_phase_C", 0.01, "amperes"),
+    RealDataField("power_factor", 0.001, "ratio"),
+    RealDataField("temperature", 0.1, "celsius"),
+    RealDataField("warning_number", 1, "count"),
+    RealDataField("link_status", 1, "state"),
+)
+
+PV_FIELDS = (
+    RealDataField("voltage", 0.1, "volts"),
+    RealDataField("current", 0.01, "amperes"),
+    RealDataField("power", 0.1, "watts"),
+    RealDataField("energy_total", 1, "watthours"),
+    RealDataField("energy_daily", 1, "watthours"),
+    RealDataField("error_code", 1, "state"),
+)
+
+METER_FIELDS = (
+    RealDataField("phase_total_power", 0.1, "watts"),
+    RealDataField("phase_A_power", 0.1, "watts"),
+    RealDataField("phase_B_power", 0.1, "watts"),
+    RealDataField("phase_C_power", 0.1, "watts"),
+    RealDataField("energy_total_power", 1, "watthours"),
+    RealDataField("energy_total_consumed", 1, "watthours"),
+    RealDataField("voltage_phase_A", 0.1, "volts"),
+    RealDataField("voltage_phase_B", 0.1, "volts"),
+    RealDataField("voltage_phase_C", 0.1, "volts"),
+    RealDataField("current_phase_A", 0.01, "amperes"),
+    RealDataField("current_phase_B", 0.01, "amperes"),
+    RealDataField("current_phase_C", 0.01, "amperes"),
+    RealDataField("power_factor_total", 0.001, "ratio"),
+    RealDataField("fault_code", 1, "state"),
+)
+
+
+FIELD_UNITS: dict[tuple[str, str], str] = {
+    **{(KIND_DTU, field.name): field.unit for field in DTU_FIELDS},
+    **{(KIND_INVERTER, field.name): field.unit for field in SGS_FIELDS},
+    **{(KIND_INVERTER, field.name): field.unit for field in TGS_FIELDS},
+    **{(KIND_METER, field.name): field.unit for field in METER_FIELDS},
+    **{(KIND_PORT, field.name): field.unit for field in PV_FIELDS},
+}
+
+FIELD_SCALES: dict[tuple[str, str], float] = {
+    **{(KIND_DTU, field.name): field.scale for field in DTU_FIELDS},
+    **{(KIND_INVERTER, field.name): field.scale for field in SGS_FIELDS},
+    **{(KIND_INVERTER, field.name): field.scale for field in TGS_FIELDS},
+    **{(KIND_METER, field.name): field.scale for field in METER_FIELDS},
+    **{(KIND_PORT, field.name): field.scale for field in PV_FIELDS},
+}
+
+
+def iter_real_data_points(
+    real_data: RealDataNew_pb2.RealDataNewReqDTO,
+    scaled: bool = True,
+) -> Iterator[RealDataPoint]:
+    """Iterate over the values of all devices and PV ports of a snapshot.
+
+    Inverters and meters use port 0, PV ports their port number. Values are
+    converted to the unit of the field unless scaled is False.
+    """
+
+    dtu_serial_number = real_data.device_serial_number
+
+    for field in DTU_FIELDS:
+        value = getattr(real_data, field.name)
+        yield RealDataPoint(
+            KIND_DTU,
+            dtu_serial_number,
+            0,
+            field.name,
+            value * field.scale if scaled else value,
+        )
+
+    for messages, kind, fields in (
+        (real_data.sgs_data, KIND_INVERTER, SGS_FIELDS),
+        (real_data.tgs_data, KIND_INVERTER, TGS_FIELDS),
+        (real_data.meter_data, KIND_METER, METER_FIELDS),
+    ):
+        for message in messages:
+            serial_number = generate_inverter_serial_number(message.serial_number)
+            for field in fields:
+                value = getattr(message, field.name)
+                yield RealDataPoint(
+                    kind,
+                    serial_number,
+                    0,
+                    field.name,
+                    value * field.scale if scaled else value,
+                )
+
+    for pv_data in real_data.pv_data:
+        serial_number = generate_inverter_serial_number(pv_data.serial_number)
+        for field in PV_FIELDS:
+            value = getattr(pv_data, field.name)
+            yield RealDataPoint(
+                KIND_PORT,
+                serial_number,
+                pv_data.port_number,
+                field.name,
+                value * field.scale if scaled else value,
+            )
+
+
+def get_field_unit(kind: str, field_name: str) -> str:
+    """Get the unit of a field."""
+
+    return FIELD_UNITS.get((kind, field_name), "")
+
+
+def get_field_scale(kind: str, field_name: str) -> float:
+    """Get the factor of a field to its unit."""
+
+    return FIELD_SCALES.get((kind, field_name), 1)
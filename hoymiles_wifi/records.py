@@ -0,0 +1,135 @@
+"""Length-prefixed binary records of DTU responses."""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+import time
+from collections.abc import Iterator
+from typing import Any, BinaryIO, NamedTuple
+
+from google.protobuf.message import Message
+
+from hoymiles_wifi.registry import RESPONSE_TAGS, get_message_type
+from hoymiles_wifi.serializer import write_json
+
+# Record header: magic, tag, variant, timestamp, payload length
+RECORD_HEADER = struct.Struct("<2sHBdI")
+RECORD_MAGIC = b"HR"
+
+
+def _get_message_tags() -> dict[str, tuple[int, int]]:
+    """Map message types to response tag and variant, the first command wins."""
+
+    message_tags: dict[str, tuple[int, int]] = {}
+    for tag, commands in RESPONSE_TAGS.items():
+        for variant, info in enumerate(commands):
+            message_tags.setdefault(
+                info.response_type.DESCRIPTOR.full_name, (tag, variant)
+            )
+
+    return message_tags
+
+
+# Message type -> response tag and variant
+MESSAGE_TAGS: dict[str, tuple[int, int]] = _get_message_tags()
+
+
+class Record(NamedTuple):
+    """Response read from a record stream."""
+
+    tag: int
+    variant: int
+    timestamp: float
+    message: Any
+
+
+def write_record(
+    stream: BinaryIO,
+    message: Message,
+    timestamp: float | None = None,
+    tag: int | None = None,
+    variant: int = 0,
+) -> None:
+    """Write a message as record taken at timestamp (default now).
+
+    The tag defaults to the response tag of the message type. Together with
+    the variant, which tells apart the commands sharing a tag, it identifies
+    the message type when reading. Raises ValueError for message types
+    without a command.
+    """
+
+    if tag is None:
+        result = MESSAGE_TAGS.get(message.DESCRIPTOR.full_name)
+        if result is None:
+            raise ValueError(f"No command for {message.DESCRIPTOR.full_name}")
+        tag, variant = result
+
+    payload = message.SerializeToString()
+    stream.write(
+        RECORD_HEADER.pack(
+            RECORD_MAGIC,
+            tag,
+            variant,
+            timestamp if timestamp is not None else time.time(),
+            len(payload),
+        )
+    )
+    stream.write(payload)
+
+
+def iter_records(stream: BinaryIO, parse: bool = True) -> Iterator[Record]:
+    """Read the records of a stream as typed messages.
+
+    With parse=False the message is the serialized payload. Raises
+    ValueError for corrupt or truncated records and unknown tags.
+    """
+
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) < RECORD_HEADER.size:
+            raise ValueError("Truncated record header")
+
+        magic, tag, variant, timestamp, length = RECORD_HEADER.unpack(header)
+        if magic != RECORD_MAGIC:
+            raise ValueError("Invalid record magic")
+
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise ValueError(
+                f"Truncated record (expected {length}, got {len(payload)})"
+            )
+
+        if not parse:
+            yield Record(tag, variant, timestamp, payload)
+            continue
+
+        message_type = get_message_type(tag, variant)
+        if message_type is None:
+            raise ValueError(f"Unknown tag {hex(tag)} (variant {variant})")
+
+        yield Record(tag, variant, timestamp, message_type.FromString(payload))
+
+
+def main() -> None:
+    """Print the records of a file or stdin as JSON lines."""
+
+    parser = argparse.ArgumentParser(description="Read hoymiles-wifi binary records")
+    parser.add_argument(
+        "file", type=str, nargs="?", default=None, help="Record file (default stdin)"
+    )
+    args = parser.parse_args()
+
+    with open(args.file, "rb") if args.file else sys.stdin.buffer as stream:
+        for record in iter_records(stream):
+            sys.stdout.write(f'{{"tag":{record.tag},"timestamp":{record.timestamp},')
+            sys.stdout.write('"message":')
+            write_json(record.message, sys.stdout, indent=None)
+            sys.stdout.write("}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Registry of the message types exchanged for each command tag."""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, NamedTuple
+
+from hoymiles_wifi.const import (
+    CMD_APP_GET_HIST_POWER_RES,
+    CMD_APP_INFO_DATA_RES_DTO,
+    CMD_CLOUD_COMMAND_RES_DTO,
+    CMD_COMMAND_RES_DTO,
+    CMD_ES_DATA_DTO,
+    CMD_ES_REG_RES_DTO,
+    CMD_ES_USER_SET_RES_DTO,
+    CMD_GET_CONFIG,
+    CMD_GW_INFO_RES_DTO,
+    CMD_GW_NET_INFO_RES,
+    CMD_HB_RES_DTO,
+    CMD_NETWORK_INFO_RES,
+    CMD_REAL_DATA_RES_DTO,
+    CMD_REAL_RES_DTO,
+    CMD_SET_CONFIG,
+    NOT_ENCRYPTED_COMMANDS,
+)
+from hoymiles_wifi.protobuf import (
+    AppGetHistPower_pb2,
+    APPHeartbeatPB_pb2,
+    APPInfomationData_pb2,
+    CommandPB_pb2,
+    ESData_pb2,
+    ESRegPB_pb2,
+    ESUserSet_pb2,
+    GetConfig_pb2,
+    GWInfo_pb2,
+    GWNetInfo_pb2,
+    InfomationData_pb2,
+    NetworkInfo_pb2,
+    RealData_pb2,
+    RealDataNew_pb2,
+    SetConfig_pb2,
+)
+
+
+class CommandInfo(NamedTuple):
+    """Message types and framing of a command.
+
+    is_request_encrypted and is_response_encrypted tell whether the payload
+    of the request and response frames is encrypted on DTUs that use
+    encryption.
+    """
+
+    name: str
+    command: bytes
+    request_type: Any
+    response_type: Any
+    is_extended_format: bool
+    is_request_encrypted: bool
+    is_response_encrypted: bool
+
+    @property
+    def request_tag(self) -> int:
+        """Tag of the request frame."""
+
+        return struct.unpack(">H", self.command)[0]
+
+    @property
+    def response_tag(self) -> int:
+        """Tag the DTU answers with."""
+
+        return get_response_tag(self.request_tag)
+
+
+def get_response_tag(request_tag: int) -> int:
+    """Get the response tag of a request tag."""
+
+    return request_tag & 0xFEFF
+
+
+def create_command_info(
+    name: str,
+    command: bytes,
+    request_type: Any,
+    response_type: Any,
+    *,
+    is_extended_format: bool,
+) -> CommandInfo:
+    """Create the CommandInfo of a command.
+
+    Extended frames and the tags in NOT_ENCRYPTED_COMMANDS are never
+    encrypted.
+    """
+
+    response_command = struct.pack(
+        ">H", get_response_tag(struct.unpack(">H", command)[0])
+    )
+
+    return CommandInfo(
+        name,
+        command,
+        request_type,
+        response_type,
+        is_extended_format,
+        is_request_encrypted=not is_extended_format
+        and command not in NOT_ENCRYPTED_COMMANDS,
+        is_response_encrypted=not is_extended_format
+        and response_command not in NOT_ENCRYPTED_COMMANDS,
+    )
+
+
+APP_INFORMATION_DATA = create_command_info(
+    "app_information_data",
+    CMD_APP_INFO_DATA_RES_DTO,
+    APPInfomationData_pb2.APPInfoDataResDTO,
+    APPInfomationData_pb2.APPInfoDataReqDTO,
+    is_extended_format=False,
+)
+# Shares its tags with APP_INFORMATION_DATA
+INFORMATION_DATA = create_command_info(
+    "information_data",
+    CMD_APP_INFO_DATA_RES_DTO,
+    InfomationData_pb2.InfoDataResDTO,
+    InfomationData_pb2.InfoDataReqDTO,
+    is_extended_format=False,
+)
+HEARTBEAT = create_command_info(
+    "heartbeat",
+    CMD_HB_RES_DTO,
+    APPHeartbeatPB_pb2.HBResDTO,
+    APPHeartbeatPB_pb2.HBReqDTO,
+    is_extended_format=False,
+)
+REAL_DATA = create_command_info(
+    "real_data",
+    CMD_REAL_DATA_RES_DTO,
+    RealData_pb2.RealDataResDTO,
+    RealData_pb2.RealDataReqDTO,
+    is_extended_format=False,
+)
+COMMAND = create_command_info(
+    "command",
+    CMD_COMMAND_RES_DTO,
+    CommandPB_pb2.CommandResDTO,
+    CommandPB_pb2.CommandReqDTO,
+    is_extended_format=False,
+)
+GET_CONFIG = create_command_info(
+    "get_config",
+    CMD_GET_CONFIG,
+    GetConfig_pb2.GetConfigResDTO,
+    GetConfig_pb2.GetConfigReqDTO,
+    is_extended_format=False,
+)
+SET_CONFIG = create_command_info(
+    "set_config",
+    CMD_SET_CONFIG,
+    SetConfig_pb2.SetConfigResDTO,
+    SetConfig_pb2.SetConfigReqDTO,
+    is_extended_format=False,
+)
+REAL_DATA_NEW = create_command_info(
+    "real_data_new",
+    CMD_REAL_RES_DTO,
+    RealDataNew_pb2.RealDataNewResDTO,
+    RealDataNew_pb2.RealDataNewReqDTO,
+    is_extended_format=False,
+)
+NETWORK_INFO = create_command_info(
+    "network_info",
+    CMD_NETWORK_INFO_RES,
+    NetworkInfo_pb2.NetworkInfoResDTO,
+    NetworkInfo_pb2.NetworkInfoReqDTO,
+    is_extended_format=False,
+)
+APP_GET_HIST_POWER = create_command_info(
+    "app_get_hist_power",
+    CMD_APP_GET_HIST_POWER_RES,
+    AppGetHistPower_pb2.AppGetHistPowerResDTO,
+    AppGetHistPower_pb2.AppGetHistPowerReqDTO,
+    is_extended_format=False,
+)
+CLOUD_COMMAND = create_command_info(
+    "cloud_command",
+    CMD_CLOUD_COMMAND_RES_DTO,
+    CommandPB_pb2.CommandResDTO,
+    CommandPB_pb2.CommandReqDTO,
+    is_extended_format=False,
+)
+GATEWAY_INFO = create_command_info(
+    "gateway_info",
+    CMD_GW_INFO_RES_DTO,
+    GWInfo_pb2.GWInfoResDTO,
+    GWInfo_pb2.GWInfoReqDTO,
+    is_extended_format=True,
+)
+GATEWAY_NETWORK_INFO = create_command_info(
+    "gateway_network_info",
+    CMD_GW_NET_INFO_RES,
+    GWNetInfo_pb2.GWNetInfoRes,
+    GWNetInfo_pb2.GWNetInfoReq,
+    is_extended_format=True,
+)
+ENERGY_STORAGE_REGISTRY = create_command_info(
+    "energy_storage_registry",
+    CMD_ES_REG_RES_DTO,
+    ESRegPB_pb2.ESRegResDTO,
+    ESRegPB_pb2.ESRegReqDTO,
+    is_extended_format=True,
+)
+ENERGY_STORAGE_DATA = create_command_info(
+    "energy_storage_data",
+    CMD_ES_DATA_DTO,
+    ESData_pb2.ESDataResDTO,
+    ESData_pb2.ESDataReqDTO,
+    is_extended_format=True,
+)
+ENERGY_STORAGE_WORKING_MODE = create_command_info(
+    "energy_storage_working_mode",
+    CMD_ES_USER_SET_RES_DTO,
+    ESUserSet_pb2.ESUserSetPutResDTO,
+    ESUserSet_pb2.ESUserSetPutReqDTO,
+    is_extended_format=True,
+)
+
+COMMANDS: tuple[CommandInfo, ...] = (
+    APP_INFORMATION_DATA,
+    INFORMATION_DATA,
+    HEARTBEAT,
+    REAL_DATA,
+    COMMAND,
+    GET_CONFIG,
+    SET_CONFIG,
+    REAL_DATA_NEW,
+    NETWORK_INFO,
+    APP_GET_HIST_POWER,
+    CLOUD_COMMAND,
+    GATEWAY_INFO,
+    GATEWAY_NETWORK_INFO,
+    ENERGY_STORAGE_REGISTRY,
+    ENERGY_STORAGE_DATA,
+    ENERGY_STORAGE_WORKING_MODE,
+)
+
+
+def _group_by_tag(response: bool) -> dict[int, tuple[CommandInfo, ...]]:
+    """Group the commands by their request or response tag."""
+
+    groups: dict[int, tuple[CommandInfo, ...]] = {}
+    for info in COMMANDS:
+        tag = info.response_tag if response else info.request_tag
+        groups[tag] = (*groups.get(tag, ()), info)
+
+    return groups
+
+
+# Request tag -> commands, in the order of COMMANDS
+REQUEST_TAGS: dict[int, tuple[CommandInfo, ...]] = _group_by_tag(response=False)
+# Response tag -> commands, in the order of COMMANDS
+RESPONSE_TAGS: dict[int, tuple[CommandInfo, ...]] = _group_by_tag(response=True)
+
+
+def get_command_info(tag: int, variant: int = 0) -> tuple[CommandInfo, bool] | None:
+    """Look up the command of a frame tag.
+
+    Several commands share a tag, variant is the index of the command among
+    them (the first by default). Returns the command and whether the tag is
+    a response tag, or None for unknown tags and variants.
+    """
+
+    for tags, is_response in ((RESPONSE_TAGS, True), (REQUEST_TAGS, False)):
+        commands = tags.get(tag)
+        if commands is not None:
+            if variant >= len(commands):
+                return None
+            return commands[variant], is_response
+
+    return None
+
+
+def is_encrypted_tag(tag: int) -> bool:
+    """Check if the payload of frames with a tag is encrypted.
+
+    Tags of unknown commands are encrypted.
+    """
+
+    commands = RESPONSE_TAGS.get(tag)
+    if commands is not None:
+        return commands[0].is_response_encrypted
+
+    commands = REQUEST_TAGS.get(tag)
+    if commands is not None:
+        return commands[0].is_request_encrypted
+
+    return True
+
+
+def get_variant(info: CommandInfo) -> int:
+    """Get the index of a command among the commands sharing its tags."""
+
+    return REQUEST_TAGS[info.request_tag].index(info)
+
+
+def get_message_type(tag: int, variant: int = 0) -> Any:
+    """Get the message type of a frame tag, None for unknown tags."""
+
+    result = get_command_info(tag, variant)
+    if result is None:
+        return None
+
+    info, is_response = result
+    return info.response_type if is_response else info.request_type
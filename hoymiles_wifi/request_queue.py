@@ -0,0 +1,123 @@
+"""Priority ordered access to a DTU."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+
+
+class RequestPriority(IntEnum):
+    """Request priority, lower values are served first."""
+
+    CONTROL = 0
+    NORMAL = 1
+    TELEMETRY = 2
+
+
+@dataclass
+class QueueStats:
+    """Wait time statistics of a request priority."""
+
+    requests: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Mean time spent waiting for the DTU."""
+
+        return self.total_wait / self.requests if self.requests else 0.0
+
+    def add_wait(self, wait: float) -> None:
+        """Record the wait time of a request."""
+
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class RequestQueue:
+    """Exclusive access to a DTU, granted in priority order.
+
+    Waiters of equal priority are served first come, first served. Futures
+    are created on the running event loop when needed, so the queue is not
+    bound to the loop it was created on. Using the queue directly as an
+    async context manager acquires it with normal priority.
+    """
+
+    def __init__(self):
+        """Initialize RequestQueue class."""
+
+        self._locked: bool = False
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self.stats: dict[RequestPriority, QueueStats] = {
+            priority: QueueStats() for priority in RequestPriority
+        }
+
+    def locked(self) -> bool:
+        """Check if the queue is held by a request."""
+
+        return self._locked
+
+    def get_depth(self) -> int:
+        """Get the number of waiting requests."""
+
+        return sum(not future.done() for _, _, future in self._waiters)
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.NORMAL):
+        """Wait until the DTU is available for a request of the given priority."""
+
+        start_time = time.monotonic()
+
+        if self._locked or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), future))
+
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Ownership was handed over right before the cancellation
+                    self.release()
+                raise
+        else:
+            self._locked = True
+
+        self.stats[priority].add_wait(time.monotonic() - start_time)
+
+    def release(self) -> None:
+        """Hand the DTU over to the next waiter."""
+
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._locked = False
+
+    @asynccontextmanager
+    async def priority(self, priority: RequestPriority):
+        """Hold the queue with the given priority."""
+
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def __aenter__(self):
+        """Acquire with normal priority."""
+
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Release the queue."""
+
+        self.release()
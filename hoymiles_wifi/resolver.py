@@ -0,0 +1,149 @@
+"""Caching resolution of DTU hostnames."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ipaddress
+import socket
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import DTU_PORT, RESOLVER_RETRY_INTERVAL, RESOLVER_TTL
+
+T = TypeVar("T")
+
+
+def is_ip_address(host: str) -> bool:
+    """Check whether host is an IP address rather than a hostname."""
+
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+
+    return True
+
+
+def get_address_family(local_addr: str | None) -> int:
+    """Get the address family a socket bound to local_addr can connect to."""
+
+    if local_addr is None:
+        return socket.AF_UNSPEC
+
+    return socket.AF_INET6 if ":" in local_addr else socket.AF_INET
+
+
+class HostResolver:
+    """Resolve a hostname once and cache its addresses for ttl seconds.
+
+    Once the ttl has expired the cached addresses are still returned while
+    the host is resolved again in the background. If resolution fails the
+    last known addresses are kept, so a flaky resolver does not take the
+    DTU offline. Only addresses of family are resolved, AF_UNSPEC keeps
+    IPv4 and IPv6 addresses in the order of getaddrinfo.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        ttl: float = RESOLVER_TTL,
+        port: int = DTU_PORT,
+        family: int = socket.AF_UNSPEC,
+    ):
+        """Initialize HostResolver class."""
+
+        self.host: str = host
+        self.ttl: float = ttl
+        self.port: int = port
+        self.family: int = family
+        self.addresses: list[str] = []
+        self.expires: float = 0.0
+        self._refresh: asyncio.Task | None = None
+
+    async def async_resolve(self) -> list[str]:
+        """Get the addresses of the host.
+
+        Raises OSError if the host was never resolved and resolution fails.
+        """
+
+        if not self.addresses:
+            return await self.async_lookup()
+
+        if time.monotonic() >= self.expires and (
+            self._refresh is None or self._refresh.done()
+        ):
+            self._refresh = asyncio.create_task(self._async_refresh())
+
+        return self.addresses
+
+    async def async_lookup(self) -> list[str]:
+        """Resolve the host and cache its addresses."""
+
+        start_time = time.monotonic()
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            self.host, self.port, family=self.family, type=socket.SOCK_STREAM
+        )
+        if not infos:
+            raise OSError(f"No address for {self.host}")
+
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if set(addresses) != set(self.addresses):
+            logger.debug(
+                f"Resolved {self.host} to {', '.join(addresses)} "
+                f"in {time.monotonic() - start_time:.3f}s"
+            )
+            self.addresses = addresses
+
+        self.expires = time.monotonic() + self.ttl
+        return self.addresses
+
+    async def async_connect(self, connect: Callable[[str], Awaitable[T]]) -> T:
+        """Connect to the first address of the host that accepts a connection.
+
+        An address that connects after others failed is tried first from
+        then on. Raises the OSError of the last address if none connects.
+        """
+
+        addresses = await self.async_resolve()
+
+        for address in addresses[:-1]:
+            try:
+                result = await connect(address)
+            except OSError as e:
+                logger.debug(f"Connecting to {self.host} at {address} failed: {e}")
+                continue
+
+            if address != addresses[0]:
+                self.addresses = [address] + [a for a in addresses if a != address]
+            return result
+
+        result = await connect(addresses[-1])
+        if len(addresses) > 1:
+            self.addresses = [addresses[-1]] + addresses[:-1]
+        return result
+
+    async def _async_refresh(self) -> None:
+        """Resolve the host again, keeping the last addresses on failure."""
+
+        try:
+            await self.async_lookup()
+        except OSError as e:
+            logger.debug(
+                f"Resolving {self.host} failed, using last addresses "
+                f"{', '.join(self.addresses)}: {e}"
+            )
+            self.expires = time.monotonic() + min(self.ttl, RESOLVER_RETRY_INTERVAL)
+
+    async def async_close(self) -> None:
+        """Cancel and wait for the background resolution."""
+
+        if self._refresh is None:
+            return
+
+        self._refresh.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._refresh
+        self._refresh = None
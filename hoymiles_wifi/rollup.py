@@ -0,0 +1,256 @@
+"""Incremental aggregation of real data snapshots into time windows."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from hoymiles_wifi.const import ROLLUP_RESOLUTIONS
+from hoymiles_wifi.delta import SeriesKey
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import get_field_unit, iter_real_data_points
+
+# Units of counters, which are aggregated as increments
+COUNTER_UNITS = ("watthours",)
+# Counters that restart from zero every day, other counters never drop
+RESETTING_COUNTERS = ("dtu_daily_energy", "energy_daily")
+# Units of identity fields, which are not aggregated
+IDENTITY_UNITS = ("version",)
+
+
+class Rollup(NamedTuple):
+    """Aggregate of a series over a closed window."""
+
+    resolution: int
+    start: int
+    kind: str
+    serial_number: str
+    port: int
+    field: str
+    count: int
+    mean: float
+    minimum: float
+    maximum: float
+    last: float
+    delta: float
+
+
+class _Window:
+    """Running aggregate of the open window of a series."""
+
+    __slots__ = ("count", "delta", "last", "maximum", "minimum", "start", "total")
+
+    def __init__(self, start: int, value: float, delta: float):
+        """Start a window with its first value."""
+
+        self.start: int = start
+        self.count: int = 1
+        self.total: float = value
+        self.minimum: float = value
+        self.maximum: float = value
+        self.last: float = value
+        self.delta: float = delta
+
+    def add(self, value: float, delta: float) -> None:
+        """Fold a value into the window."""
+
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.last = value
+        self.delta += delta
+
+
+class RollupEngine:
+    """Fold snapshots into per series rollups at several resolutions.
+
+    Every series (device or PV port field) keeps one open window per
+    resolution and the previous value, so the state does not grow with the
+    number of snapshots. A window is closed and emitted to the sinks once a
+    snapshot falls into a later window. Windows are aligned to multiples of
+    the resolution in local time of utc_offset seconds, so daily windows
+    start at local midnight.
+
+    delta is the increase of counters (energy) within the window. A daily
+    counter that drops, e.g. at midnight, restarts from zero. A drop of a
+    lifetime counter is taken as a bad reading and ignored, the increase is
+    counted from the last good value. Identity fields such as the firmware
+    version are not aggregated.
+
+    Windows of series that stopped reporting, e.g. of an offline DTU, are
+    only closed by close_expired, which also forgets series without open
+    windows.
+    """
+
+    def __init__(
+        self,
+        resolutions: tuple[int, ...] = ROLLUP_RESOLUTIONS,
+        sinks: list[Callable[[list[Rollup]], Any]] | None = None,
+        utc_offset: int = 0,
+    ):
+        """Initialize RollupEngine class."""
+
+        self.resolutions: tuple[int, ...] = resolutions
+        self.sinks: list[Callable[[list[Rollup]], Any]] = sinks or []
+        self.utc_offset: int = utc_offset
+        # series -> open window per resolution
+        self.windows: dict[SeriesKey, list[_Window | None]] = {}
+        # series -> previous value, for counter increments
+        self.previous: dict[SeriesKey, float] = {}
+        self._counters: dict[tuple[str, str], bool] = {}
+
+    def add_sink(self, sink: Callable[[list[Rollup]], Any]) -> None:
+        """Add a callable receiving the rollups of closed windows."""
+
+        self.sinks.append(sink)
+
+    def add(
+        self,
+        real_data: RealDataNew_pb2.RealDataNewReqDTO,
+        timestamp: float | None = None,
+    ) -> list[Rollup]:
+        """Fold a snapshot taken at timestamp (default now) into the windows.
+
+        Returns the rollups of the windows closed by this snapshot.
+        """
+
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        starts = [
+            self.get_window_start(timestamp, resolution)
+            for resolution in self.resolutions
+        ]
+        closed: list[Rollup] = []
+
+        for point in iter_real_data_points(real_data):
+            if get_field_unit(point.kind, point.field) in IDENTITY_UNITS:
+                continue
+
+            key: SeriesKey = (
+                point.kind,
+                point.serial_number,
+                point.port,
+                point.field,
+            )
+            value = float(point.value)
+
+            delta = 0.0
+            if self._is_counter(point.kind, point.field):
+                previous = self.previous.get(key)
+                if previous is None or value >= previous:
+                    delta = value - previous if previous is not None else 0.0
+                    self.previous[key] = value
+                elif point.field in RESETTING_COUNTERS:
+                    delta = value
+                    self.previous[key] = value
+
+            windows = self.windows.get(key)
+            if windows is None:
+                windows = [None] * len(self.resolutions)
+                self.windows[key] = windows
+
+            for index, start in enumerate(starts):
+                window = windows[index]
+                if window is not None and window.start == start:
+                    window.add(value, delta)
+                    continue
+
+                if window is not None:
+                    closed.append(self._close(key, self.resolutions[index], window))
+                windows[index] = _Window(start, value, delta)
+
+        self._emit(closed)
+        return closed
+
+    def on_data(self, dtu: Any, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> None:
+        """Fold a snapshot, usable as on_data callback of PollScheduler."""
+
+        self.add(real_data)
+
+    def close_expired(self, now: float | None = None) -> list[Rollup]:
+        """Close and emit the windows that ended before now (default now).
+
+        Series without open windows left are forgotten. Usable as on_tick
+        callback of PollScheduler.
+        """
+
+        now = int(now if now is not None else time.time())
+        starts = [
+            self.get_window_start(now, resolution) for resolution in self.resolutions
+        ]
+        closed: list[Rollup] = []
+        idle: list[SeriesKey] = []
+
+        for key, windows in self.windows.items():
+            for index, window in enumerate(windows):
+                if window is not None and window.start < starts[index]:
+                    closed.append(self._close(key, self.resolutions[index], window))
+                    windows[index] = None
+
+            if all(window is None for window in windows):
+                idle.append(key)
+
+        for key in idle:
+            del self.windows[key]
+            self.previous.pop(key, None)
+
+        self._emit(closed)
+        return closed
+
+    def flush(self) -> list[Rollup]:
+        """Close and emit all open windows."""
+
+        closed = [
+            self._close(key, self.resolutions[index], window)
+            for key, windows in self.windows.items()
+            for index, window in enumerate(windows)
+            if window is not None
+        ]
+        self.windows.clear()
+
+        self._emit(closed)
+        return closed
+
+    def get_window_start(self, timestamp: int, resolution: int) -> int:
+        """Get the start of the window of a timestamp."""
+
+        return (
+            timestamp + self.utc_offset
+        ) // resolution * resolution - self.utc_offset
+
+    def _is_counter(self, kind: str, field_name: str) -> bool:
+        """Check whether a field is a counter."""
+
+        key = (kind, field_name)
+        is_counter = self._counters.get(key)
+
+        if is_counter is None:
+            is_counter = get_field_unit(kind, field_name) in COUNTER_UNITS
+            self._counters[key] = is_counter
+
+        return is_counter
+
+    def _close(self, key: SeriesKey, resolution: int, window: _Window) -> Rollup:
+        """Create the rollup of a window."""
+
+        return Rollup(
+            resolution,
+            window.start,
+            *key,
+            window.count,
+            window.total / window.count,
+            window.minimum,
+            window.maximum,
+            window.last,
+            window.delta,
+        )
+
+    def _emit(self, rollups: list[Rollup]) -> None:
+        """Pass closed windows to the sinks."""
+
+        if not rollups:
+            return
+
+        for sink in self.sinks:
+            sink(rollups)
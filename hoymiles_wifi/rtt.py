@@ -0,0 +1,81 @@
+"""Round-trip time estimation for adaptive DTU request timeouts."""
+
+from __future__ import annotations
+
+from hoymiles_wifi.const import (
+    MIN_TIMEOUT,
+    RTT_ALPHA,
+    RTT_BETA,
+    RTT_INITIAL_TIMEOUT,
+    RTT_MAX_BACKOFFS,
+    RTT_VARIANCE_FACTOR,
+)
+
+
+class RttEstimator:
+    """Estimate a retransmission style timeout from observed round-trip times.
+
+    Follows the TCP RTO calculation (RFC 6298): a smoothed RTT and its mean
+    deviation are updated with every successful exchange and the timeout is
+    ``srtt + K * rttvar``, clamped to ``[min_timeout, max_timeout]``.
+    Until the first sample is seen RTT_INITIAL_TIMEOUT is used. Every timeout
+    doubles the current value (up to the ceiling) so a slow DTU is not
+    starved. After more than RTT_MAX_BACKOFFS timeouts in a row the DTU is
+    considered offline and probed with the estimate again, so it does not
+    delay every poll by the ceiling.
+    """
+
+    def __init__(
+        self,
+        max_timeout: float,
+        min_timeout: float = MIN_TIMEOUT,
+    ):
+        """Initialize RttEstimator class."""
+
+        self.min_timeout: float = min_timeout
+        self.max_timeout: float = max_timeout
+        self.srtt: float | None = None
+        self.rttvar: float = 0.0
+        self.estimate: float = RTT_INITIAL_TIMEOUT
+        self.rto: float = RTT_INITIAL_TIMEOUT
+        self.samples: int = 0
+        self.rtt_sum: float = 0.0
+        self.timeouts: int = 0
+        self.consecutive_timeouts: int = 0
+
+    def add_sample(self, rtt: float) -> None:
+        """Update the estimate with the round-trip time of a successful exchange."""
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            deviation = abs(self.srtt - rtt)
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * deviation
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+
+        self.samples += 1
+        self.rtt_sum += rtt
+        self.consecutive_timeouts = 0
+        self.estimate = self.srtt + RTT_VARIANCE_FACTOR * self.rttvar
+        self.rto = self._clamp(self.estimate)
+
+    def backoff(self) -> None:
+        """Double the timeout after an exchange timed out."""
+
+        self.timeouts += 1
+        self.consecutive_timeouts += 1
+        self.rto = self._clamp(self.rto * 2)
+
+    def get_timeout(self) -> float:
+        """Get the timeout to apply to the next exchange."""
+
+        if self.consecutive_timeouts > RTT_MAX_BACKOFFS:
+            return self._clamp(self.estimate)
+
+        return self._clamp(self.rto)
+
+    def _clamp(self, value: float) -> float:
+        """Clamp value to the configured floor and ceiling."""
+
+        return max(self.min_timeout, min(self.max_timeout, value))
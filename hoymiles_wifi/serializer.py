@@ -0,0 +1,409 @@
+"""Fast JSON serialization of protobuf messages."""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import math
+import re
+import struct
+from collections.abc import Callable
+from typing import Any, NamedTuple, TextIO
+
+from google.protobuf import json_format
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+
+from hoymiles_wifi.const import SERIALIZER_BUFFER_PARTS
+from hoymiles_wifi.hoymiles import generate_inverter_serial_number
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import (
+    DTU_FIELDS,
+    METER_FIELDS,
+    PV_FIELDS,
+    SGS_FIELDS,
+    TGS_FIELDS,
+)
+
+KIND_SCALAR = 0
+KIND_MESSAGE = 1
+KIND_REPEATED_SCALAR = 2
+KIND_REPEATED_MESSAGE = 3
+KIND_MAP = 4
+KIND_WELL_KNOWN = 5
+
+INT64_TYPES = (
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED64,
+    FieldDescriptor.TYPE_SFIXED64,
+)
+
+# Integer fields holding inverter, meter or repeater serial numbers
+SERIAL_NUMBER_PATTERN = re.compile(r"(^|_)(sns?|serial_numbers?)(_|$)")
+
+# Message -> field -> divisor to the unit of the field
+FIELD_DIVISORS: dict[str, dict[str, int]] = {
+    message_type.DESCRIPTOR.full_name: {
+        field.name: round(1 / field.scale) for field in fields if field.scale != 1
+    }
+    for message_type, fields in (
+        (RealDataNew_pb2.RealDataNewReqDTO, DTU_FIELDS),
+        (RealDataNew_pb2.SGSMO, SGS_FIELDS),
+        (RealDataNew_pb2.TGSMO, TGS_FIELDS),
+        (RealDataNew_pb2.MeterMO, METER_FIELDS),
+        (RealDataNew_pb2.PvMO, PV_FIELDS),
+    )
+}
+
+
+class Options(NamedTuple):
+    """Options that change the compiled fields of a message."""
+
+    scaled: bool
+    hex_serial_numbers: bool
+    preserving_proto_field_name: bool
+    ensure_ascii: bool
+    colon: str
+
+
+class CompiledField(NamedTuple):
+    """Key and value encoder of a field."""
+
+    key: str
+    kind: int
+    encode: Callable[[Any], str] | None
+    map_value: CompiledField | None
+
+
+_compiled: dict[tuple[Descriptor, Options], dict[FieldDescriptor, CompiledField]] = {}
+
+
+def encode_string(value: str) -> str:
+    """Encode a string like json.dumps(ensure_ascii=False)."""
+
+    return json.encoder.encode_basestring(value)
+
+
+def encode_ascii_string(value: str) -> str:
+    """Encode a string like json.dumps, escaping non-ASCII characters."""
+
+    return json.encoder.encode_basestring_ascii(value)
+
+
+def encode_bytes(value: bytes) -> str:
+    """Encode bytes as base64 string."""
+
+    return '"' + base64.b64encode(value).decode() + '"'
+
+
+def encode_bool(value: bool) -> str:
+    """Encode a bool."""
+
+    return "true" if value else "false"
+
+
+def encode_int64(value: int) -> str:
+    """Encode a 64 bit integer as string, as int64 exceeds JSON numbers."""
+
+    return f'"{value}"'
+
+
+def encode_serial_number(value: int) -> str:
+    """Encode a serial number as hex string."""
+
+    return '"' + generate_inverter_serial_number(value) + '"'
+
+
+def encode_double(value: float) -> str:
+    """Encode a double, NaN and infinity as strings."""
+
+    if math.isnan(value):
+        return '"NaN"'
+    if math.isinf(value):
+        return '"Infinity"' if value > 0 else '"-Infinity"'
+
+    return repr(value)
+
+
+def encode_float(value: float) -> str:
+    """Encode a float with the shortest representation that survives float32."""
+
+    if math.isnan(value) or math.isinf(value):
+        return encode_double(value)
+
+    packed = struct.pack("<f", value)
+    for precision in range(6, 10):
+        shortest = float(f"{value:.{precision}g}")
+        if struct.pack("<f", shortest) == packed:
+            return repr(shortest)
+
+    return repr(value)
+
+
+def is_repeated_field(field: FieldDescriptor) -> bool:
+    """Check whether a field is repeated."""
+
+    # label is deprecated and removed in newer protobuf releases
+    if hasattr(field, "is_repeated"):
+        return field.is_repeated
+
+    return field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def get_scalar_encoder(
+    field: FieldDescriptor, options: Options, divisor: int | None
+) -> Callable[[Any], str]:
+    """Get the encoder of a scalar field."""
+
+    field_type = field.type
+    is_integer = field.cpp_type in (
+        FieldDescriptor.CPPTYPE_INT32,
+        FieldDescriptor.CPPTYPE_INT64,
+        FieldDescriptor.CPPTYPE_UINT32,
+        FieldDescriptor.CPPTYPE_UINT64,
+    )
+
+    if is_integer and options.scaled and divisor is not None:
+        return lambda value: repr(value / divisor)
+
+    if (
+        is_integer
+        and options.hex_serial_numbers
+        and SERIAL_NUMBER_PATTERN.search(field.name)
+    ):
+        return encode_serial_number
+
+    if field_type in INT64_TYPES:
+        return encode_int64
+    if is_integer:
+        return str
+    if field_type == FieldDescriptor.TYPE_STRING:
+        return encode_ascii_string if options.ensure_ascii else encode_string
+    if field_type == FieldDescriptor.TYPE_BYTES:
+        return encode_bytes
+    if field_type == FieldDescriptor.TYPE_BOOL:
+        return encode_bool
+    if field_type == FieldDescriptor.TYPE_FLOAT:
+        return encode_float
+    if field_type == FieldDescriptor.TYPE_DOUBLE:
+        return encode_double
+
+    names = {value.number: value.name for value in field.enum_type.values}
+    return lambda value: f'"{names[value]}"' if value in names else str(value)
+
+
+def compile_field(
+    field: FieldDescriptor, options: Options, divisors: dict[str, int]
+) -> CompiledField:
+    """Compile the key and value encoder of a field."""
+
+    name = field.name if options.preserving_proto_field_name else field.json_name
+    key = encode_ascii_string(name) + options.colon
+    is_repeated = is_repeated_field(field)
+    message_type = field.message_type
+
+    if message_type is None:
+        encode = get_scalar_encoder(field, options, divisors.get(field.name))
+        kind = KIND_REPEATED_SCALAR if is_repeated else KIND_SCALAR
+        return CompiledField(key, kind, encode, None)
+
+    if message_type.GetOptions().map_entry:
+        value_field = message_type.fields_by_name["value"]
+        return CompiledField(
+            key, KIND_MAP, None, compile_field(value_field, options, {})
+        )
+
+    if message_type.full_name.startswith("google.protobuf."):
+        return CompiledField(key, KIND_WELL_KNOWN, None, None)
+
+    kind = KIND_REPEATED_MESSAGE if is_repeated else KIND_MESSAGE
+    return CompiledField(key, kind, None, None)
+
+
+def get_compiled_fields(
+    descriptor: Descriptor, options: Options
+) -> dict[FieldDescriptor, CompiledField]:
+    """Get the compiled fields of a message type, compiling them once."""
+
+    fields = _compiled.get((descriptor, options))
+
+    if fields is None:
+        divisors = FIELD_DIVISORS.get(descriptor.full_name, {})
+        fields = {
+            field: compile_field(field, options, divisors)
+            for field in descriptor.fields
+        }
+        _compiled[(descriptor, options)] = fields
+
+    return fields
+
+
+class _JsonWriter:
+    """Write the JSON of messages to a stream in buffered fragments."""
+
+    __slots__ = ("indent", "newline", "options", "parts", "step", "stream")
+
+    def __init__(self, stream: TextIO, options: Options, indent: int | None):
+        """Initialize _JsonWriter class."""
+
+        self.stream: TextIO = stream
+        self.options: Options = options
+        self.indent: int | None = indent
+        self.newline: str = "" if indent is None else "\n"
+        self.step: str = "" if indent is None else " " * indent
+        self.parts: list[str] = []
+
+    def flush(self) -> None:
+        """Write the buffered fragments to the stream."""
+
+        self.stream.write("".join(self.parts))
+        self.parts.clear()
+
+    def write_message(self, message: Message, newline: str) -> None:
+        """Write the JSON of a message, newline is its indentation."""
+
+        parts = self.parts
+
+        items = message.ListFields()
+        if not items:
+            parts.append("{}")
+            return
+
+        fields = get_compiled_fields(message.DESCRIPTOR, self.options)
+        inner = newline + self.step
+
+        parts.append("{" + inner)
+
+        for index, (field, value) in enumerate(items):
+            if index:
+                parts.append("," + inner)
+
+            compiled = fields[field]
+            parts.append(compiled.key)
+
+            if compiled.kind == KIND_MAP:
+                self.write_map(compiled.map_value, value, inner)
+            elif compiled.kind == KIND_REPEATED_SCALAR:
+                self.write_repeated_scalar(compiled, value, inner)
+            elif compiled.kind == KIND_REPEATED_MESSAGE:
+                self.write_repeated_message(value, inner)
+            else:
+                self.write_value(compiled, value, inner)
+
+        parts.append(newline + "}")
+
+        if len(parts) >= SERIALIZER_BUFFER_PARTS:
+            self.flush()
+
+    def write_value(self, compiled: CompiledField, value: Any, newline: str) -> None:
+        """Write the JSON of a single (not repeated) value."""
+
+        if compiled.kind == KIND_SCALAR:
+            self.parts.append(compiled.encode(value))
+        elif compiled.kind == KIND_MESSAGE:
+            self.write_message(value, newline)
+        else:
+            text = json.dumps(
+                json_format.MessageToDict(
+                    value,
+                    preserving_proto_field_name=self.options.preserving_proto_field_name,
+                ),
+                indent=self.indent,
+                separators=(",", self.options.colon),
+                ensure_ascii=self.options.ensure_ascii,
+            )
+            # Indent the nested lines like the enclosing message
+            self.parts.append(text.replace("\n", newline) if newline else text)
+
+    def write_map(self, compiled: CompiledField, value: Any, newline: str) -> None:
+        """Write the JSON of a map, compiled is the field of its values."""
+
+        parts = self.parts
+        item_newline = newline + self.step
+
+        parts.append("{" + item_newline)
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                parts.append("," + item_newline)
+            key = encode_bool(key) if isinstance(key, bool) else key
+            parts.append(encode_ascii_string(str(key)) + self.options.colon)
+            self.write_value(compiled, item, item_newline)
+        parts.append(newline + "}")
+
+    def write_repeated_scalar(
+        self, compiled: CompiledField, value: Any, newline: str
+    ) -> None:
+        """Write the JSON of a repeated scalar field."""
+
+        item_newline = newline + self.step
+
+        self.parts.append("[" + item_newline)
+        self.parts.append(("," + item_newline).join(map(compiled.encode, value)))
+        self.parts.append(newline + "]")
+
+    def write_repeated_message(self, value: Any, newline: str) -> None:
+        """Write the JSON of a repeated message field."""
+
+        parts = self.parts
+        item_newline = newline + self.step
+
+        parts.append("[" + item_newline)
+        for index, item in enumerate(value):
+            if index:
+                parts.append("," + item_newline)
+            self.write_message(item, item_newline)
+        parts.append(newline + "]")
+
+
+def write_json(
+    message: Message,
+    stream: TextIO,
+    *,
+    indent: int | None = 2,
+    scaled: bool = False,
+    hex_serial_numbers: bool = False,
+    preserving_proto_field_name: bool = False,
+    ensure_ascii: bool = True,
+) -> None:
+    """Write a message as JSON to a stream.
+
+    The output is the same as json_format.MessageToJson with the same
+    indent, without indent it is compact. scaled converts real data values
+    to their units (e.g. volts instead of decivolts) and hex_serial_numbers
+    writes integer serial numbers as hex strings like the app shows them.
+    Large messages are written in parts while they are serialized.
+    """
+
+    if message.DESCRIPTOR.full_name.startswith("google.protobuf."):
+        stream.write(
+            json_format.MessageToJson(
+                message,
+                preserving_proto_field_name=preserving_proto_field_name,
+                indent=indent,
+                ensure_ascii=ensure_ascii,
+            )
+        )
+        return
+
+    options = Options(
+        scaled,
+        hex_serial_numbers,
+        preserving_proto_field_name,
+        ensure_ascii,
+        ":" if indent is None else ": ",
+    )
+
+    writer = _JsonWriter(stream, options, indent)
+    writer.write_message(message, writer.newline)
+    writer.flush()
+
+
+def message_to_json(message: Message, **kwargs: Any) -> str:
+    """Convert a message to JSON, see write_json for the arguments."""
+
+    stream = io.StringIO()
+    write_json(message, stream, **kwargs)
+    return stream.getvalue()
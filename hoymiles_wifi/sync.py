@@ -0,0 +1,155 @@
+"""Synchronous access to DTUs from regular threads."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from collections.abc import Coroutine
+from typing import Any
+
+from hoymiles_wifi.dtu import DTU
+
+_default_loop_thread: EventLoopThread | None = None
+_default_loop_thread_lock = threading.Lock()
+
+
+class EventLoopThread:
+    """Event loop running in a background daemon thread.
+
+    Coroutines can be submitted from any thread. All DTUs used through the
+    same loop thread share their pacing, timeout and circuit state across
+    calls.
+    """
+
+    def __init__(self, name: str = "hoymiles-wifi"):
+        """Initialize EventLoopThread class."""
+
+        self.name: str = name
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the event loop thread if it is not running."""
+
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+
+            started = threading.Event()
+            self.loop = asyncio.new_event_loop()
+
+            def run_loop() -> None:
+                asyncio.set_event_loop(self.loop)
+                self.loop.call_soon(started.set)
+                self.loop.run_forever()
+
+            self.thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            self.thread.start()
+            started.wait()
+
+    def stop(self) -> None:
+        """Cancel the pending tasks and stop the event loop thread."""
+
+        with self._lock:
+            if self.loop is None or self.thread is None:
+                return
+
+            asyncio.run_coroutine_threadsafe(_async_cancel_tasks(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
+
+    def run(self, coroutine: Coroutine, timeout: float | None = None) -> Any:
+        """Run a coroutine on the loop and wait for its result.
+
+        If timeout expires the coroutine is cancelled, so it does not keep
+        the DTU busy, and TimeoutError is raised.
+        """
+
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError("Cannot block the event loop thread on itself")
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+async def _async_cancel_tasks() -> None:
+    """Cancel and wait for all other tasks of the running loop."""
+
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_default_loop_thread() -> EventLoopThread:
+    """Get the event loop thread shared by all synchronous DTUs."""
+
+    global _default_loop_thread  # noqa: PLW0603
+
+    with _default_loop_thread_lock:
+        if _default_loop_thread is None:
+            _default_loop_thread = EventLoopThread()
+            _default_loop_thread.start()
+
+    return _default_loop_thread
+
+
+class SyncDTU:
+    """Synchronous, thread safe wrapper around DTU.
+
+    Every coroutine method async_<name> of DTU is available as a blocking
+    method <name>, e.g. get_real_data_new() or set_power_limit(50). Calls
+    from several threads are executed on one shared event loop and are
+    served in the priority order of the underlying DTU.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        *args: Any,
+        loop_thread: EventLoopThread | None = None,
+        **kwargs: Any,
+    ):
+        """Initialize SyncDTU class, arguments are passed on to DTU."""
+
+        self.loop_thread: EventLoopThread = (
+            loop_thread if loop_thread is not None else get_default_loop_thread()
+        )
+        self.dtu: DTU = DTU(host, *args, **kwargs)
+
+    def call(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        """Call the coroutine method async_<name> of the DTU and wait for it."""
+
+        method = getattr(self.dtu, f"async_{name}", None)
+        if method is None or not asyncio.iscoroutinefunction(method):
+            raise AttributeError(f"DTU has no method async_{name}")
+
+        return self.loop_thread.run(method(*args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        """Expose the coroutine methods of the DTU as blocking methods."""
+
+        if name.startswith("_") or not asyncio.iscoroutinefunction(
+            getattr(DTU, f"async_{name}", None)
+        ):
+            raise AttributeError(name)
+
+        def method(*args: Any, **kwargs: Any) -> Any:
+            return self.call(name, *args, **kwargs)
+
+        method.__name__ = name
+        return method
@@ -0,0 +1,242 @@
+"""Bounded in-memory time series of real data fields."""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import TIMESERIES_CAPACITY, TIMESERIES_MAX_SERIES_PER_DTU
+from hoymiles_wifi.delta import SeriesKey
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.real_data import iter_real_data_points
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "hoymiles_wifi.timeseries requires numpy, install hoymiles-wifi[analytics]"
+    ) from e
+
+
+class RingSeries:
+    """Fixed size ring buffer of timestamps and values.
+
+    Timestamps are wall clock times, which step back when the clock is
+    adjusted. Until such a sample is overwritten, range queries compare
+    every timestamp instead of using a binary search.
+    """
+
+    def __init__(self, capacity: int):
+        """Initialize RingSeries class."""
+
+        self.capacity: int = capacity
+        self.timestamps: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.values: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.head: int = 0
+        self.size: int = 0
+        # Samples appended since the timestamps last went back
+        self.ordered_samples: int = 0
+
+    def __len__(self) -> int:
+        """Return the number of stored samples."""
+
+        return self.size
+
+    def append(self, timestamp: float, value: float) -> None:
+        """Append a sample, overwriting the oldest one if full."""
+
+        if self.size and timestamp < self.timestamps[self.head - 1]:
+            self.ordered_samples = 0
+        self.ordered_samples += 1
+
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def get_range(
+        self, start: float | None = None, end: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the samples in [start, end) in time order."""
+
+        if self.size < self.capacity:
+            timestamps = self.timestamps[: self.size]
+            values = self.values[: self.size]
+        else:
+            timestamps = np.concatenate(
+                (self.timestamps[self.head :], self.timestamps[: self.head])
+            )
+            values = np.concatenate(
+                (self.values[self.head :], self.values[: self.head])
+            )
+
+        if self.ordered_samples < self.size:
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps < end
+            return timestamps[mask], values[mask]
+
+        first = 0 if start is None else np.searchsorted(timestamps, start, "left")
+        last = (
+            len(timestamps) if end is None else np.searchsorted(timestamps, end, "left")
+        )
+
+        return timestamps[first:last], values[first:last]
+
+
+def lttb(
+    timestamps: np.ndarray, values: np.ndarray, threshold: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Downsample to threshold points with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point and from every bucket in between the
+    point forming the largest triangle with the previously selected point
+    and the average of the next bucket, which preserves peaks and dips.
+    """
+
+    length = len(timestamps)
+    if threshold >= length or threshold < 3:
+        return timestamps, values
+
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        first, last = edges[bucket], edges[bucket + 1]
+        next_first = last
+        next_last = edges[bucket + 2] if bucket + 2 < len(edges) else length
+
+        average_x = timestamps[next_first:next_last].mean()
+        average_y = values[next_first:next_last].mean()
+
+        x = timestamps[first:last]
+        y = values[first:last]
+        areas = np.abs(
+            (timestamps[previous] - average_x) * (y - values[previous])
+            - (timestamps[previous] - x) * (average_y - values[previous])
+        )
+
+        previous = first + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return timestamps[selected], values[selected]
+
+
+class TimeSeriesStore:
+    """Recent history of every device and PV port field in ring buffers.
+
+    Memory is preallocated per series (capacity samples of timestamp and
+    value) and every DTU stores at most max_series_per_dtu series, so the
+    store grows with the fleet by at most max_series_per_dtu * capacity * 16
+    bytes per DTU. Series beyond the limit are dropped with a warning. fields
+    limits the stored field names, all fields are stored by default.
+    """
+
+    def __init__(
+        self,
+        capacity: int = TIMESERIES_CAPACITY,
+        fields: set[str] | None = None,
+        max_series_per_dtu: int = TIMESERIES_MAX_SERIES_PER_DTU,
+    ):
+        """Initialize TimeSeriesStore class."""
+
+        self.capacity: int = capacity
+        self.fields: set[str] | None = fields
+        self.max_series_per_dtu: int = max_series_per_dtu
+        self.series: dict[SeriesKey, RingSeries] = {}
+        # DTU serial number -> number of stored series
+        self.dtu_series: dict[str, int] = {}
+        self.dropped: set[SeriesKey] = set()
+
+    def add(
+        self,
+        real_data: RealDataNew_pb2.RealDataNewReqDTO,
+        timestamp: float | None = None,
+    ) -> None:
+        """Append the values of a snapshot taken at timestamp (default now)."""
+
+        timestamp = timestamp if timestamp is not None else time.time()
+        dtu_serial_number = real_data.device_serial_number
+
+        for point in iter_real_data_points(real_data):
+            if self.fields is not None and point.field not in self.fields:
+                continue
+
+            key: SeriesKey = (
+                point.kind,
+                point.serial_number,
+                point.port,
+                point.field,
+            )
+            series = self.series.get(key)
+
+            if series is None:
+                series = self._create_series(dtu_serial_number, key)
+                if series is None:
+                    continue
+
+            series.append(timestamp, point.value)
+
+    def _create_series(
+        self, dtu_serial_number: str, key: SeriesKey
+    ) -> RingSeries | None:
+        """Create a series of a DTU, None if the DTU has too many series."""
+
+        count = self.dtu_series.get(dtu_serial_number, 0)
+
+        if count >= self.max_series_per_dtu:
+            if key not in self.dropped:
+                logger.warning(
+                    f"Dropping series {key}, DTU {dtu_serial_number} has {count} series"
+                )
+                self.dropped.add(key)
+            return None
+
+        self.dtu_series[dtu_serial_number] = count + 1
+        series = RingSeries(self.capacity)
+        self.series[key] = series
+
+        return series
+
+    def on_data(self, dtu: Any, real_data: RealDataNew_pb2.RealDataNewReqDTO) -> None:
+        """Append a snapshot, usable as on_data callback of PollScheduler."""
+
+        self.add(real_data)
+
+    def query(
+        self,
+        key: SeriesKey,
+        start: float | None = None,
+        end: float | None = None,
+        max_points: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """Get the samples of a series in [start, end).
+
+        With max_points the result is downsampled using LTTB. Returns None
+        for unknown series.
+        """
+
+        series = self.series.get(key)
+        if series is None:
+            return None
+
+        timestamps, values = series.get_range(start, end)
+
+        if max_points is not None:
+            return lttb(timestamps, values, max_points)
+
+        return timestamps, values
+
+    def get_memory_size(self) -> int:
+        """Get the number of bytes allocated for samples."""
+
+        return sum(
+            series.timestamps.nbytes + series.values.nbytes
+            for series in self.series.values()
+        )
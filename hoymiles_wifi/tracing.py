@@ -0,0 +1,112 @@
+"""Structured tracing of DTU exchanges."""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+from hoymiles_wifi.const import TRACE_BUFFER_SIZE
+
+trace_logger = logging.getLogger("hoymiles_wifi.trace")
+
+
+class TracedFrame(NamedTuple):
+    """Frame kept for a hex dump."""
+
+    timestamp: float
+    label: str
+    seq: int
+    data: bytes | memoryview
+
+
+def is_enabled() -> bool:
+    """Check whether tracing is enabled.
+
+    Tracing is enabled by setting the hoymiles_wifi.trace logger (or one of
+    its parents) to DEBUG. Callers check this before building an event so
+    nothing is formatted while tracing is disabled.
+    """
+
+    return trace_logger.isEnabledFor(logging.DEBUG)
+
+
+def trace_event(event: str, **fields: Any) -> None:
+    """Emit a structured event.
+
+    The event name and fields are attached to the log record as trace_event
+    and trace_fields for handlers that process them as data.
+    """
+
+    trace_logger.debug(
+        "%s %s",
+        event,
+        fields,
+        extra={"trace_event": event, "trace_fields": fields},
+    )
+
+
+class Tracer:
+    """Emit events and keep the latest frames of a DTU for hex dumps.
+
+    The latest frames are always kept, so they can be dumped as hex when an
+    error happens instead of logging every frame. Dumps are only logged
+    while tracing is enabled.
+    """
+
+    def __init__(self, name: str, size: int = TRACE_BUFFER_SIZE):
+        """Initialize Tracer class."""
+
+        self.name: str = name
+        self.frames: deque[TracedFrame] = deque(maxlen=size)
+
+    def event(self, event: str, **fields: Any) -> None:
+        """Emit a structured event of this DTU."""
+
+        if is_enabled():
+            trace_event(event, host=self.name, **fields)
+
+    @property
+    def is_enabled(self) -> bool:
+        """Check whether tracing is enabled."""
+
+        return is_enabled()
+
+    def frame(self, label: str, seq: int, data: bytes | memoryview) -> None:
+        """Keep a frame for the next dump.
+
+        data is only copied while tracing is enabled, otherwise a reference
+        is kept, so raw responses stay zero-copy. The buffer of data must
+        not be modified afterwards.
+        """
+
+        self.frames.append(
+            TracedFrame(
+                time.time(), label, seq, bytes(data) if self.is_enabled else data
+            )
+        )
+
+    def dump(self, reason: str) -> None:
+        """Log the kept frames as hex and clear them."""
+
+        if not self.frames or not is_enabled():
+            return
+
+        trace_logger.debug(
+            "%s: dumping %d frames after error: %s",
+            self.name,
+            len(self.frames),
+            reason,
+        )
+        for frame in self.frames:
+            trace_logger.debug(
+                "%s: %.3f %s seq=%d %s",
+                self.name,
+                frame.timestamp,
+                frame.label,
+                frame.seq,
+                frame.data.hex(),
+            )
+
+        self.frames.clear()
@@ -0,0 +1,295 @@
+"""Low-overhead asyncio Protocol transport for DTU frames."""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+from typing import Any
+
+from crcmod import mkCrcFun
+
+from hoymiles_wifi import logger
+from hoymiles_wifi.const import CMD_HEADER
+from hoymiles_wifi.crypt_util import crypt_data
+from hoymiles_wifi.registry import (
+    RESPONSE_TAGS,
+    CommandInfo,
+    get_command_info,
+    is_encrypted_tag,
+)
+
+# Frame header: magic, tag, sequence, crc16, length
+FRAME_HEADER = struct.Struct(">2sHHHH")
+
+crc16_modbus = mkCrcFun(0x18005, rev=True, initCrc=0xFFFF, xorOut=0x0000)
+
+
+def is_encrypted_frame(tag: int, is_encrypted: bool, is_extended_format: bool) -> bool:
+    """Check if the payload of a frame is encrypted.
+
+    Extended frames are never encrypted, the registry tells which tags are.
+    """
+
+    return is_encrypted and not is_extended_format and is_encrypted_tag(tag)
+
+
+def get_frame_length(
+    tag: int, length: int, is_encrypted: bool, is_extended_format: bool
+) -> int:
+    """Get the size of a frame from the tag and length of its header.
+
+    The length field of encrypted frames does not count the 16 bytes of
+    padding added by the cipher.
+    """
+
+    if is_encrypted_frame(tag, is_encrypted, is_extended_format):
+        return length + 16
+
+    return length
+
+
+def unpack_frame(
+    buffer: bytes,
+    is_encrypted: bool,
+    enc_rand: bytes,
+    is_extended_format: bool,
+) -> tuple[int, int, bytes]:
+    """Validate a frame received from a DTU and return tag, sequence and payload.
+
+    Encrypted payloads are decrypted. Raises ValueError if the frame is
+    incomplete or corrupt.
+    """
+
+    if len(buffer) < 10:
+        raise ValueError("Buffer is too short for unpacking")
+
+    u16_tag, u16_seq = struct.unpack(">HH", buffer[2:6])
+
+    crc16_target, read_length = struct.unpack(">HH", buffer[6:10])
+
+    expected_length = get_frame_length(
+        u16_tag, read_length, is_encrypted, is_extended_format
+    )
+
+    if len(buffer) != expected_length:
+        raise ValueError(
+            f"Buffer is incomplete (expected {expected_length}, got {len(buffer)})"
+        )
+
+    if is_extended_format:
+        crc16_response = crc16_modbus(buffer[24:read_length])
+    else:
+        crc16_response = crc16_modbus(buffer[10:read_length])
+
+    if crc16_response != crc16_target:
+        logger.error(f"CRC16 mismatch: {hex(crc16_response)} != {hex(crc16_target)}")
+        raise ValueError("CRC16 mismatch")
+
+    if is_extended_format:
+        return u16_tag, u16_seq, buffer[24:read_length]
+
+    if is_encrypted_frame(u16_tag, is_encrypted, is_extended_format):
+        ciphertext = buffer[10:expected_length]
+        return (
+            u16_tag,
+            u16_seq,
+            crypt_data(False, enc_rand, u16_tag, u16_seq, ciphertext),
+        )
+
+    return u16_tag, u16_seq, buffer[10:read_length]
+
+
+def decode_frame(
+    buffer: bytes,
+    is_encrypted: bool = False,
+    enc_rand: bytes = b"",
+    variant: int = 0,
+) -> tuple[CommandInfo, Any]:
+    """Validate, decrypt and parse a request or response frame of any command.
+
+    variant selects the command of a tag shared by several commands. Raises
+    ValueError for unknown tags and corrupt frames.
+    """
+
+    if len(buffer) < 4:
+        raise ValueError("Buffer is too short for unpacking")
+
+    tag = struct.unpack(">H", buffer[2:4])[0]
+    result = get_command_info(tag, variant)
+    if result is None:
+        raise ValueError(f"Unknown tag {hex(tag)}")
+
+    info, is_response = result
+    _, _, payload = unpack_frame(
+        buffer, is_encrypted, enc_rand, info.is_extended_format
+    )
+    message_type = info.response_type if is_response else info.request_type
+
+    return info, message_type.FromString(payload)
+
+
+class PendingRequest:
+    """Request waiting for its response frame."""
+
+    __slots__ = ("future", "is_extended_format")
+
+    def __init__(self, future: asyncio.Future, is_extended_format: bool):
+        """Initialize PendingRequest class."""
+
+        self.future: asyncio.Future = future
+        self.is_extended_format: bool = is_extended_format
+
+
+class FrameProtocol(asyncio.Protocol):
+    """Send request frames and match complete response frames by sequence.
+
+    Received data is assembled into frames using the length in their
+    header, each frame resolves the future of the request with the same
+    sequence number. On a connection used for a single exchange, a frame
+    with an unknown sequence is taken as the response of the pending
+    request, as the streams path did. Pipelined connections discard such
+    frames, they may be late responses to requests that already timed out.
+    Pending requests fail with ConnectionError when the connection is lost.
+    """
+
+    def __init__(self, is_encrypted: bool = False, is_pipelined: bool = False):
+        """Initialize FrameProtocol class."""
+
+        self.is_encrypted: bool = is_encrypted
+        self.is_pipelined: bool = is_pipelined
+        self.transport: asyncio.Transport | None = None
+        self.buffer: bytearray = bytearray()
+        self.pending: dict[int, PendingRequest] = {}
+        self.bytes_sent: int = 0
+        self.bytes_received: int = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Keep the transport, asyncio already disables Nagle's algorithm."""
+
+        self.transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        """Assemble frames and resolve the requests they answer."""
+
+        self.bytes_received += len(data)
+        buffer = self.buffer
+        buffer += data
+
+        while len(buffer) >= FRAME_HEADER.size:
+            magic, tag, seq, _, length = FRAME_HEADER.unpack_from(buffer)
+
+            if magic != CMD_HEADER or length < FRAME_HEADER.size:
+                # Skip to the next frame header
+                index = buffer.find(CMD_HEADER, 1)
+                logger.debug(f"Discarding {index if index > 0 else len(buffer)} bytes")
+                del buffer[: index if index > 0 else len(buffer)]
+                continue
+
+            request = self.pending.get(seq)
+            if request is None and not self.is_pipelined and len(self.pending) == 1:
+                request = next(iter(self.pending.values()))
+
+            # The framing of known tags does not depend on the request, so
+            # frames with an unknown sequence are skipped by their length
+            commands = RESPONSE_TAGS.get(tag)
+            if commands is not None:
+                is_extended_format = commands[0].is_extended_format
+            else:
+                is_extended_format = request is not None and request.is_extended_format
+
+            frame_length = get_frame_length(
+                tag, length, self.is_encrypted, is_extended_format
+            )
+            if len(buffer) < frame_length:
+                return
+
+            frame = bytes(buffer[:frame_length])
+            del buffer[:frame_length]
+
+            if request is None:
+                logger.debug(f"Discarding response with unknown sequence {seq}")
+                continue
+
+            if request is not self.pending.get(seq):
+                logger.debug(f"Unexpected sequence {seq}, using the pending request")
+
+            if not request.future.done():
+                request.future.set_result(frame)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        """Fail the pending requests."""
+
+        for request in self.pending.values():
+            if not request.future.done():
+                request.future.set_exception(
+                    exc if exc is not None else ConnectionError("Connection closed")
+                )
+
+    def send_request(
+        self, message: bytes, is_extended_format: bool = False
+    ) -> asyncio.Future:
+        """Send a request frame and return the future of its response frame.
+
+        Several requests may be in flight at once. Cancelling the future
+        stops waiting for the response. Raises ConnectionError if the
+        connection is closed.
+        """
+
+        if self.is_closing():
+            raise ConnectionError("Connection closed")
+
+        seq = struct.unpack_from(">H", message, 4)[0]
+        request = PendingRequest(
+            asyncio.get_running_loop().create_future(), is_extended_format
+        )
+        self.pending[seq] = request
+
+        def on_done(_: asyncio.Future) -> None:
+            if self.pending.get(seq) is request:
+                del self.pending[seq]
+
+        request.future.add_done_callback(on_done)
+
+        self.transport.write(message)
+        self.bytes_sent += len(message)
+        return request.future
+
+    async def async_request(
+        self, message: bytes, is_extended_format: bool = False
+    ) -> bytes:
+        """Send a request frame and wait for the response frame.
+
+        Raises ConnectionError if the connection is closed before.
+        """
+
+        return await self.send_request(message, is_extended_format)
+
+    def is_closing(self) -> bool:
+        """Check if the connection is closed or being closed."""
+
+        return self.transport is None or self.transport.is_closing()
+
+    def close(self) -> None:
+        """Close the connection."""
+
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def async_open_frame_connection(
+    host: str,
+    port: int,
+    local_addr: tuple[str, int] | None = None,
+    is_encrypted: bool = False,
+    is_pipelined: bool = False,
+) -> FrameProtocol:
+    """Open a connection to a DTU using FrameProtocol."""
+
+    _, protocol = await asyncio.get_running_loop().create_connection(
+        lambda: FrameProtocol(is_encrypted, is_pipelined),
+        host=host,
+        port=port,
+        local_addr=local_addr,
+    )
+
+    return protocol
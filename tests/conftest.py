@@ -0,0 +1,69 @@
+"""Helpers shared by the tests."""
+
+import struct
+
+from hoymiles_wifi.const import CMD_HB_RES_DTO
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2, RealDataNew_pb2
+from hoymiles_wifi.registry import HEARTBEAT
+from hoymiles_wifi.transport import crc16_modbus
+
+DTU_SERIAL_NUMBER = "4143A0000000"
+
+
+class FakeTransport:
+    """Transport that records written frames."""
+
+    def __init__(self):
+        """Initialize FakeTransport class."""
+
+        self.written = []
+
+    def write(self, data):
+        """Record data."""
+
+        self.written.append(data)
+
+    def is_closing(self):
+        """Stay open."""
+
+        return False
+
+
+def create_frame(tag, seq, payload, encrypted_length=None):
+    """Create a wire frame, encrypted_length is the length of the plain payload."""
+
+    length = len(payload) if encrypted_length is None else encrypted_length
+    return (
+        b"HM"
+        + struct.pack(">HHHH", tag, seq, crc16_modbus(payload[:length]), length + 10)
+        + payload
+    )
+
+
+def create_response(seq, offset=0):
+    """Create a heartbeat response frame carrying offset."""
+
+    payload = APPHeartbeatPB_pb2.HBReqDTO(
+        dtu_serial_number=DTU_SERIAL_NUMBER, offset=offset
+    ).SerializeToString()
+
+    return create_frame(int.from_bytes(CMD_HB_RES_DTO, "big"), seq, payload)
+
+
+def create_real_data(power=0, *, dtu_serial_number=DTU_SERIAL_NUMBER, **fields):
+    """Create a snapshot of a DTU without inverters."""
+
+    return RealDataNew_pb2.RealDataNewReqDTO(
+        device_serial_number=dtu_serial_number, dtu_power=power, **fields
+    )
+
+
+async def async_heartbeat(dtu, port):
+    """Send a heartbeat to the DTU listening on port."""
+
+    return await dtu.async_send_request(
+        HEARTBEAT.command,
+        APPHeartbeatPB_pb2.HBResDTO(),
+        HEARTBEAT.response_type,
+        dtu_port=port,
+    )
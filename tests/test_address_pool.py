@@ -0,0 +1,103 @@
+"""Tests for the local address pool."""
+
+import asyncio
+import socket
+
+import pytest
+
+from hoymiles_wifi.address_pool import InterfaceStats, LocalAddressPool
+from hoymiles_wifi.fleet import FleetHost
+
+
+def test_subnet_addresses_serve_their_subnet():
+    """DTUs in a subnet of an address are assigned to it, the most specific wins."""
+
+    pool = LocalAddressPool(["10.0.0.5/16", "10.0.1.5/24", "192.168.1.5"])
+
+    assert pool.assign("10.0.1.20") == "10.0.1.5"
+    assert pool.assign("10.0.2.20") == "10.0.0.5"
+    assert pool.assign("172.16.0.1") == "192.168.1.5"
+    assert pool.assign("dtu.local") == "192.168.1.5"
+
+
+def test_round_robin_without_subnet():
+    """Other DTUs are spread round robin and keep their address."""
+
+    pool = LocalAddressPool(["10.0.0.5", "10.0.0.6", "10.0.1.5/24"])
+    hosts = [f"192.168.1.{index}" for index in range(4)]
+
+    addresses = [pool.assign(host) for host in hosts]
+
+    assert addresses == ["10.0.0.5", "10.0.0.6", "10.0.0.5", "10.0.0.6"]
+    assert [pool.assign(host) for host in reversed(hosts)] == addresses[::-1]
+    assert pool.assign("10.0.1.20") == "10.0.1.5"
+
+
+def test_round_robin_over_subnet_addresses():
+    """Without addresses lacking a prefix, every address serves other DTUs."""
+
+    pool = LocalAddressPool(["10.0.0.5/24", "10.0.1.5/24"])
+
+    assert pool.assign("192.168.1.1") == "10.0.0.5"
+    assert pool.assign("192.168.1.2") == "10.0.1.5"
+
+
+@pytest.mark.parametrize("addresses", [[], ["not an address"]])
+def test_invalid_pool(addresses):
+    """Empty pools and invalid addresses are rejected."""
+
+    with pytest.raises(ValueError):
+        LocalAddressPool(addresses)
+
+
+def test_interface_stats_counters():
+    """Exchanges are counted with their bytes, failures and peak concurrency."""
+
+    stats = InterfaceStats("10.0.0.5")
+
+    stats.open()
+    stats.open()
+    stats.close(10, 100, True)
+    stats.close(10, 0, False)
+
+    assert stats.active == 0
+    assert stats.peak_active == 2
+    assert stats.requests == 2
+    assert stats.failures == 1
+    assert stats.bytes_sent == 20
+    assert stats.bytes_received == 100
+    assert stats.get_throughput() > 0
+
+
+def test_exchanges_are_counted_per_address():
+    """DTUs created from a pool count their exchanges on their address."""
+
+    pool = LocalAddressPool(["127.0.0.1"])
+
+    async def async_run():
+        async def async_handle(reader, writer):
+            writer.write(await reader.read(1024) * 2)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0)
+        async with server:
+            dtu = FleetHost("127.0.0.1").create_dtu(pool)
+            port = server.sockets[0].getsockname()[1]
+            await dtu._async_exchange(b"request", port, 0)
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_port = sock.getsockname()[1]
+        with pytest.raises(OSError):
+            await dtu._async_exchange(b"request", closed_port, 0)
+
+    asyncio.run(async_run())
+
+    stats = pool.get_stats("127.0.0.1")
+    assert stats.requests == 2
+    assert stats.failures == 1
+    assert stats.bytes_sent == 7
+    assert stats.bytes_received == 14
+    assert stats.active == 0
+    assert pool.get_stats("10.0.0.5") is None
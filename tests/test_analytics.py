@@ -0,0 +1,61 @@
+"""Tests for the historical power analytics."""
+
+import numpy as np
+
+from hoymiles_wifi.analytics import PowerSeries, get_energy, resample
+
+
+def create_series(start, power, step=300):
+    """Create a series of consecutive samples."""
+
+    power = np.asarray(power, dtype=np.float64)
+    timestamps = start + step * np.arange(len(power), dtype=np.int64)
+
+    return PowerSeries(timestamps, power, step)
+
+
+def test_upsample_starts_missing():
+    """Steps before the first sample are missing, not the first value."""
+
+    series = create_series(1100, [100, 400])
+
+    resampled = resample(series, 200)
+
+    np.testing.assert_array_equal(resampled.timestamps, [1000, 1200, 1400])
+    assert np.isnan(resampled.power[0])
+    np.testing.assert_allclose(resampled.power[1:], [200, 400])
+
+
+def test_upsample_aligned_series():
+    """A series starting on a step boundary has no missing values."""
+
+    resampled = resample(create_series(1200, [100, 200]), 150)
+
+    np.testing.assert_array_equal(resampled.timestamps, [1200, 1350, 1500])
+    np.testing.assert_allclose(resampled.power, [100, 150, 200])
+
+
+def test_downsample_bins():
+    """Steps are aligned to multiples of the step and average their samples."""
+
+    series = create_series(1200, [100, 200, 300, 400, 500])
+    series.power[3] = np.nan
+    series.timestamps[4] += 1800
+
+    resampled = resample(series, 900)
+
+    np.testing.assert_array_equal(resampled.timestamps, [900, 1800, 2700, 3600])
+    np.testing.assert_allclose(resampled.power[:2], [150, 300])
+    assert np.isnan(resampled.power[2])
+    assert resampled.power[3] == 500
+
+
+def test_energy_windows():
+    """Energy is integrated per aligned window, empty windows are left out."""
+
+    series = create_series(3000, [600] * 4 + [np.nan] * 12 + [1200])
+
+    starts, totals = get_energy(series, 3600)
+
+    np.testing.assert_array_equal(starts, [0, 3600, 7200])
+    np.testing.assert_allclose(totals, [100, 100, 100])
@@ -0,0 +1,87 @@
+"""Tests for the frame capture log."""
+
+from conftest import create_frame
+
+from hoymiles_wifi.capture import (
+    FRAME_RESPONSE,
+    SEGMENT_SUFFIX,
+    CaptureReader,
+    FrameCapture,
+    replay,
+)
+from hoymiles_wifi.dtu import DTU, NetworkState
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2
+
+
+def test_reader_stops_at_torn_record(tmp_path):
+    """A record whose payload was not completely written is not returned."""
+
+    with FrameCapture(tmp_path) as capture:
+        capture.record("dtu", 0xA302, 1, FRAME_RESPONSE, b"first", timestamp=1.0)
+        capture.record("dtu", 0xA302, 2, FRAME_RESPONSE, b"second", timestamp=2.0)
+
+    segment = next(tmp_path.glob(f"*{SEGMENT_SUFFIX}"))
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    records = list(CaptureReader(tmp_path).iter_records())
+
+    assert [record.payload for record in records] == [b"first"]
+
+
+def test_other_files_are_ignored(tmp_path):
+    """Files that are not numbered segments are skipped."""
+
+    (tmp_path / f"backup{SEGMENT_SUFFIX}").write_bytes(b"not a segment")
+
+    with FrameCapture(tmp_path) as capture:
+        capture.record("dtu", 0xA302, 1, FRAME_RESPONSE, b"first", timestamp=1.0)
+
+    records = list(CaptureReader(tmp_path).iter_records())
+
+    assert [record.payload for record in records] == [b"first"]
+
+
+def test_clock_step_back_starts_a_segment(tmp_path):
+    """Records after the clock went back are found by time range."""
+
+    with FrameCapture(tmp_path) as capture:
+        for seq, timestamp in enumerate((100.0, 200.0, 150.0, 160.0)):
+            capture.record("dtu", 0xA302, seq, FRAME_RESPONSE, b"", timestamp=timestamp)
+
+    reader = CaptureReader(tmp_path)
+    records = list(reader.iter_records(start=140.0, end=170.0))
+
+    assert len(reader.get_segments()) == 2
+    assert [record.seq for record in records] == [2, 3]
+
+
+def test_replay_does_not_touch_the_dtu(tmp_path):
+    """Replaying parses frames without changing or recording on the DTU."""
+
+    message = APPHeartbeatPB_pb2.HBReqDTO(dtu_serial_number="4143A0000000")
+    with FrameCapture(tmp_path) as capture:
+        capture.record(
+            "dtu",
+            0xA302,
+            1,
+            FRAME_RESPONSE,
+            create_frame(0xA302, 1, message.SerializeToString()),
+            type_name=message.DESCRIPTOR.full_name,
+        )
+        capture.record(
+            "dtu",
+            0xA302,
+            2,
+            FRAME_RESPONSE,
+            b"garbage",
+            type_name=message.DESCRIPTOR.full_name,
+        )
+
+    with FrameCapture(tmp_path / "live") as live_capture:
+        dtu = DTU("127.0.0.1", capture=live_capture)
+        results = list(replay(CaptureReader(tmp_path), dtu))
+
+    assert results[0][1] == message
+    assert results[1][1] is None
+    assert dtu.get_state() == NetworkState.Unknown
+    assert list(CaptureReader(tmp_path / "live").iter_records()) == []
@@ -0,0 +1,51 @@
+"""Tests for the circuit breaker."""
+
+import asyncio
+import contextlib
+
+from hoymiles_wifi.circuit_breaker import CircuitBreaker, CircuitState
+from hoymiles_wifi.dtu import DTU
+
+
+def test_opens_after_threshold():
+    """The circuit opens after consecutive failures and closes on success."""
+
+    breaker = CircuitBreaker(failure_threshold=2, min_backoff=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.get_state() == CircuitState.Open
+    assert breaker.is_probe_due()
+
+    breaker.start_probe()
+    breaker.record_success()
+    assert breaker.get_state() == CircuitState.Closed
+
+
+def test_disabled_by_default():
+    """DTUs only fail fast with a circuit breaker."""
+
+    assert DTU("127.0.0.1").circuit_breaker is None
+
+
+def test_cancelled_probe_reopens_circuit():
+    """A cancelled probe must not leave the circuit half open."""
+
+    breaker = CircuitBreaker(failure_threshold=1, min_backoff=0)
+    dtu = DTU("127.0.0.1", circuit_breaker=breaker)
+    breaker.record_failure()
+
+    async def async_never_answer(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    dtu._async_send_request = async_never_answer
+
+    async def async_run():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(dtu.async_probe(), 0.01)
+
+    asyncio.run(async_run())
+
+    assert breaker.get_state() == CircuitState.Open
+    assert breaker.is_probe_due()
@@ -0,0 +1,84 @@
+"""Tests for the offline capture decoder."""
+
+from conftest import create_frame
+from google.protobuf import json_format
+
+from hoymiles_wifi.capture import FRAME_RESPONSE, CaptureReader, FrameCapture
+from hoymiles_wifi.decoder import COLUMNS, decode_records, iter_chunks
+from hoymiles_wifi.protobuf import APPInfomationData_pb2, RealDataNew_pb2
+
+
+def capture_message(capture, tag, seq, message, type_name=None):
+    """Record the response frame of a message."""
+
+    capture.record(
+        "dtu",
+        tag,
+        seq,
+        FRAME_RESPONSE,
+        create_frame(tag, seq, message.SerializeToString()),
+        type_name=message.DESCRIPTOR.full_name if type_name is None else type_name,
+    )
+
+
+def test_round_trip(tmp_path):
+    """Captured messages decode to the messages that were captured."""
+
+    real_data = RealDataNew_pb2.RealDataNewReqDTO(
+        device_serial_number="4143A0000000",
+        dtu_power=1234,
+        sgs_data=[RealDataNew_pb2.SGSMO(serial_number=1, voltage=2300)],
+    )
+    app_information = APPInfomationData_pb2.APPInfoDataReqDTO(
+        dtu_serial_number="4143A0000000"
+    )
+
+    with FrameCapture(tmp_path) as capture:
+        capture_message(capture, 0xA211, 1, real_data)
+        capture_message(capture, 0xA211, 2, real_data, type_name="")
+        capture_message(capture, 0xA201, 3, app_information)
+        capture.record("dtu", 0xA211, 4, FRAME_RESPONSE, b"garbage")
+
+    records = list(CaptureReader(tmp_path).iter_records())
+    columns = decode_records(records)
+
+    assert set(columns) == set(COLUMNS)
+    assert columns["seq"] == [1, 2, 3, 4]
+    assert columns["error"][:3] == [None, None, None]
+    assert columns["type_name"][:2] == ["RealDataNewReqDTO"] * 2
+
+    for index in (0, 1):
+        decoded = json_format.Parse(
+            columns["message"][index], RealDataNew_pb2.RealDataNewReqDTO()
+        )
+        assert decoded == real_data
+
+    decoded = json_format.Parse(
+        columns["message"][2], APPInfomationData_pb2.APPInfoDataReqDTO()
+    )
+    assert decoded == app_information
+
+    assert columns["message"][3] is None
+    assert columns["error"][3]
+
+
+def test_shared_tag_without_type_name_is_ambiguous(tmp_path):
+    """A tag of several commands is not decoded as the first one of them."""
+
+    message = APPInfomationData_pb2.APPInfoDataReqDTO(dtu_serial_number="4143A0000000")
+
+    with FrameCapture(tmp_path) as capture:
+        capture_message(capture, 0xA201, 1, message, type_name="")
+        capture_message(capture, 0x1234, 2, message, type_name="")
+
+    columns = decode_records(list(CaptureReader(tmp_path).iter_records()))
+
+    assert columns["message"] == [None, None]
+    assert "Ambiguous tag 0xa201" in columns["error"][0]
+    assert "Unknown tag 0x1234" in columns["error"][1]
+
+
+def test_iter_chunks():
+    """Records are split into chunks of at most chunk_size records."""
+
+    assert [len(chunk) for chunk in iter_chunks(range(5), 2)] == [2, 2, 1]
@@ -0,0 +1,124 @@
+"""Tests for change detection between snapshots."""
+
+from conftest import DTU_SERIAL_NUMBER, create_real_data
+
+from hoymiles_wifi.delta import DeltaEngine, iter_changes
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+
+
+def create_inverter_data(power=0, voltage=0, pv_voltage=0, pv_ports=1):
+    """Create a snapshot with one inverter and its PV ports."""
+
+    return create_real_data(
+        power,
+        sgs_data=[RealDataNew_pb2.SGSMO(serial_number=1, voltage=voltage)],
+        pv_data=[
+            RealDataNew_pb2.PvMO(serial_number=1, port_number=port, voltage=pv_voltage)
+            for port in range(1, pv_ports + 1)
+        ],
+    )
+
+
+def get_changed_fields(change_set):
+    """Get the changed (kind, port, field) values of a change set."""
+
+    return {
+        (point.kind, point.port, point.field): point.value
+        for point in change_set.changes
+    }
+
+
+def test_first_snapshot_reports_everything():
+    """Every value of the first snapshot is a change."""
+
+    engine = DeltaEngine(scaled=False)
+    change_set = engine.diff(create_inverter_data(power=10))
+
+    assert get_changed_fields(change_set)[("dtu", 0, "dtu_power")] == 10
+    assert not change_set.removed
+
+    assert not engine.diff(create_inverter_data(power=10))
+
+
+def test_change_within_tolerance_is_suppressed():
+    """Changes up to the tolerance are not reported."""
+
+    engine = DeltaEngine({"dtu_power": 5}, scaled=False)
+    engine.diff(create_inverter_data(power=100))
+
+    assert not engine.diff(create_inverter_data(power=105))
+    assert get_changed_fields(engine.diff(create_inverter_data(power=106))) == {
+        ("dtu", 0, "dtu_power"): 106
+    }
+
+
+def test_slow_drift_is_reported():
+    """Values are compared against the last reported value, not the last seen."""
+
+    engine = DeltaEngine({"dtu_power": 5}, scaled=False)
+    engine.diff(create_inverter_data(power=100))
+
+    assert not engine.diff(create_inverter_data(power=103))
+    assert not engine.diff(create_inverter_data(power=105))
+    assert get_changed_fields(engine.diff(create_inverter_data(power=107))) == {
+        ("dtu", 0, "dtu_power"): 107
+    }
+    assert (
+        engine.state[DTU_SERIAL_NUMBER][("dtu", DTU_SERIAL_NUMBER, 0, "dtu_power")]
+        == 107
+    )
+
+
+def test_kind_tolerance_overrides_field_tolerance():
+    """A (kind, field) tolerance takes precedence over the field name."""
+
+    engine = DeltaEngine({"voltage": 10, ("port", "voltage"): 1}, scaled=False)
+    engine.diff(create_inverter_data(voltage=2300, pv_voltage=300))
+
+    change_set = engine.diff(create_inverter_data(voltage=2305, pv_voltage=305))
+
+    assert get_changed_fields(change_set) == {("port", 1, "voltage"): 305}
+    assert engine.get_tolerance("inverter", "voltage") == 10
+    assert engine.get_tolerance("port", "voltage") == 1
+    assert engine.get_tolerance("port", "power") == 0
+
+
+def test_removed_series():
+    """Series missing from a snapshot are reported as removed once."""
+
+    engine = DeltaEngine(scaled=False)
+    engine.diff(create_inverter_data(pv_ports=2))
+
+    change_set = engine.diff(create_inverter_data(pv_ports=1))
+
+    assert not change_set.changes
+    assert change_set.removed
+    assert {key[2] for key in change_set.removed} == {2}
+    assert change_set.to_dict()["removed"][0][0] == "port"
+
+    assert not engine.diff(create_inverter_data(pv_ports=1))
+
+
+def test_reset_reports_everything_again():
+    """After a reset the next snapshot is compared against nothing."""
+
+    engine = DeltaEngine(scaled=False)
+    snapshot = create_inverter_data(power=10)
+    engine.diff(snapshot)
+
+    engine.reset(DTU_SERIAL_NUMBER)
+    assert get_changed_fields(engine.diff(snapshot))[("dtu", 0, "dtu_power")] == 10
+
+    engine.reset()
+    assert not engine.state
+    assert engine.diff(snapshot)
+
+
+def test_iter_changes_skips_empty_change_sets():
+    """Only snapshots with changes are yielded."""
+
+    snapshots = [create_inverter_data(power) for power in (1, 1, 2, 2)]
+
+    change_sets = list(iter_changes(snapshots, DeltaEngine(scaled=False)))
+
+    assert len(change_sets) == 2
@@ -0,0 +1,25 @@
+"""Tests for the discovery of DTUs."""
+
+import asyncio
+
+from hoymiles_wifi.discovery import async_probe_dtu
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2
+
+
+def test_probe_keeps_dtu_with_invalid_serial_number(monkeypatch):
+    """A serial number that is not hex is reported with an unknown model."""
+
+    async def async_heartbeat(self):
+        return APPHeartbeatPB_pb2.HBReqDTO(dtu_serial_number="not-hex")
+
+    async def async_app_information_data(self):
+        return None
+
+    monkeypatch.setattr(DTU, "async_heartbeat", async_heartbeat)
+    monkeypatch.setattr(DTU, "async_app_information_data", async_app_information_data)
+
+    discovered = asyncio.run(async_probe_dtu("127.0.0.1"))
+
+    assert discovered.serial_number == "not-hex"
+    assert discovered.model == "Unknown"
@@ -0,0 +1,21 @@
+"""Tests for the DTU response parsing."""
+
+from conftest import create_response
+
+from hoymiles_wifi.dtu import DTU, RawResponse
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2
+
+
+def test_raw_response_is_zero_copy():
+    """A raw response is a memoryview of the payload the parsed path decodes."""
+
+    buffer = create_response(1, offset=28800)
+    dtu = DTU("127.0.0.1")
+
+    raw = dtu.parse_response(buffer, APPHeartbeatPB_pb2.HBReqDTO, False, raw=True)
+    parsed = dtu.parse_response(buffer, APPHeartbeatPB_pb2.HBReqDTO, False)
+
+    assert isinstance(raw, RawResponse)
+    assert isinstance(raw.payload, memoryview)
+    assert raw.header == buffer[:10]
+    assert APPHeartbeatPB_pb2.HBReqDTO.FromString(raw.payload) == parsed
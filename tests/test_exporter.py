@@ -0,0 +1,120 @@
+"""Tests for the Prometheus exporter."""
+
+import asyncio
+
+from conftest import create_real_data
+
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.exporter import MetricsExporter, format_labels
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2
+
+
+def test_format_labels_escapes_values():
+    """Label values are escaped for the text exposition format."""
+
+    assert format_labels(host='a"b\\c') == '{host="a\\"b\\\\c"}'
+
+
+async def async_request(port, data, wait=False):
+    """Send data to the exporter and return the response."""
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    if wait:
+        response = await asyncio.wait_for(reader.read(), 1)
+    else:
+        await writer.drain()
+        response = await reader.read()
+    writer.close()
+    return response
+
+
+def test_serves_metrics_and_drops_idle_clients(monkeypatch):
+    """Metrics are served on /metrics and silent clients time out."""
+
+    monkeypatch.setattr("hoymiles_wifi.exporter.EXPORTER_READ_TIMEOUT", 0.05)
+    exporter = MetricsExporter()
+
+    async def async_run():
+        server = await asyncio.start_server(
+            exporter.async_handle_client, "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            metrics = await async_request(port, b"GET /metrics HTTP/1.1\r\n\r\n")
+            missing = await async_request(port, b"GET / HTTP/1.1\r\n\r\n")
+            idle = await async_request(port, b"GET /metrics", wait=True)
+        return metrics, missing, idle
+
+    metrics, missing, idle = asyncio.run(async_run())
+
+    assert metrics.startswith(b"HTTP/1.1 200 OK")
+    assert missing.startswith(b"HTTP/1.1 404")
+    assert idle == b""
+
+
+def test_stale_series_are_dropped():
+    """Series of a DTU that stopped reporting are dropped, its up state is kept."""
+
+    exporter = MetricsExporter(max_interval=60)
+    dtu = DTU("127.0.0.1")
+    exporter.add_dtu(dtu)
+    exporter.scheduler.get_stats(dtu.host).last_power = 100
+    exporter.scheduler.get_stats(dtu.host).last_interval = 60
+
+    exporter.update(dtu, create_real_data(100))
+    timestamp = exporter.samples[dtu.host][0]
+
+    exporter.drop_stale(timestamp + 180)
+    assert "hoymiles_dtu_power_watts{" in "".join(exporter.render())
+
+    exporter.drop_stale(timestamp + 181)
+    metrics = "".join(exporter.render())
+
+    assert "hoymiles_dtu_power_watts{" not in metrics
+    assert 'hoymiles_up{host="127.0.0.1"} 0' in metrics
+    assert (
+        f'hoymiles_last_update_timestamp_seconds{{host="127.0.0.1"}} {timestamp:.3f}'
+        in metrics
+    )
+
+
+def test_idle_dtus_are_stale_after_missed_data_polls():
+    """Idle DTUs only go stale after several missed idle data polls."""
+
+    exporter = MetricsExporter(max_interval=60, idle_data_interval=900)
+    exporter.add_dtu(DTU("127.0.0.1"))
+
+    exporter.scheduler.get_stats("127.0.0.1").last_power = 0
+    assert exporter.get_stale_age("127.0.0.1") == 2700
+    assert exporter.get_stale_age("unknown") == 180
+
+
+def test_request_durations_without_adaptive_timeout():
+    """Round-trip times are exported for DTUs with a fixed timeout."""
+
+    dtu = DTU("127.0.0.1", adaptive_timeout=False)
+    exporter = MetricsExporter()
+    exporter.add_dtu(dtu)
+
+    async def async_run():
+        async def async_handle(reader, writer):
+            await reader.read(1024)
+            writer.close()
+
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0)
+        async with server:
+            await dtu.async_send_request(
+                b"\xa3\x02",
+                APPHeartbeatPB_pb2.HBResDTO(),
+                APPHeartbeatPB_pb2.HBReqDTO,
+                server.sockets[0].getsockname()[1],
+            )
+
+    asyncio.run(async_run())
+    metrics = "".join(exporter.render())
+
+    assert (
+        'hoymiles_request_duration_seconds_count{host="127.0.0.1",command="a302"} 1'
+        in metrics
+    )
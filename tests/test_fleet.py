@@ -0,0 +1,37 @@
+"""Tests for the fleet runner building blocks."""
+
+import pytest
+
+from hoymiles_wifi.const import SNAPSHOT_HOST_SIZE
+from hoymiles_wifi.fleet import SnapshotTable, assign_shard
+
+
+def test_assign_shard_is_stable():
+    """A host always maps to the same shard."""
+
+    assert assign_shard("10.0.0.1", 4) == assign_shard("10.0.0.1", 4)
+    assert 0 <= assign_shard("10.0.0.1", 4) < 4
+
+
+def test_snapshot_table_round_trip():
+    """A written snapshot is read back with its timestamp."""
+
+    table = SnapshotTable(hosts=["dtu1", "dtu2"])
+    try:
+        assert table.read_bytes("dtu1") is None
+        assert table.write("dtu1", b"payload", 1.5)
+        assert table.read_bytes("dtu1") == (1.5, b"payload")
+        assert not table.write("unknown", b"payload")
+    finally:
+        table.close()
+
+
+@pytest.mark.parametrize(
+    "hosts",
+    [["dtu1", "dtu1"], ["x" * (SNAPSHOT_HOST_SIZE + 1)]],
+)
+def test_snapshot_table_rejects_ambiguous_hosts(hosts):
+    """Duplicate and too long hosts would share or truncate a slot key."""
+
+    with pytest.raises(ValueError):
+        SnapshotTable(hosts=hosts)
@@ -0,0 +1,102 @@
+"""Tests for the columnar history store."""
+
+from array import array
+
+import pytest
+from conftest import create_real_data
+
+from hoymiles_wifi import history
+from hoymiles_wifi.history import (
+    SEGMENT_SUFFIX,
+    HistoryReader,
+    HistoryWriter,
+    decode_column,
+    encode_column,
+)
+
+VALUES = array("q", [0, 1, -1, 127, 128, -(2**40), 2**62, 5, 5, 1_700_000_000])
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_column_round_trip(monkeypatch, use_numpy):
+    """Both decoders read what encode_column wrote."""
+
+    if not use_numpy:
+        monkeypatch.setattr(history, "np", None)
+
+    buffer = b"\xff" + encode_column(VALUES)
+
+    assert decode_column(buffer, 1, len(buffer) - 1) == VALUES
+    assert decode_column(buffer, 1, 0) == array("q")
+
+
+def test_flush_does_not_overwrite_parts(tmp_path):
+    """A new part follows the highest existing part number."""
+
+    for part in (0, 2):
+        (tmp_path / f"2024-01-01-{part:04d}{SEGMENT_SUFFIX}").touch()
+
+    writer = HistoryWriter(tmp_path)
+
+    assert writer.get_next_part("2024-01-01") == 3
+    assert writer.get_next_part("2024-01-02") == 0
+    writer.close()
+
+
+def test_close_writes_buffered_samples(tmp_path):
+    """Samples are readable after closing the writer."""
+
+    real_data = create_real_data(1234)
+    key = ("dtu", "4143A0000000", 0, "dtu_power")
+
+    with HistoryWriter(tmp_path, fields={"dtu_power"}) as writer:
+        writer.add(real_data, timestamp=1_700_000_000)
+        writer.add(real_data, timestamp=1_700_000_030)
+
+    with HistoryReader(tmp_path) as reader:
+        timestamps, values = reader.query(key)
+
+    assert timestamps == [1_700_000_000, 1_700_000_030]
+    assert values == pytest.approx([123.4, 123.4])
+
+
+def test_day_rollover_compacts_parts(tmp_path):
+    """The parts of a finished day are merged into one segment."""
+
+    key = ("dtu", "4143A0000000", 0, "dtu_power")
+    day_start = 1_700_006_400
+
+    with HistoryWriter(tmp_path, fields={"dtu_power"}, flush_interval=0) as writer:
+        for offset in range(3):
+            writer.add(create_real_data(offset), timestamp=day_start + offset * 60)
+        assert len(list(tmp_path.glob(f"*{SEGMENT_SUFFIX}"))) == 3
+
+        writer.add(create_real_data(9), timestamp=day_start + 86400)
+
+    names = sorted(path.name for path in tmp_path.glob(f"*{SEGMENT_SUFFIX}"))
+    assert names == [f"2023-11-15{SEGMENT_SUFFIX}", f"2023-11-16-0000{SEGMENT_SUFFIX}"]
+
+    with HistoryReader(tmp_path) as reader:
+        timestamps, values = reader.query(key, scaled=False)
+
+    assert timestamps == [day_start, day_start + 60, day_start + 120, day_start + 86400]
+    assert values == [0, 1, 2, 9]
+
+
+def test_compaction_keeps_samples_once(tmp_path):
+    """A part left over from an interrupted compaction is merged again."""
+
+    key = ("dtu", "4143A0000000", 0, "dtu_power")
+    series = {key: (array("q", [1_700_006_400, 1_700_006_460]), array("q", [1, 2]))}
+    history.write_segment(tmp_path / f"2023-11-15{SEGMENT_SUFFIX}", series)
+    history.write_segment(tmp_path / f"2023-11-15-0001{SEGMENT_SUFFIX}", series)
+
+    HistoryWriter(tmp_path).close()
+
+    with HistoryReader(tmp_path) as reader:
+        timestamps, values = reader.query(key, scaled=False)
+
+    assert [path.name for path in tmp_path.glob(f"*{SEGMENT_SUFFIX}")] == [
+        f"2023-11-15{SEGMENT_SUFFIX}"
+    ]
+    assert (timestamps, values) == ([1_700_006_400, 1_700_006_460], [1, 2])
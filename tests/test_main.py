@@ -0,0 +1,45 @@
+"""Tests for the command line runner."""
+
+import argparse
+import asyncio
+import json
+
+from hoymiles_wifi import __main__ as cli
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.fleet import FleetHost
+
+
+def test_failing_host_does_not_stop_the_others(monkeypatch, capsys):
+    """An unexpected error fails only its host and every DTU is closed."""
+
+    closed = []
+
+    async def async_execute_command(dtu, args):
+        if dtu.host == "192.168.1.1":
+            raise RuntimeError("unexpected")
+        return {"host": dtu.host}
+
+    async def async_close(self):
+        closed.append(self.host)
+
+    monkeypatch.setattr(cli, "async_execute_command", async_execute_command)
+    monkeypatch.setattr(DTU, "async_close", async_close)
+
+    args = argparse.Namespace(
+        command="heartbeat",
+        concurrency=2,
+        address_pool=None,
+        timeout=None,
+        as_json=True,
+        scale_values=False,
+        hex_serial_numbers=False,
+    )
+    hosts = [FleetHost("192.168.1.1"), FleetHost("192.168.1.2")]
+
+    assert asyncio.run(cli.async_run_hosts(hosts, args)) is False
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert sorted(closed) == ["192.168.1.1", "192.168.1.2"]
+    assert {"host": "192.168.1.2", "response": {"host": "192.168.1.2"}} in lines
+    assert {"host": "192.168.1.1", "error": "No response for heartbeat"} in lines
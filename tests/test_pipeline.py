@@ -0,0 +1,125 @@
+"""Tests for the learned pipelining limit and the pipelined exchange."""
+
+import asyncio
+import struct
+
+from conftest import async_heartbeat, create_response
+
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.pipeline import PipelineLimit
+
+
+def test_limit_grows_and_halves():
+    """The limit grows with successes and is halved and capped on failures."""
+
+    pipeline = PipelineLimit(max_limit=8, initial_limit=2)
+    for _ in range(2 + 3):
+        pipeline.record_success()
+    assert pipeline.limit == 4
+
+    pipeline.record_failure(in_flight=4)
+    assert pipeline.limit == 2
+    assert pipeline.ceiling == 3
+
+    pipeline.record_failure(in_flight=1)
+    assert pipeline.limit == 2
+
+
+def test_ceiling_recovers():
+    """The ceiling is raised again after successes in a row at the ceiling."""
+
+    pipeline = PipelineLimit(max_limit=8, initial_limit=2, ceiling_recovery=4)
+    pipeline.record_failure(in_flight=2)
+    assert (pipeline.limit, pipeline.ceiling) == (1, 1)
+
+    for _ in range(3):
+        pipeline.record_success()
+    pipeline.record_failure(in_flight=1)
+    for _ in range(3):
+        pipeline.record_success()
+    assert pipeline.ceiling == 1
+
+    pipeline.record_success()
+    assert pipeline.ceiling == 2
+
+    pipeline.record_success()
+    assert pipeline.limit == 2
+
+    for _ in range(6 * 4 * 2):
+        pipeline.record_success()
+    assert pipeline.ceiling == pipeline.max_limit
+
+
+def test_acquire_waits_for_release():
+    """Requests over the limit wait until a slot is released."""
+
+    async def async_run():
+        pipeline = PipelineLimit(max_limit=1, initial_limit=1)
+        await pipeline.async_acquire()
+        waiter = asyncio.ensure_future(pipeline.async_acquire())
+        await asyncio.sleep(0)
+        is_waiting = not waiter.done()
+        pipeline.release()
+        await waiter
+        return is_waiting, pipeline.in_flight
+
+    assert asyncio.run(async_run()) == (True, 1)
+
+
+def test_pipelined_responses_out_of_order():
+    """Requests in flight are matched to responses sent in reverse order."""
+
+    async def async_run():
+        async def async_handle(reader, writer):
+            seqs = []
+            for _ in range(2):
+                header = await reader.readexactly(10)
+                seq, _, length = struct.unpack(">HHH", header[4:10])
+                await reader.readexactly(length - 10)
+                seqs.append(seq)
+            for seq in reversed(seqs):
+                writer.write(create_response(seq, offset=seq))
+            await reader.read()
+
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0)
+        async with server:
+            dtu = DTU("127.0.0.1", pipelining=True)
+            port = server.sockets[0].getsockname()[1]
+            responses = await asyncio.gather(
+                async_heartbeat(dtu, port), async_heartbeat(dtu, port)
+            )
+            dtu.close()
+            return responses, dtu.pipeline.in_flight
+
+    responses, in_flight = asyncio.run(async_run())
+
+    assert [response.offset for response in responses] == [1, 2]
+    assert in_flight == 0
+
+
+def test_late_response_is_discarded():
+    """The response to a timed out request does not answer the next one."""
+
+    async def async_run():
+        async def async_handle(reader, writer):
+            for _ in range(2):
+                header = await reader.readexactly(10)
+                seq, _, length = struct.unpack(">HHH", header[4:10])
+                await reader.readexactly(length - 10)
+            writer.write(create_response(seq - 1, offset=seq - 1))
+            writer.write(create_response(seq, offset=seq))
+            await reader.read()
+
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0)
+        async with server:
+            dtu = DTU("127.0.0.1", timeout=0.2, adaptive_timeout=False, pipelining=True)
+            port = server.sockets[0].getsockname()[1]
+            first = await async_heartbeat(dtu, port)
+            second = await async_heartbeat(dtu, port)
+            dtu.close()
+            return first, second
+
+    first, second = asyncio.run(async_run())
+
+    assert first is None
+    assert second.offset == 2
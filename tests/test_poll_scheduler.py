@@ -0,0 +1,104 @@
+"""Tests for the adaptive poll scheduler."""
+
+import asyncio
+import logging
+
+from hoymiles_wifi.poll_scheduler import PollScheduler
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+
+
+class FakeDTU:
+    """DTU answering real data polls from memory."""
+
+    def __init__(self, host, power=100, fail=False):
+        """Initialize FakeDTU class."""
+
+        self.host = host
+        self.power = power
+        self.fail = fail
+        self.polls = 0
+
+    async def async_get_real_data_new(self):
+        """Get real data, raising if the DTU is broken."""
+
+        self.polls += 1
+        if self.fail:
+            raise RuntimeError("broken DTU")
+        return RealDataNew_pb2.RealDataNewReqDTO(dtu_power=self.power, ap=1)
+
+    async def async_heartbeat(self):
+        """Never answer heartbeats."""
+
+        return None
+
+
+def run_scheduler(scheduler, duration):
+    """Run the scheduler for duration seconds."""
+
+    async def async_run():
+        task = asyncio.create_task(scheduler.async_run())
+        await asyncio.sleep(duration)
+        scheduler.stop()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(async_run())
+
+
+def test_polls_and_ticks_on_due_time(monkeypatch):
+    """Polls are repeated at the interval and every due poll ticks."""
+
+    monkeypatch.setattr("hoymiles_wifi.poll_scheduler.REQUEST_INTERVAL", 0)
+    ticks = []
+    data = []
+    scheduler = PollScheduler(
+        on_data=lambda dtu, real_data: data.append(real_data.dtu_power),
+        min_interval=0.05,
+        max_interval=0.05,
+        on_tick=ticks.append,
+    )
+    dtu = FakeDTU("dtu")
+    scheduler.add_dtu(dtu)
+
+    run_scheduler(scheduler, 0.3)
+
+    assert dtu.polls >= 3
+    assert data[0] == 100
+    assert len(ticks) >= dtu.polls
+
+
+def test_poll_exception_is_logged_and_retried(caplog):
+    """An exception of a poll counts as failure and polling goes on."""
+
+    scheduler = PollScheduler(min_interval=0.05, max_interval=0.05)
+    dtu = FakeDTU("broken", fail=True)
+    scheduler.add_dtu(dtu)
+
+    with caplog.at_level(logging.ERROR):
+        run_scheduler(scheduler, 0.2)
+
+    assert "broken DTU" in caplog.text
+    assert dtu.polls >= 2
+    assert scheduler.get_stats("broken").failures == dtu.polls
+
+
+def test_failed_task_is_restarted(monkeypatch):
+    """A polling task ended by an exception is started again."""
+
+    scheduler = PollScheduler(min_interval=0.05, max_interval=0.05)
+    dtu = FakeDTU("dtu")
+    scheduler.add_dtu(dtu)
+    runs = []
+    run_target = scheduler._async_run_target
+
+    async def async_run_target(target):
+        runs.append(target)
+        if len(runs) == 1:
+            raise RuntimeError("task bug")
+        await run_target(target)
+
+    monkeypatch.setattr(scheduler, "_async_run_target", async_run_target)
+
+    run_scheduler(scheduler, 0.1)
+
+    assert len(runs) == 2
+    assert dtu.polls >= 1
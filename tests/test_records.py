@@ -0,0 +1,37 @@
+"""Tests for the binary records of DTU responses."""
+
+import io
+
+import pytest
+
+from hoymiles_wifi.protobuf import (
+    APPInfomationData_pb2,
+    CommandPB_pb2,
+    InfomationData_pb2,
+)
+from hoymiles_wifi.records import iter_records, write_record
+
+
+def test_shared_tag_round_trip():
+    """Responses of commands sharing a tag are read back with their own type."""
+
+    messages = [
+        InfomationData_pb2.InfoDataReqDTO(dtu_sn="4143A0000000", pv_nub=4),
+        APPInfomationData_pb2.APPInfoDataReqDTO(dtu_serial_number="4143A0000000"),
+    ]
+    stream = io.BytesIO()
+    for message in messages:
+        write_record(stream, message, timestamp=1.0)
+
+    stream.seek(0)
+    records = list(iter_records(stream))
+
+    assert [record.tag for record in records] == [0xA201, 0xA201]
+    assert [record.message for record in records] == messages
+
+
+def test_message_without_command():
+    """Message types that no command returns cannot be written."""
+
+    with pytest.raises(ValueError, match="No command"):
+        write_record(io.BytesIO(), CommandPB_pb2.CommandStatusReqDTO())
@@ -0,0 +1,98 @@
+"""Tests for the command tag registry."""
+
+import asyncio
+
+from conftest import create_frame
+
+from hoymiles_wifi.crypt_util import crypt_data
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.protobuf import APPHeartbeatPB_pb2, InfomationData_pb2
+from hoymiles_wifi.registry import (
+    APP_INFORMATION_DATA,
+    GATEWAY_INFO,
+    HEARTBEAT,
+    INFORMATION_DATA,
+    REAL_DATA_NEW,
+    RESPONSE_TAGS,
+    get_message_type,
+    get_variant,
+    is_encrypted_tag,
+)
+from hoymiles_wifi.transport import decode_frame
+
+ENC_RAND = bytes(range(16))
+
+
+def test_shared_tag_lists_both_commands():
+    """Information data and app information data share their tags."""
+
+    commands = RESPONSE_TAGS[APP_INFORMATION_DATA.response_tag]
+
+    assert commands == (APP_INFORMATION_DATA, INFORMATION_DATA)
+    assert get_variant(INFORMATION_DATA) == 1
+    assert get_message_type(0xA201, 1) is InfomationData_pb2.InfoDataReqDTO
+    assert get_message_type(0xA201, 2) is None
+
+
+def test_decode_frame_variant():
+    """The variant selects the message type of a shared tag."""
+
+    message = InfomationData_pb2.InfoDataReqDTO(dtu_sn="4143A0000000", pv_nub=4)
+    frame = create_frame(0xA201, 1, message.SerializeToString())
+
+    info, decoded = decode_frame(frame, variant=get_variant(INFORMATION_DATA))
+
+    assert info is INFORMATION_DATA
+    assert decoded == message
+
+
+def test_decode_frame_decrypts_like_the_dtu():
+    """Frames are decrypted by their own tag, as the DTU does."""
+
+    message = APPHeartbeatPB_pb2.HBReqDTO(dtu_serial_number="4143A0000000")
+    plain = message.SerializeToString()
+    ciphertext = crypt_data(True, ENC_RAND, 0xA202, 7, plain)
+    frame = create_frame(0xA202, 7, ciphertext, encrypted_length=len(plain))
+
+    _, decoded = decode_frame(frame, is_encrypted=True, enc_rand=ENC_RAND)
+    response = DTU("127.0.0.1", is_encrypted=True, enc_rand=ENC_RAND).parse_response(
+        frame, APPHeartbeatPB_pb2.HBReqDTO, is_extended_format=False
+    )
+
+    assert decoded == message
+    assert response == message
+
+
+def test_dtu_methods_use_the_registry(monkeypatch):
+    """DTU methods send the command and response type of their entry."""
+
+    calls = []
+
+    async def async_send_request(command, request, response_type, **kwargs):
+        calls.append((command, response_type))
+
+    dtu = DTU("127.0.0.1")
+    monkeypatch.setattr(dtu, "async_send_request", async_send_request)
+
+    asyncio.run(dtu.async_get_information_data())
+    asyncio.run(dtu.async_app_information_data())
+
+    assert calls == [
+        (INFORMATION_DATA.command, INFORMATION_DATA.response_type),
+        (APP_INFORMATION_DATA.command, APP_INFORMATION_DATA.response_type),
+    ]
+
+
+def test_encryption_exemptions():
+    """The registry tells which frames are encrypted on encrypted DTUs."""
+
+    assert not APP_INFORMATION_DATA.is_request_encrypted
+    assert not APP_INFORMATION_DATA.is_response_encrypted
+    assert not HEARTBEAT.is_request_encrypted
+    assert HEARTBEAT.is_response_encrypted
+    assert REAL_DATA_NEW.is_request_encrypted
+    assert not GATEWAY_INFO.is_response_encrypted
+
+    assert not is_encrypted_tag(APP_INFORMATION_DATA.response_tag)
+    assert is_encrypted_tag(REAL_DATA_NEW.response_tag)
+    assert is_encrypted_tag(0xFFFF)
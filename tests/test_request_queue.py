@@ -0,0 +1,169 @@
+"""Tests for the request queue."""
+
+import asyncio
+
+from hoymiles_wifi.request_queue import RequestPriority, RequestQueue
+
+
+async def async_record(
+    queue: RequestQueue, priority: RequestPriority, name: str, order: list[str]
+):
+    """Hold the queue briefly and record the order it was granted in."""
+
+    async with queue.priority(priority):
+        order.append(name)
+        await asyncio.sleep(0)
+
+
+async def async_run_waiters(waiters: list[tuple[RequestPriority, str]]) -> list[str]:
+    """Queue the waiters behind a held queue and return the serving order."""
+
+    queue = RequestQueue()
+    order: list[str] = []
+    await queue.acquire()
+
+    tasks = [
+        asyncio.create_task(async_record(queue, priority, name, order))
+        for priority, name in waiters
+    ]
+    await asyncio.sleep(0)
+    assert queue.get_depth() == len(waiters)
+
+    queue.release()
+    await asyncio.gather(*tasks)
+
+    assert not queue.locked()
+    return order
+
+
+def test_served_in_priority_order():
+    """Waiters are served by priority, not by arrival."""
+
+    order = asyncio.run(
+        async_run_waiters(
+            [
+                (RequestPriority.TELEMETRY, "telemetry"),
+                (RequestPriority.NORMAL, "normal"),
+                (RequestPriority.CONTROL, "control"),
+            ]
+        )
+    )
+
+    assert order == ["control", "normal", "telemetry"]
+
+
+def test_equal_priority_is_fifo():
+    """Waiters of equal priority are served in arrival order."""
+
+    order = asyncio.run(
+        async_run_waiters([(RequestPriority.NORMAL, str(index)) for index in range(5)])
+    )
+
+    assert order == ["0", "1", "2", "3", "4"]
+
+
+def test_control_request_overtakes_queued_telemetry():
+    """A control request arriving late is served before queued telemetry."""
+
+    async def async_run():
+        queue = RequestQueue()
+        order: list[str] = []
+        await queue.acquire()
+
+        tasks = [
+            asyncio.create_task(
+                async_record(
+                    queue, RequestPriority.TELEMETRY, f"telemetry{index}", order
+                )
+            )
+            for index in range(3)
+        ]
+        await asyncio.sleep(0)
+        tasks.append(
+            asyncio.create_task(
+                async_record(queue, RequestPriority.CONTROL, "control", order)
+            )
+        )
+        await asyncio.sleep(0)
+
+        queue.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(async_run())
+
+    assert order == ["control", "telemetry0", "telemetry1", "telemetry2"]
+
+
+def test_cancelled_waiter_does_not_take_the_queue():
+    """A cancelled waiter is skipped and never holds the queue."""
+
+    async def async_run():
+        queue = RequestQueue()
+        order: list[str] = []
+        await queue.acquire()
+
+        cancelled = asyncio.create_task(
+            async_record(queue, RequestPriority.CONTROL, "cancelled", order)
+        )
+        waiting = asyncio.create_task(
+            async_record(queue, RequestPriority.NORMAL, "waiting", order)
+        )
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert cancelled.cancelled()
+        assert queue.get_depth() == 1
+
+        queue.release()
+        await waiting
+        assert not queue.locked()
+        return order
+
+    assert asyncio.run(async_run()) == ["waiting"]
+
+
+def test_cancelled_after_handover_releases_the_queue():
+    """A waiter cancelled right after being granted the queue passes it on."""
+
+    async def async_run():
+        queue = RequestQueue()
+        order: list[str] = []
+        await queue.acquire()
+
+        first = asyncio.create_task(
+            async_record(queue, RequestPriority.CONTROL, "first", order)
+        )
+        second = asyncio.create_task(
+            async_record(queue, RequestPriority.NORMAL, "second", order)
+        )
+        await asyncio.sleep(0)
+
+        queue.release()
+        first.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+
+        assert first.cancelled()
+        assert not queue.locked()
+        return order
+
+    assert asyncio.run(async_run()) == ["second"]
+
+
+def test_wait_statistics():
+    """Wait times are recorded per priority."""
+
+    async def async_run():
+        queue = RequestQueue()
+        async with queue:
+            pass
+        async with queue.priority(RequestPriority.CONTROL):
+            pass
+        return queue
+
+    queue = asyncio.run(async_run())
+
+    assert queue.stats[RequestPriority.NORMAL].requests == 1
+    assert queue.stats[RequestPriority.CONTROL].requests == 1
+    assert queue.stats[RequestPriority.TELEMETRY].requests == 0
@@ -0,0 +1,110 @@
+"""Tests for the caching hostname resolver."""
+
+import asyncio
+import socket
+
+import pytest
+
+from hoymiles_wifi.resolver import HostResolver, get_address_family
+
+
+def create_infos(*addresses):
+    """Create getaddrinfo results for addresses."""
+
+    return [
+        (
+            socket.AF_INET6 if ":" in address else socket.AF_INET,
+            socket.SOCK_STREAM,
+            6,
+            "",
+            (address, 10081),
+        )
+        for address in addresses
+    ]
+
+
+def patch_getaddrinfo(monkeypatch, *addresses):
+    """Make getaddrinfo return addresses and record the requested families."""
+
+    families = []
+
+    async def getaddrinfo(self, host, port, *, family=0, type=0):
+        families.append(family)
+        return create_infos(*addresses)
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+    return families
+
+
+def test_address_family():
+    """The family follows the local address a connection is bound to."""
+
+    assert get_address_family(None) == socket.AF_UNSPEC
+    assert get_address_family("192.168.1.2") == socket.AF_INET
+    assert get_address_family("fd00::2") == socket.AF_INET6
+
+
+def test_connect_tries_addresses_in_order(monkeypatch):
+    """A dual-stack name falls back to its next address and prefers it then."""
+
+    patch_getaddrinfo(monkeypatch, "fd00::1", "fd00::1", "192.168.1.1")
+    attempts = []
+
+    async def connect(address):
+        attempts.append(address)
+        if ":" in address:
+            raise OSError("Network is unreachable")
+        return address
+
+    async def async_run():
+        resolver = HostResolver("dtu.local")
+        first = await resolver.async_connect(connect)
+        second = await resolver.async_connect(connect)
+        return resolver, first, second
+
+    resolver, first, second = asyncio.run(async_run())
+
+    assert first == second == "192.168.1.1"
+    assert attempts == ["fd00::1", "192.168.1.1", "192.168.1.1"]
+    assert resolver.addresses == ["192.168.1.1", "fd00::1"]
+
+
+def test_connect_raises_last_error(monkeypatch):
+    """The error of the last address is raised if no address connects."""
+
+    patch_getaddrinfo(monkeypatch, "192.168.1.1", "192.168.1.2")
+
+    async def connect(address):
+        raise OSError(f"Refused by {address}")
+
+    with pytest.raises(OSError, match="192.168.1.2"):
+        asyncio.run(HostResolver("dtu.local").async_connect(connect))
+
+
+def test_lookup_filters_family(monkeypatch):
+    """Only addresses of the resolver family are requested."""
+
+    families = patch_getaddrinfo(monkeypatch, "192.168.1.1")
+
+    asyncio.run(HostResolver("dtu.local", family=socket.AF_INET).async_lookup())
+
+    assert families == [socket.AF_INET]
+
+
+def test_close_cancels_refresh(monkeypatch):
+    """Closing the resolver cancels and awaits the background resolution."""
+
+    patch_getaddrinfo(monkeypatch, "192.168.1.1")
+
+    async def async_run():
+        resolver = HostResolver("dtu.local", ttl=0)
+        await resolver.async_resolve()
+        await resolver.async_resolve()
+        refresh = resolver._refresh
+        await resolver.async_close()
+        return resolver, refresh
+
+    resolver, refresh = asyncio.run(async_run())
+
+    assert refresh.cancelled()
+    assert resolver._refresh is None
@@ -0,0 +1,75 @@
+"""Tests for the rollup engine."""
+
+from conftest import create_real_data
+
+from hoymiles_wifi.rollup import RollupEngine
+
+
+def test_identity_fields_are_not_aggregated():
+    """The firmware version has no rollups."""
+
+    engine = RollupEngine(resolutions=(60,))
+    engine.add(
+        create_real_data(100, dtu_daily_energy=10, firmware_version=4096), timestamp=0
+    )
+
+    rollups = engine.flush()
+
+    assert {rollup.field for rollup in rollups} == {"dtu_power", "dtu_daily_energy"}
+
+
+def test_close_expired_closes_idle_series():
+    """Windows of a DTU that stopped reporting are closed and forgotten."""
+
+    emitted = []
+    engine = RollupEngine(resolutions=(60, 900), sinks=[emitted.extend])
+    engine.add(create_real_data(100, dtu_daily_energy=10), timestamp=0)
+    engine.add(create_real_data(300, dtu_daily_energy=15), timestamp=30)
+
+    assert engine.close_expired(now=59) == []
+
+    closed = engine.close_expired(now=60)
+    power = next(rollup for rollup in closed if rollup.field == "dtu_power")
+    energy = next(rollup for rollup in closed if rollup.field == "dtu_daily_energy")
+
+    assert {rollup.resolution for rollup in closed} == {60}
+    assert (power.count, power.mean, power.minimum, power.maximum) == (2, 20, 10, 30)
+    assert energy.delta == 5
+    assert len(engine.windows) == 2
+
+    closed = engine.close_expired(now=900)
+
+    assert {rollup.resolution for rollup in closed} == {900}
+    assert engine.windows == {}
+    assert engine.previous == {}
+    assert len(emitted) == 4
+
+
+def test_lifetime_counter_drop_is_ignored():
+    """A bad lifetime energy reading does not add the total to a window."""
+
+    engine = RollupEngine(resolutions=(3600,))
+    for timestamp, energy in ((0, 1000), (60, 0), (120, 1001)):
+        real_data = create_real_data(100, dtu_daily_energy=10)
+        real_data.pv_data.add(
+            serial_number=0x1161A0000000, port_number=1
+        ).energy_total = energy
+        engine.add(real_data, timestamp=timestamp)
+
+    rollups = engine.flush()
+    energy_total = next(rollup for rollup in rollups if rollup.field == "energy_total")
+
+    assert energy_total.delta == 1
+
+
+def test_daily_counter_restarts():
+    """A daily counter that drops counts from zero."""
+
+    engine = RollupEngine(resolutions=(86400,))
+    for timestamp, energy in ((0, 500), (60, 0), (120, 20)):
+        engine.add(create_real_data(100, dtu_daily_energy=energy), timestamp=timestamp)
+
+    rollups = engine.flush()
+    daily = next(rollup for rollup in rollups if rollup.field == "dtu_daily_energy")
+
+    assert daily.delta == 20
@@ -0,0 +1,38 @@
+"""Tests for the round-trip time estimator."""
+
+from hoymiles_wifi.const import MIN_TIMEOUT, RTT_INITIAL_TIMEOUT, RTT_MAX_BACKOFFS
+from hoymiles_wifi.rtt import RttEstimator
+
+
+def test_initial_timeout_is_capped():
+    """A DTU without samples does not wait for the ceiling."""
+
+    assert RttEstimator(max_timeout=10).get_timeout() == RTT_INITIAL_TIMEOUT
+    assert RttEstimator(max_timeout=2).get_timeout() == 2
+
+
+def test_sample_sets_estimate():
+    """The timeout follows the observed round-trip time."""
+
+    estimator = RttEstimator(max_timeout=10)
+    estimator.add_sample(0.2)
+
+    assert estimator.get_timeout() == MIN_TIMEOUT
+    assert estimator.samples == 1
+
+
+def test_backoff_then_probe_with_estimate():
+    """Timeouts back off up to the ceiling, then an offline DTU is probed quickly."""
+
+    estimator = RttEstimator(max_timeout=10)
+    timeouts = []
+    for _ in range(RTT_MAX_BACKOFFS + 3):
+        timeouts.append(estimator.get_timeout())
+        estimator.backoff()
+
+    assert timeouts[: RTT_MAX_BACKOFFS + 1] == [3, 6, 10]
+    assert timeouts[RTT_MAX_BACKOFFS + 1 :] == [RTT_INITIAL_TIMEOUT] * 2
+
+    estimator.add_sample(0.5)
+    assert estimator.consecutive_timeouts == 0
+    assert estimator.get_timeout() < RTT_INITIAL_TIMEOUT
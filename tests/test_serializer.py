@@ -0,0 +1,147 @@
+"""Tests for the JSON serializer of protobuf messages."""
+
+import io
+
+import pytest
+from google.protobuf import (
+    descriptor_pb2,
+    descriptor_pool,
+    duration_pb2,
+    json_format,
+    message_factory,
+    struct_pb2,
+    timestamp_pb2,
+)
+
+from hoymiles_wifi.protobuf import RealDataNew_pb2
+from hoymiles_wifi.serializer import message_to_json, write_json
+
+FIELD = descriptor_pb2.FieldDescriptorProto
+
+
+def create_message_type():
+    """Create a message type with the field types protobuf encodes specially."""
+
+    pool = descriptor_pool.Default()
+
+    file = descriptor_pb2.FileDescriptorProto(
+        name="tests/parity.proto",
+        package="parity",
+        syntax="proto3",
+        dependency=[
+            "google/protobuf/timestamp.proto",
+            "google/protobuf/duration.proto",
+            "google/protobuf/struct.proto",
+        ],
+    )
+    file.enum_type.add(name="State").value.add(name="STATE_UNKNOWN", number=0)
+    file.enum_type[0].value.add(name="STATE_ON", number=1)
+
+    message = file.message_type.add(name="Parity")
+    for number, (name, field_type, label, type_name) in enumerate(
+        (
+            ("float_value", FIELD.TYPE_FLOAT, FIELD.LABEL_OPTIONAL, None),
+            ("double_value", FIELD.TYPE_DOUBLE, FIELD.LABEL_OPTIONAL, None),
+            ("floats", FIELD.TYPE_FLOAT, FIELD.LABEL_REPEATED, None),
+            ("state", FIELD.TYPE_ENUM, FIELD.LABEL_OPTIONAL, ".parity.State"),
+            ("states", FIELD.TYPE_ENUM, FIELD.LABEL_REPEATED, ".parity.State"),
+            ("int64_value", FIELD.TYPE_INT64, FIELD.LABEL_OPTIONAL, None),
+            ("uint64_value", FIELD.TYPE_UINT64, FIELD.LABEL_OPTIONAL, None),
+            ("sint64s", FIELD.TYPE_SINT64, FIELD.LABEL_REPEATED, None),
+            (
+                "created",
+                FIELD.TYPE_MESSAGE,
+                FIELD.LABEL_OPTIONAL,
+                ".google.protobuf.Timestamp",
+            ),
+            (
+                "elapsed",
+                FIELD.TYPE_MESSAGE,
+                FIELD.LABEL_OPTIONAL,
+                ".google.protobuf.Duration",
+            ),
+            (
+                "extra",
+                FIELD.TYPE_MESSAGE,
+                FIELD.LABEL_OPTIONAL,
+                ".google.protobuf.Struct",
+            ),
+        ),
+        start=1,
+    ):
+        field = message.field.add(
+            name=name, number=number, type=field_type, label=label
+        )
+        if type_name is not None:
+            field.type_name = type_name
+
+    pool.Add(file)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("parity.Parity"))
+
+
+Parity = create_message_type()
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        Parity(float_value=0.1, double_value=1 / 3, floats=[1.1, -2.5e-7, 3.4e38]),
+        Parity(float_value=float("nan"), double_value=float("-inf")),
+        Parity(state=1, states=[0, 1, 7]),
+        Parity(int64_value=-(2**63), uint64_value=2**64 - 1, sint64s=[-1, 0, 2**40]),
+        Parity(
+            created=timestamp_pb2.Timestamp(seconds=1_700_000_000, nanos=5000),
+            elapsed=duration_pb2.Duration(seconds=90, nanos=500_000_000),
+            extra=struct_pb2.Struct(fields={"a": struct_pb2.Value(number_value=1)}),
+        ),
+        Parity(),
+        RealDataNew_pb2.RealDataNewReqDTO(
+            device_serial_number="4143A0000000",
+            dtu_power=1234,
+            sgs_data=[
+                RealDataNew_pb2.SGSMO(serial_number=0x116180000000, voltage=2301)
+            ],
+        ),
+    ],
+)
+@pytest.mark.parametrize("indent", [2, 0])
+def test_matches_message_to_json(message, indent):
+    """The output is the same as json_format.MessageToJson."""
+
+    assert message_to_json(message, indent=indent) == json_format.MessageToJson(
+        message, indent=indent
+    )
+
+
+def test_well_known_type_message():
+    """A well-known type is written like json_format does."""
+
+    message = timestamp_pb2.Timestamp(seconds=1_700_000_000)
+
+    assert message_to_json(message) == json_format.MessageToJson(message)
+
+
+def test_writes_while_serializing(monkeypatch):
+    """Large messages reach the stream in several writes."""
+
+    writes = []
+
+    class Stream(io.StringIO):
+        """StringIO counting its writes."""
+
+        def write(self, text):
+            """Count a write."""
+
+            writes.append(len(text))
+            return super().write(text)
+
+    monkeypatch.setattr("hoymiles_wifi.serializer.SERIALIZER_BUFFER_PARTS", 64)
+    message = RealDataNew_pb2.RealDataNewReqDTO(
+        pv_data=[RealDataNew_pb2.PvMO(port_number=port) for port in range(100)]
+    )
+    stream = Stream()
+
+    write_json(message, stream, indent=None)
+
+    assert len(writes) > 1
+    assert stream.getvalue() == message_to_json(message, indent=None)
@@ -0,0 +1,80 @@
+"""Tests for the synchronous DTU facade."""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.sync import EventLoopThread, SyncDTU
+
+
+@pytest.fixture
+def loop_thread():
+    """Event loop thread stopped after the test."""
+
+    loop_thread = EventLoopThread("test")
+    yield loop_thread
+    loop_thread.stop()
+
+
+def test_sync_dtu_calls_from_threads(monkeypatch, loop_thread):
+    """Blocking methods run the DTU coroutines on the shared loop."""
+
+    async def async_heartbeat(self, *, raw=False):
+        await asyncio.sleep(0.01)
+        return threading.current_thread().name
+
+    monkeypatch.setattr(DTU, "async_heartbeat", async_heartbeat)
+    dtu = SyncDTU("127.0.0.1", loop_thread=loop_thread)
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        names = list(executor.map(lambda _: dtu.heartbeat(), range(8)))
+
+    assert names == ["test"] * 8
+    with pytest.raises(AttributeError):
+        dtu.no_such_method()
+
+
+def test_timeout_cancels_coroutine(loop_thread):
+    """A coroutine whose result timed out is cancelled on the loop."""
+
+    cancelled = threading.Event()
+
+    async def async_wait():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        loop_thread.run(async_wait(), timeout=0.05)
+
+    assert cancelled.wait(1)
+
+
+def test_run_on_loop_thread_raises(loop_thread):
+    """Blocking the loop thread on itself is refused."""
+
+    async def async_reenter():
+        loop_thread.run(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError, match="itself"):
+        loop_thread.run(async_reenter())
+
+
+def test_stop_cancels_pending_tasks():
+    """Tasks still pending on the loop are cancelled when it stops."""
+
+    loop_thread = EventLoopThread("test")
+
+    async def async_start_task():
+        return asyncio.create_task(asyncio.sleep(10))
+
+    task = loop_thread.run(async_start_task())
+    loop_thread.stop()
+
+    assert task.cancelled()
+    assert loop_thread.loop is None
@@ -0,0 +1,81 @@
+"""Tests for the time series store."""
+
+import logging
+
+import numpy as np
+from conftest import create_real_data
+
+from hoymiles_wifi.timeseries import RingSeries, TimeSeriesStore, lttb
+
+
+def test_series_limit_is_per_dtu(caplog):
+    """Every DTU gets its own series, dropped series are logged once each."""
+
+    store = TimeSeriesStore(capacity=4, max_series_per_dtu=2)
+
+    with caplog.at_level(logging.WARNING):
+        for timestamp in range(3):
+            store.add(
+                create_real_data(100, dtu_serial_number="4143A0000001"), timestamp
+            )
+            store.add(
+                create_real_data(200, dtu_serial_number="4143A0000002"), timestamp
+            )
+
+    assert len(store.series) == 4
+    assert (
+        store.query(("dtu", "4143A0000002", 0, "dtu_power"))[1].tolist() == [20.0] * 3
+    )
+    assert len(caplog.records) == 2
+    assert "firmware_version" in caplog.records[0].getMessage()
+
+
+def test_range_after_clock_step():
+    """Range queries stay correct when the clock steps back."""
+
+    series = RingSeries(4)
+    for timestamp in (10, 20, 5, 15):
+        series.append(timestamp, timestamp)
+
+    timestamps, _ = series.get_range(8, 16)
+    assert timestamps.tolist() == [10, 15]
+
+    for timestamp in (25, 30, 35):
+        series.append(timestamp, timestamp)
+
+    timestamps, _ = series.get_range(20, 40)
+    assert np.array_equal(timestamps, [25, 30, 35])
+    assert series.ordered_samples >= len(series)
+
+
+def test_lttb_keeps_end_points_and_peaks():
+    """Downsampling returns threshold points including both ends and peaks."""
+
+    timestamps = np.arange(100, dtype=np.int64)
+    values = np.zeros(100)
+    values[37] = 50
+    values[71] = -50
+
+    sampled_timestamps, sampled_values = lttb(timestamps, values, 10)
+
+    assert len(sampled_timestamps) == len(sampled_values) == 10
+    assert sampled_timestamps[0] == 0
+    assert sampled_timestamps[-1] == 99
+    assert np.all(np.diff(sampled_timestamps) > 0)
+    assert {37, 71} <= set(sampled_timestamps.tolist())
+    assert sampled_values.max() == 50
+    assert sampled_values.min() == -50
+
+
+def test_lttb_small_thresholds():
+    """Series that are short enough, or thresholds below 3, are not sampled."""
+
+    timestamps = np.arange(5, dtype=np.int64)
+    values = np.arange(5, dtype=np.float64)
+
+    assert len(lttb(timestamps, values, 5)[0]) == 5
+    assert len(lttb(timestamps, values, 2)[0]) == 5
+
+    sampled_timestamps, _ = lttb(timestamps, values, 3)
+    assert len(sampled_timestamps) == 3
+    assert sampled_timestamps[[0, -1]].tolist() == [0, 4]
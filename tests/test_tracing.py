@@ -0,0 +1,68 @@
+"""Tests for the structured tracing of DTU exchanges."""
+
+import asyncio
+import logging
+
+from conftest import async_heartbeat
+
+from hoymiles_wifi.dtu import DTU
+from hoymiles_wifi.tracing import Tracer
+
+
+def test_frames_are_kept_while_disabled():
+    """Frames are kept for a dump while tracing is disabled."""
+
+    tracer = Tracer("dtu", size=2)
+    for seq in range(3):
+        tracer.frame("request", seq, memoryview(b"HM"))
+
+    assert [frame.seq for frame in tracer.frames] == [1, 2]
+    assert isinstance(tracer.frames[0].data, memoryview)
+
+
+def test_frames_are_copied_while_enabled(caplog):
+    """Frames are copied while tracing is enabled."""
+
+    caplog.set_level(logging.DEBUG, logger="hoymiles_wifi.trace")
+    tracer = Tracer("dtu")
+    tracer.frame("request", 1, memoryview(b"HM"))
+
+    assert tracer.frames[0].data == b"HM"
+    assert isinstance(tracer.frames[0].data, bytes)
+
+
+def test_dump_on_timeout(caplog):
+    """The frames of a request that timed out are dumped."""
+
+    async def async_run():
+        async def async_handle(reader, writer):
+            await reader.read()
+            writer.close()
+
+        server = await asyncio.start_server(async_handle, "127.0.0.1", 0)
+        async with server:
+            dtu = DTU("127.0.0.1", timeout=0.2, adaptive_timeout=False)
+            return await async_heartbeat(dtu, server.sockets[0].getsockname()[1])
+
+    caplog.set_level(logging.DEBUG, logger="hoymiles_wifi.trace")
+
+    assert asyncio.run(async_run()) is None
+    assert "dumping 1 frames after error: Request timed out" in caplog.text
+    assert " request seq=1 " in caplog.text
+
+
+def test_dump_on_connection_error(caplog):
+    """The frames of a request that failed to connect are dumped."""
+
+    async def async_run():
+        server = await asyncio.start_server(lambda *_: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+
+        return await async_heartbeat(DTU("127.0.0.1"), port)
+
+    caplog.set_level(logging.DEBUG, logger="hoymiles_wifi.trace")
+
+    assert asyncio.run(async_run()) is None
+    assert "dumping 1 frames after error" in caplog.text
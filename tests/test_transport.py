@@ -0,0 +1,104 @@
+"""Tests for the reassembly of DTU frames by FrameProtocol."""
+
+import asyncio
+import struct
+
+from conftest import FakeTransport, create_frame, create_response
+
+from hoymiles_wifi.const import CMD_HEADER
+from hoymiles_wifi.registry import APP_INFORMATION_DATA, GATEWAY_INFO
+from hoymiles_wifi.transport import FrameProtocol, crc16_modbus
+
+
+def create_extended_response(seq):
+    """Create a gateway info response frame in the extended format."""
+
+    payload = b"\x08\x01"
+    return (
+        CMD_HEADER
+        + struct.pack(
+            ">HHHH",
+            GATEWAY_INFO.response_tag,
+            seq,
+            crc16_modbus(payload),
+            len(payload) + 24,
+        )
+        + bytes(14)
+        + payload
+    )
+
+
+async def async_receive(chunks, seqs, is_pipelined=True, is_encrypted=False):
+    """Feed chunks to a protocol waiting for seqs, return the futures."""
+
+    protocol = FrameProtocol(is_encrypted, is_pipelined)
+    protocol.connection_made(FakeTransport())
+    futures = [protocol.send_request(create_response(seq)) for seq in seqs]
+    for chunk in chunks:
+        protocol.data_received(chunk)
+
+    return protocol, futures
+
+
+def test_split_frame():
+    """A frame received in several chunks resolves its request once complete."""
+
+    async def async_run():
+        frame = create_response(1)
+        chunks = [frame[:3], frame[3:12], frame[12:]]
+        protocol, (future,) = await async_receive(chunks[:2], [1])
+        is_done = future.done()
+        protocol.data_received(chunks[2])
+        return is_done, future.result()
+
+    assert asyncio.run(async_run()) == (False, create_response(1))
+
+
+def test_merged_frames():
+    """Frames received in one chunk resolve their requests by sequence."""
+
+    async def async_run():
+        _, futures = await async_receive(
+            [create_response(2, offset=2) + create_response(1, offset=1)], [1, 2]
+        )
+        return [future.result() for future in futures]
+
+    assert asyncio.run(async_run()) == [
+        create_response(1, offset=1),
+        create_response(2, offset=2),
+    ]
+
+
+def test_garbage_before_header():
+    """Bytes before a frame header are skipped."""
+
+    async def async_run():
+        _, (future,) = await async_receive([b"\x00xyz" + create_response(1)], [1])
+        return future.result()
+
+    assert asyncio.run(async_run()) == create_response(1)
+
+
+def test_unknown_sequence_is_discarded_when_pipelined():
+    """A late response on a pipelined connection does not answer another request."""
+
+    async def async_run(is_pipelined):
+        _, (future,) = await async_receive([create_response(1)], [2], is_pipelined)
+        return future
+
+    assert not asyncio.run(async_run(True)).done()
+    assert asyncio.run(async_run(False)).result() == create_response(1)
+
+
+def test_unknown_extended_frame_keeps_sync():
+    """A stray extended frame of an encrypted DTU is skipped by its length."""
+
+    information_data = create_frame(APP_INFORMATION_DATA.response_tag, 1, b"")
+
+    async def async_run():
+        _, (future,) = await async_receive(
+            [create_extended_response(7) + information_data], [1], is_encrypted=True
+        )
+        return future.result()
+
+    assert asyncio.run(async_run()) == information_data